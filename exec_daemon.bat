@@ -0,0 +1,2 @@
+python d:/Users/Luuk/Documents/Programming/PersonalProjects/yt_analytics_scraper/py/scrape_daemon.py
+exit
\ No newline at end of file
@@ -0,0 +1,111 @@
+###############################################################################
+#
+# Script to store the heatmap (audience retention markers) of every video
+# in the video log. Heatmaps don't disappear, so this only has to catch up
+# on videos that aren't stored yet. Keeps a checkpoint so a killed run
+# continues where it stopped.
+#
+# Usage: python backfill_heatmaps.py [workers]
+#
+###############################################################################
+
+import datetime as dt
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from util.log_videos import get_videos
+from util.log_errors import get_logging_decorator
+from util.anytime_scrape import scrape_heatmap_data_by_http, HeatmapNotFoundError
+from util.heatmap_store import HeatmapStore
+from util.http_fetch import ConnectionPool, HttpError
+
+from util.custom_values import DATA_DIR
+
+SCRIPT_NAME = os.path.basename(__file__)[:-len(".py")]
+CHECKPOINT_PATH = os.path.join(DATA_DIR, "heatmap_backfill_checkpoint.json")
+# Videos without a heatmap (too new, too few views) are tried again after this many days
+RETRY_DAYS = 7
+# Checkpoint is written every this many videos
+CHECKPOINT_EVERY = 20
+
+
+def load_checkpoint(path: str=CHECKPOINT_PATH) -> dict:
+    """Return {video_id: {"date": "%Y-%m-%d", "error": str}} for videos that had no heatmap"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(checkpoint: dict, path: str=CHECKPOINT_PATH) -> None:
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+def get_todo_ids(store: HeatmapStore, checkpoint: dict, retry_days: int=RETRY_DAYS) -> list:
+    """Return ids of logged videos that aren't stored and had no heatmap in the last <retry_days>"""
+    retry_before = (dt.date.today() - dt.timedelta(days=retry_days)).strftime("%Y-%m-%d")
+    return [video["id"] for video in get_videos(False)
+            if video["id"] not in store
+            and not (video["id"] in checkpoint and checkpoint[video["id"]]["date"] > retry_before)]
+
+
+def backfill(workers: int=8, store: HeatmapStore=None) -> dict:
+    """
+    Fetch and store heatmaps of all logged videos that aren't stored yet, <workers> at the same time.
+    Uses plain HTTP only. Fetching is concurrent, storing happens in this thread so the store has one writer.
+    Only videos without a heatmap go in the checkpoint, other failures (rate limits, timeouts) are tried again next run.
+    Return the checkpoint.
+    """
+    store = store or HeatmapStore()
+    checkpoint = load_checkpoint()
+    todo_ids = get_todo_ids(store, checkpoint)
+    print(f"{len(store)} heatmaps stored, {len(todo_ids)} videos to do")
+
+    pool = ConnectionPool()
+    stored = 0
+    failed = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(scrape_heatmap_data_by_http, video_id, pool): video_id for video_id in todo_ids}
+            for done, future in enumerate(as_completed(futures), 1):
+                video_id = futures[future]
+                try:
+                    store.add(video_id, future.result())
+                    checkpoint.pop(video_id, None)
+                    stored += 1
+                except HeatmapNotFoundError as e:
+                    checkpoint[video_id] = {"date": dt.date.today().strftime("%Y-%m-%d"), "error": str(e)}
+                except (HttpError, OSError) as e:
+                    failed[video_id] = str(e)
+                except Exception as e:
+                    print(f"Couldn't get heatmap of {video_id}: {e}")
+                    failed[video_id] = str(e)
+                if done % CHECKPOINT_EVERY == 0:
+                    save_checkpoint(checkpoint)
+                    print(f"{done}/{len(todo_ids)} done, {stored} stored")
+    finally:
+        save_checkpoint(checkpoint)
+
+    print(f"Stored {stored} new heatmaps, {len(todo_ids)-stored-len(failed)} without heatmap, "
+          f"{len(failed)} failed (tried again next run)")
+    for error, count in Counter(failed.values()).most_common():
+        print(f"{count}x {error}")
+    return checkpoint
+
+
+# MAIN ------------------------------------------------------------------------
+
+@get_logging_decorator(os.path.join(DATA_DIR, "script_logs", SCRIPT_NAME))
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    backfill(workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Benchmarks of the data path (assembling, saving, parsing) on synthetic data, see benchmarks/run.py.
+Run from the py folder: python -m benchmarks.run
+"""
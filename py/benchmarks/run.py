@@ -0,0 +1,332 @@
+###############################################################################
+#
+# Benchmarks of the hot spots of the data path, on synthetic data the size
+# of a real channel (benchmarks/synthetic.py):
+#   - scrape_hourly.save_data on an Hourly_ csv with years of rows
+#   - both assemble_data functions of scrape_hourly and
+#     scrape_since_publish_functions, which are also checked to give the
+#     same rows
+#   - log_videos.adjust_video_log and update_video_log_recencies on a
+#     video log with thousands of videos
+#   - api_scrape_utils.stitch_strings and clean_response on a Data API
+#     response as the API Explorer shows it
+#   - anytime_scrape.parse_heatmap_data on full-size watch pages
+# The data is made from a fixed seed, so runs of different versions can be
+# compared. Results are written as json, --compare prints the change to an
+# earlier result file and exits with 1 on regressions or failed checks.
+#
+# Usage (from the py folder):
+#   python -m benchmarks.run [small|full] [--out <path>] [--compare <path>] [--only <name part>]
+#
+###############################################################################
+
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import scrape_hourly
+from util import scrape_since_publish_functions
+from util.log_videos import VideoLog, adjust_video_log, update_video_log_recencies
+from util.api_scrape_utils import stitch_strings, clean_response
+from util.anytime_scrape import parse_heatmap_data
+
+from util.custom_values import DATA_DIR
+from util.constants import ScrapeMode
+
+from . import synthetic
+from .synthetic import HOUR_MS, MINUTE_MS
+
+SEED = 20210817
+SCALES = {
+    # Quick check that everything runs
+    "small": {"videos": 300, "years": .5, "cards": 50, "payloads": 3, "api_items": 20, "pages": 3, "repeat": 3},
+    # A channel with thousands of videos and years of hourly data
+    "full": {"videos": 3000, "years": 3, "cards": 200, "payloads": 10, "api_items": 50, "pages": 10, "repeat": 5},
+}
+# A benchmark that takes this much longer than in the compared result is a regression
+REGRESSION_THRESHOLD = .2
+# Lines of the API Explorer editor that are rendered at once, and how far one scroll moves it
+EDITOR_WINDOW = 60
+EDITOR_SCROLL = 40
+
+
+def measure(name: str, fn, setup=None, repeat: int=5, items: int=1, params: dict=None) -> dict:
+    """
+    Time <fn>(*setup()) <repeat> times, with the setup (copying files and such) outside the timing.
+    Printing is suppressed while timing. Return the result with the seconds of every repeat.
+    """
+    seconds = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn(*args)
+            seconds.append(time.perf_counter() - start)
+    best = min(seconds)
+    result = {
+        "name": name,
+        "params": params or {},
+        "items": items,
+        "repeat": repeat,
+        "seconds": [round(s, 6) for s in seconds],
+        "min": round(best, 6),
+        "median": round(statistics.median(seconds), 6),
+        "items_per_second": round(items/best, 1) if best else None,
+    }
+    print(f"{name:<45} min {best*1000:10.2f} ms   median {result['median']*1000:10.2f} ms   "
+          f"{result['items_per_second']} items/s")
+    return result
+
+
+def same_rows(a: list, b: list) -> bool:
+    """Same rows with the keys in the same order (the order becomes the csv header)"""
+    return a == b and [list(row) for row in a] == [list(row) for row in b]
+
+
+# BENCHMARKS ------------------------------------------------------------------
+# Every benchmark takes (rng, scale, dir) and returns (results, checks)
+
+def bench_save_data(rng: random.Random, scale: dict, dir: str) -> tuple:
+    ids = synthetic.video_ids(rng, scale["videos"])
+    hours = int(scale["years"]*365*24)
+    rows = synthetic.hourly_rows(rng, ids, hours)
+    base_path = os.path.join(dir, "Hourly_base.csv")
+    synthetic.write_hourly_csv(base_path, rows)
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    params = {"rows": hours, "columns": len(fieldnames), "megabytes": round(os.path.getsize(base_path)/2**20, 1)}
+
+    # A scrape an hour later: 48 rows of which the last 24 are new, with videos that are already columns
+    columns = [key for key in fieldnames if key not in ("datetime(UTC)", "day", "views")][-10:]
+    data = []
+    for hour in range(-24, 24):
+        datetime = synthetic.START + dt.timedelta(hours=hours + hour)
+        data.append(dict({"datetime(UTC)": datetime, "day": datetime.strftime('%a'), "views": rng.randint(0, 5000)},
+                         **{id: rng.randint(0, 500) for id in columns}))
+    # Same, but a video the channel never had in the card before
+    new_id = synthetic.video_ids(rng, 1)[0]
+    new_column_data = [dict(row, **{new_id: 1}) for row in data]
+
+    def setup() -> tuple:
+        shutil.copyfile(base_path, os.path.join(dir, "Hourly_bench.csv"))
+        return ()
+
+    results = [
+        measure("save_data/append", lambda: scrape_hourly.save_data(data, "Hourly_bench", dir + os.sep),
+                setup, scale["repeat"], len(data), params),
+        measure("save_data/new_column", lambda: scrape_hourly.save_data(new_column_data, "Hourly_bench", dir + os.sep),
+                setup, scale["repeat"], len(data), params),
+    ]
+
+    # Only the new rows were appended, and every row still has every field
+    setup()
+    with contextlib.redirect_stdout(io.StringIO()):
+        scrape_hourly.save_data(new_column_data, "Hourly_bench", dir + os.sep)
+    with open(os.path.join(dir, "Hourly_bench.csv"), "r", newline='') as f:
+        lines = f.read().splitlines()
+    checks = {"save_data": len(lines) == hours + 1 + 24 and lines[0].endswith(new_id)
+              and all(line.count(",") >= len(fieldnames) for line in lines[-24:])}
+    return results, checks
+
+
+def bench_assemble(rng: random.Random, scale: dict, dir: str) -> tuple:
+    ids = synthetic.video_ids(rng, scale["videos"])
+    cases = [
+        ("hourly_channel", [synthetic.card(rng, ScrapeMode.channel, ids) for _ in range(scale["cards"])],
+         lambda f, card: f(card, ScrapeMode.channel), scrape_hourly),
+        ("hourly_video", [synthetic.card(rng, ScrapeMode.video) for _ in range(scale["cards"])],
+         lambda f, card: f(card, ScrapeMode.video), scrape_hourly),
+        ("minutes_video", [synthetic.card(rng, ScrapeMode.video, n_points=61, step_ms=MINUTE_MS,
+                                          window="last60MinutesData") for _ in range(scale["cards"])],
+         lambda f, card: f(card, ScrapeMode.video, "last60MinutesData"), scrape_hourly),
+        ("first_24h", [synthetic.metrics_data(rng, 24*60, MINUTE_MS, "minute") for _ in range(scale["payloads"])],
+         lambda f, metrics_data: f(metrics_data), scrape_since_publish_functions),
+        ("since_published", [synthetic.metrics_data(rng, 30*24, HOUR_MS) for _ in range(scale["payloads"])],
+         lambda f, metrics_data: f(metrics_data), scrape_since_publish_functions),
+    ]
+
+    results, checks = [], {}
+    for name, payloads, call, module in cases:
+        params = {"payloads": len(payloads)}
+        for variant, f in [("loop", module.assemble_data), ("vectorized", module.assemble_data_vectorized)]:
+            results.append(measure(f"assemble_data/{name}/{variant}", lambda: [call(f, payload) for payload in payloads],
+                                   repeat=scale["repeat"], items=len(payloads), params=params))
+        checks[f"assemble_data/{name}"] = all(
+            same_rows(call(module.assemble_data, payload), call(module.assemble_data_vectorized, payload))
+            for payload in payloads)
+    return results, checks
+
+
+def bench_video_log(rng: random.Random, scale: dict, dir: str) -> tuple:
+    base_path = os.path.join(dir, "video_log_base.csv")
+    path = os.path.join(dir, "video_log.csv")
+    ids = synthetic.video_ids(rng, scale["videos"])
+    synthetic.write_video_log(base_path, rng, ids, scale["years"])
+    params = {"videos": len(ids)}
+    new_id = synthetic.video_ids(rng, 1)[0]
+
+    def setup_log() -> tuple:
+        shutil.copyfile(base_path, path)
+        return ()
+
+    def setup_recencies() -> tuple:
+        # Like after a long pause: every video is still marked recent, most have to be updated
+        shutil.copyfile(base_path, path)
+        log = VideoLog.load(path)
+        return [dict(video, recent=1) for video in log.sorted_videos()], log
+
+    results = [
+        measure("adjust_video_log", lambda: adjust_video_log(dt.datetime.utcnow(), new_id, "New video", path=path),
+                setup_log, scale["repeat"], 1, params),
+        measure("update_video_log_recencies", lambda videos, log: update_video_log_recencies(videos, log=log),
+                setup_recencies, scale["repeat"], len(ids), params),
+    ]
+
+    setup_log()
+    with contextlib.redirect_stdout(io.StringIO()):
+        adjust_video_log(dt.datetime.utcnow(), new_id, "New video", path=path)
+    log = VideoLog.load(path)
+    checks = {"adjust_video_log": len(log) == len(ids) + 1 and new_id in log}
+    return results, checks
+
+
+def bench_api_response(rng: random.Random, scale: dict, dir: str) -> tuple:
+    text = synthetic.api_response_json(rng, synthetic.video_ids(rng, scale["api_items"]))
+    html = synthetic.codemirror_html(text)
+    windows = synthetic.scroll_windows(html, EDITOR_WINDOW, EDITOR_SCROLL)
+    params = {"kilobytes": round(len(html)/1024, 1), "windows": len(windows)}
+
+    def stitch_all() -> str:
+        response = ""
+        for window in windows:
+            response = stitch_strings(response, window)
+        return response
+
+    results = [
+        measure("stitch_strings", stitch_all, repeat=scale["repeat"], items=len(windows), params=params),
+        measure("clean_response", lambda: clean_response(html), repeat=scale["repeat"], items=1, params=params),
+    ]
+    checks = {
+        "stitch_strings": stitch_all() == html,
+        "clean_response": json.loads(clean_response(html)) == json.loads(text),
+    }
+    return results, checks
+
+
+def bench_heatmap(rng: random.Random, scale: dict, dir: str) -> tuple:
+    pages = [synthetic.watch_page(rng, id) for id in synthetic.video_ids(rng, scale["pages"])]
+    params = {"pages": len(pages), "kilobytes_per_page": round(statistics.mean(len(page) for page in pages)/1024, 1)}
+    results = [measure("parse_heatmap_data", lambda: [parse_heatmap_data(page) for page in pages],
+                       repeat=scale["repeat"], items=len(pages), params=params)]
+    checks = {"parse_heatmap_data": all(len(parse_heatmap_data(page)) == 100 for page in pages)}
+    return results, checks
+
+
+BENCHMARKS = [bench_save_data, bench_assemble, bench_video_log, bench_api_response, bench_heatmap]
+
+
+# RUNNING AND COMPARING -------------------------------------------------------
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(scale_name: str="full", only: str=None, seed: int=SEED) -> dict:
+    """Run the benchmarks (those with <only> in their function name if given), return the results with the environment"""
+    scale = SCALES[scale_name]
+    report = {
+        "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "scale": scale_name,
+        "seed": seed,
+        "results": [],
+        "checks": {},
+    }
+    with tempfile.TemporaryDirectory() as dir:
+        for benchmark in BENCHMARKS:
+            if only and only not in benchmark.__name__:
+                continue
+            # Every benchmark gets its own seeded data, so running a subset gives the same data
+            results, checks = benchmark(random.Random(f"{seed}-{benchmark.__name__}"), scale, dir)
+            report["results"].extend(results)
+            report["checks"].update(checks)
+    for name, ok in report["checks"].items():
+        if not ok:
+            print(f"Check failed: {name}")
+    return report
+
+
+def compare(report: dict, old_report: dict, threshold: float=REGRESSION_THRESHOLD) -> list:
+    """Print the change of every benchmark in both reports, return the names that got slower by more than <threshold>"""
+    old_results = {result["name"]: result for result in old_report["results"]}
+    if old_report.get("scale") != report["scale"]:
+        print(f"Not comparing with a result of a different scale ({old_report.get('scale')})")
+        return []
+    print(f"\nCompared to {old_report.get('commit')} ({old_report.get('timestamp')}):")
+    regressions = []
+    for result in report["results"]:
+        old = old_results.get(result["name"])
+        if old is None or not old["min"]:
+            continue
+        ratio = result["min"] / old["min"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(result["name"])
+            flag = "  REGRESSION"
+        print(f"{result['name']:<45} {old['min']*1000:10.2f} ms -> {result['min']*1000:10.2f} ms   x{ratio:.2f}{flag}")
+    return regressions
+
+
+def get_option(args: list, name: str) -> str:
+    """Return the value after --<name> in <args>, None if it isn't there"""
+    if f"--{name}" in args:
+        index = args.index(f"--{name}")
+        if index + 1 < len(args):
+            return args[index + 1]
+    return None
+
+
+# MAIN ------------------------------------------------------------------------
+
+def main():
+    args = sys.argv[1:]
+    scale_name = args[0] if args and args[0] in SCALES else "full"
+    out_path = get_option(args, "out") or os.path.join(
+        DATA_DIR, "benchmarks", f"benchmark_{scale_name}_{dt.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    compare_path = get_option(args, "compare")
+
+    report = run_benchmarks(scale_name, get_option(args, "only"))
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Written results to {out_path}")
+
+    failed = [name for name, ok in report["checks"].items() if not ok]
+    regressions = []
+    if compare_path:
+        with open(compare_path, "r") as f:
+            regressions = compare(report, json.load(f))
+    if failed or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Synthetic data at the size of a real channel, for the benchmarks.
+Everything is made from a seeded random.Random, so the same seed gives the same data on every machine and version.
+The structures are the ones the scrapers get: realtime cards, explore chart data, the video log, the Data API
+response html of the API Explorer, and watch pages with heat markers.
+"""
+
+import datetime as dt
+import json
+import random
+import string
+
+from util.csv_append import append_rows
+from util.log_videos import VideoLog
+from util.constants import TRAFFIC_SOURCES, TRAFFIC_SOURCES_IMP, ScrapeMode
+
+ID_CHARS = string.ascii_letters + string.digits + "-_"
+HOUR_MS = 60*60*1000
+MINUTE_MS = 60*1000
+# Like the first row of a real Hourly_ csv
+START = dt.datetime(2021, 8, 17, tzinfo=dt.timezone.utc)
+
+
+def video_ids(rng: random.Random, n: int) -> list:
+    return ["".join(rng.choice(ID_CHARS) for _ in range(11)) for _ in range(n)]
+
+
+def title(rng: random.Random) -> str:
+    return " ".join("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9)))
+                    for _ in range(rng.randint(3, 10))).capitalize()
+
+
+def percentages(rng: random.Random, n: int) -> list:
+    """sparkChartPercentages of a card category"""
+    values = [rng.random() for _ in range(n)]
+    total = sum(values)
+    return [value/total for value in values]
+
+
+# REALTIME (scrape_hourly) ----------------------------------------------------
+
+def card(rng: random.Random, mode: ScrapeMode, ids: list=None, n_points: int=49, step_ms: int=HOUR_MS,
+window: str="last48HoursData", n_categories: int=10) -> dict:
+    """
+    Realtime card like scrape_hourly.scrape returns. The table has the top videos (channel)
+    or traffic sources (video) of the window, the last datapoint is the ongoing hour/minute.
+    """
+    end_ms = int(START.timestamp()*1000) + rng.randint(0, 2*365*24)*HOUR_MS
+    chart = [{"x": end_ms - (n_points-1-i)*step_ms, "y": rng.randint(0, 5000)} for i in range(n_points)]
+    table = []
+    if mode == ScrapeMode.channel:
+        for id in rng.sample(ids, min(n_categories, len(ids))):
+            table.append({
+                "analyticsLink": {"routeLink": {"route": {"params": {"videoId": id}}}},
+                "value": f"{rng.randint(0, 2000000):,}",
+                "sparkChartPercentages": percentages(rng, n_points),
+            })
+    else:
+        shares = [rng.random() for _ in range(n_categories)]
+        for i, share in enumerate(shares):
+            table.append({
+                "title": f"Source {i}",
+                "value": f"{share/sum(shares)*100:.1f}%",
+                "sparkChartPercentages": percentages(rng, n_points),
+            })
+    return {window: {
+        "totalMetricValue": f"{sum(datapoint['y'] for datapoint in chart):,}",
+        "mainChart": {"data": chart},
+        "table": table,
+    }}
+
+
+def hourly_rows(rng: random.Random, ids: list, hours: int, videos_per_hour: int=10) -> list:
+    """
+    Rows of a channel's Hourly_ csv over <hours> hours. Every hour has a column for the videos that were in
+    the card then, so over the years the header gets a column for every video that was ever in the top.
+    """
+    rows = []
+    for hour in range(hours):
+        datetime = START + dt.timedelta(hours=hour)
+        row = {"datetime(UTC)": datetime, "day": datetime.strftime('%a'), "views": rng.randint(0, 5000)}
+        # Videos stay in the top for a while, so take them from a window that moves through the ids
+        offset = hour * len(ids) // max(hours, 1)
+        for id in rng.sample(ids[max(0, offset-50):offset+50] or ids, videos_per_hour):
+            row[id] = rng.randint(0, 500)
+        rows.append(row)
+    return rows
+
+
+def write_hourly_csv(filepath: str, rows: list) -> None:
+    """Write like years of save_data calls would have: the header has every column, missing values are empty"""
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    append_rows(filepath, rows, fieldnames)
+
+
+# SINCE PUBLISHED (scrape_since_publish) --------------------------------------
+
+def metrics_data(rng: random.Random, n_points: int, step_ms: int, unit: str="hour") -> dict:
+    """
+    metrics_data like scrape_metrics_single_load returns, every traffic source of every metric has <n_points>.
+    first_24h is minute data (1440 points), since_published hourly (up to 30 days).
+    Some traffic sources are missing and some are shorter, like for a video that's still getting its first views.
+    """
+    publish_ms = int(START.timestamp()*1000) + rng.randint(0, 2*365*24)*HOUR_MS
+    x_ms = [publish_ms + i*step_ms for i in range(n_points)]
+    time_deltas = [f"First {i} {unit}s" for i in range(n_points)]
+
+    def category(name: str, scale: int) -> dict:
+        length = n_points if rng.random() < .9 else rng.randint(1, n_points)
+        return {"name": name, "data": [{"x": x_ms[i], "y": rng.randint(0, scale),
+                                        "hovercardInfo": {"relativeDateFormatted": time_deltas[i]}}
+                                       for i in range(length)]}
+
+    sources = list(TRAFFIC_SOURCES)
+    data = {}
+    for metric_key, scale in [("views", 1000), ("watchtime", 10**8), ("impressions", 10**4)]:
+        names = sources if metric_key != "impressions" else list(TRAFFIC_SOURCES_IMP)
+        data[metric_key] = [category(name, scale) for name in names if rng.random() < .85]
+    for metric_key in ["likes", "dislikes", "subs"]:
+        data[metric_key] = [category("MAIN_METRIC_SERIES_NAME", 50)]
+    return data
+
+
+# VIDEO LOG (log_videos) ------------------------------------------------------
+
+def write_video_log(filepath: str, rng: random.Random, ids: list, years: float) -> VideoLog:
+    """Write a video log with <ids> uploaded over the last <years>, return it loaded"""
+    now = dt.datetime.utcnow()
+    log = VideoLog(filepath)
+    for id in ids:
+        date = now - dt.timedelta(minutes=rng.randint(0, int(years*365*24*60)))
+        recent = int(now - date < dt.timedelta(days=31))
+        log.upsert(date, id, title(rng), recent=recent, precise=rng.randint(0, 1))
+    log.save(force=True)
+    return VideoLog.load(filepath)
+
+
+# DATA API RESPONSE (api_scrape_utils) ----------------------------------------
+
+def api_response_json(rng: random.Random, ids: list) -> str:
+    """Pretty printed videos list response like the API Explorer shows it"""
+    items = [{
+        "kind": "youtube#video",
+        "id": id,
+        "snippet": {
+            "publishedAt": (START + dt.timedelta(minutes=rng.randint(0, 10**6))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "channelId": "UC" + "".join(rng.choice(ID_CHARS) for _ in range(22)),
+            "title": title(rng),
+            "description": " ".join(title(rng) for _ in range(rng.randint(0, 20))),
+        },
+    } for id in ids]
+    return json.dumps({"kind": "youtube#videoListResponse", "items": items}, indent=2)
+
+
+def codemirror_html(text: str) -> str:
+    """The html of the CodeMirror lines that show <text>, like the raw response tab of the API Explorer"""
+    lines = ['<pre class=" CodeMirror-line " role="presentation"><span role="presentation" style="padding-right: 0.1px;">'
+             + line + '</span></pre>' for line in text.split("\n")]
+    # The last line ends like scrape_api_response waits for
+    lines[-1] = lines[-1][:-len('</span></pre>')] + '</span></span></pre>'
+    return '<div class="CodeMirror-code">HTTP/1.1 200\n' + "".join(lines)
+
+
+def scroll_windows(html: str, window: int, step: int) -> list:
+    """
+    The innerHTML scrape_api_response gets every time it scrolls: the rendered part of the editor, <window> lines
+    starting <step> lines further every time, so consecutive windows overlap.
+    """
+    lines = html.split("</pre>")
+    lines = [line + "</pre>" for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+    windows = []
+    for start in range(0, max(len(lines) - window, 0) + step, step):
+        windows.append("".join(lines[start:start+window]))
+        if start + window >= len(lines):
+            break
+    return windows
+
+
+# WATCH PAGES (anytime_scrape) ------------------------------------------------
+
+def watch_page(rng: random.Random, video_id: str, n_markers: int=100, filler_kb: int=900) -> str:
+    """
+    Watch page html with the heat markers in ytInitialData, like a real one: about a megabyte, with the
+    player response (which is bigger) before it and the markers deep in the initial data.
+    """
+    def filler(size: int) -> dict:
+        return {"items": [{"id": video_ids(rng, 1)[0], "text": title(rng)*4} for _ in range(size // 200)]}
+
+    markers = [{"heatMarkerRenderer": {
+        "timeRangeStartMillis": i*5000,
+        "markerDurationMillis": 5000,
+        "heatMarkerIntensityScoreNormalized": rng.random(),
+    }} for i in range(n_markers)]
+    initial_data = {
+        "contents": {"twoColumnWatchNextResults": filler(filler_kb*1024 // 3)},
+        "frameworkUpdates": {"entityBatchUpdate": {"mutations": [{"payload": {"macroMarkersListEntity": {
+            "markersList": {"markersType": "MARKER_TYPE_HEATMAP", "markers": markers},
+            "heatMarkers": markers,
+        }}}]}},
+        "engagementPanels": filler(filler_kb*1024 // 6),
+    }
+    player_response = {"videoDetails": {"videoId": video_id}, "streamingData": filler(filler_kb*1024 // 2)}
+    return ("<!DOCTYPE html><html><head><title>Video</title></head><body>"
+            + "<script>" + "var a=1;"*2000 + "</script>"
+            + f"<script>var ytInitialPlayerResponse = {json.dumps(player_response)};</script>"
+            + f"<script>var ytInitialData = {json.dumps(initial_data)};</script>"
+            + "</body></html>")
@@ -0,0 +1,172 @@
+###############################################################################
+#
+# Script to capture the realtime views of one video by the minute, for
+# example from ~30 minutes before a thumbnail/title switch until a while
+# after it. Polls the realtime card (last60MinutesData) in one open page,
+# keeps the minutes in memory without the overlap between polls, and
+# appends them to Minutes_<video_id>.csv in batches.
+#
+# Usage: python capture_minutes.py <video_id> [minutes to capture] [seconds between polls]
+#
+###############################################################################
+
+import collections
+import datetime as dt
+import os
+import sys
+import time
+
+from scrape_hourly import read_card, assemble_data_vectorized
+from util.driver_session import DriverSession, get_session
+from util.helpers import test_YouTube_login
+from util.log_errors import get_logging_decorator
+from util.csv_append import read_header, read_last_row, append_rows
+from util.network_capture import NetworkCapture, is_latest_activity_card
+from util.payload_journal import PayloadJournal, open_journal, journal_payload, MINUTES_VIDEO
+
+from util.custom_values import DATA_DIR, NETWORK_CAPTURE
+from util.constants import ScrapeMode, ANALYTICS_URL
+
+SCRIPT_NAME = os.path.basename(__file__)[:-len(".py")]
+WINDOW = "last60MinutesData"
+# The card shows the last 60 minutes, so polls can be up to an hour apart without missing minutes
+POLL_INTERVAL = 60
+# Rows are written every this many polls (and when the capture stops)
+FLUSH_EVERY = 10
+# Most minutes kept in memory
+BUFFER_SIZE = 24*60
+
+
+class MinuteBuffer(object):
+    """
+    Ring buffer of minute rows by datetime. Every poll gives the last 60 minutes again, so minutes that are
+    already in the buffer are updated instead of added, and minutes that are already written are ignored.
+    """
+    def __init__(self, flushed_until: dt.datetime=None, maxlen: int=BUFFER_SIZE):
+        self.rows = collections.OrderedDict() # datetime: row, oldest first
+        self.maxlen = maxlen
+        self.flushed_until = flushed_until
+
+    def add(self, rows: list) -> int:
+        """Add rows of a poll, return the number of new minutes"""
+        new = 0
+        for row in rows:
+            datetime = row["datetime(UTC)"]
+            if self.flushed_until is not None and datetime <= self.flushed_until:
+                continue
+            if datetime not in self.rows:
+                new += 1
+            self.rows[datetime] = row
+        self.rows = collections.OrderedDict(sorted(self.rows.items()))
+        while len(self.rows) > self.maxlen:
+            self.rows.popitem(last=False)
+        return new
+
+    def pending(self) -> list:
+        """Return the rows that haven't been written yet, oldest first"""
+        return [row for datetime, row in self.rows.items()
+                if self.flushed_until is None or datetime > self.flushed_until]
+
+    def mark_flushed(self, rows: list) -> None:
+        if rows:
+            self.flushed_until = rows[-1]["datetime(UTC)"]
+
+
+def get_last_datetime(filepath: str) -> dt.datetime:
+    """Return datetime of the last row in the csv, None if there is none"""
+    if not os.path.isfile(filepath):
+        return None
+    last_row = read_last_row(filepath, read_header(filepath))
+    if not last_row:
+        return None
+    return dt.datetime.strptime(last_row['datetime(UTC)'], "%Y-%m-%d %H:%M:%S%z")
+
+
+def flush(buffer: MinuteBuffer, filepath: str) -> int:
+    """Append the pending rows of <buffer> to the csv, return how many"""
+    rows = buffer.pending()
+    if rows:
+        append_rows(filepath, rows)
+        buffer.mark_flushed(rows)
+    return len(rows)
+
+
+def capture(video_id: str, minutes: float=None, interval: float=POLL_INTERVAL, flush_every: int=FLUSH_EVERY,
+dir: str=DATA_DIR, session: DriverSession=None, capture_network: bool=NETWORK_CAPTURE,
+journal: PayloadJournal=None) -> MinuteBuffer:
+    """
+    Poll the realtime card of <video_id> every <interval> seconds for <minutes> (until interrupted if None),
+    by refreshing the page that's opened once. Return the buffer with the captured minutes.
+    Every card is kept in <journal> if given.
+    """
+    filepath = os.path.join(dir, f"Minutes_{video_id}.csv")
+    buffer = MinuteBuffer(get_last_datetime(filepath))
+    session, owned = get_session(session)
+    driver = session.driver
+    network = NetworkCapture(driver) if capture_network else None
+    end_time = time.time() + minutes*60 if minutes else None
+
+    poll_times = []
+    polls = 0
+    try:
+        while True:
+            start = time.time()
+            card_data = None
+            if network:
+                try:
+                    network.clear()
+                except Exception as e:
+                    print(f"Can't capture network ({e}), reading the card from the page")
+                    network = None
+            if polls == 0:
+                driver.get(ANALYTICS_URL.format(mode=ScrapeMode.video.name, id=video_id))
+            else:
+                driver.refresh()
+            if network:
+                try:
+                    card_data = network.wait_for_json(is_latest_activity_card)
+                except Exception as e:
+                    print(f"Card data not captured ({e}), reading the card from the page")
+            if card_data is None:
+                card_data = read_card(driver)
+
+            journal_payload(journal, video_id, MINUTES_VIDEO, card_data)
+            new = buffer.add(assemble_data_vectorized(card_data, ScrapeMode.video, WINDOW))
+            polls += 1
+            poll_times.append(time.time() - start)
+            if polls % flush_every == 0:
+                written = flush(buffer, filepath)
+                print(f"{dt.datetime.now()}: written {written} minutes, "
+                      f"mean poll {sum(poll_times)/len(poll_times):.2f}s of {interval}s interval")
+                poll_times = []
+            if new == 0 and polls > 1:
+                print(f"{dt.datetime.now()}: no new minutes in this poll")
+
+            if end_time is not None and time.time() >= end_time:
+                break
+            time.sleep(max(0, interval - (time.time() - start)))
+    finally:
+        written = flush(buffer, filepath)
+        print(f"Captured {polls} polls, written {written} more minutes to {filepath}")
+        if owned:
+            session.quit()
+    return buffer
+
+
+# MAIN ------------------------------------------------------------------------
+
+@get_logging_decorator(os.path.join(DATA_DIR, "script_logs", SCRIPT_NAME))
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python capture_minutes.py <video_id> [minutes to capture] [seconds between polls]")
+        return
+    video_id = sys.argv[1]
+    minutes = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    interval = float(sys.argv[3]) if len(sys.argv) > 3 else POLL_INTERVAL
+
+    with DriverSession(printing=True) as session:
+        test_YouTube_login(session.driver)
+        capture(video_id, minutes, interval, session=session, journal=open_journal())
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,14 @@
 from util.custom_values import DATA_DIR
-from util.constants import ScrapeMode, CHANNEL_ID
-from scrape_hourly import parse_string, init_date, assemble_data, save_data
-import os
+from util.constants import ScrapeMode
+from util.payload_journal import HOURLY_CHANNEL, HOURLY_VIDEO
+from replay import replay, file_items
 
-def process_string(mode: ScrapeMode=ScrapeMode.channel, 
-dir: str='', string: str='') -> None:
-    """Weaves all basic functionality together"""
-    # Process string
-    card_obj = parse_string(string)
-    id = CHANNEL_ID
-    if mode == ScrapeMode.video:
-        id = card_obj \
-            ["exploreConfig"]["restrictAndTimePeriodConfig"]["entity"]["id"]
 
-    date_dict = init_date(card_obj["lastUpdated"])
-
-    data = assemble_data(card_obj, date_dict, mode)
-    save_data(data, f"Hourly_{id}", dir)
-
-
-def pass_strings(mode: ScrapeMode, name: str, dir: str='') -> None:
+def pass_strings(mode: ScrapeMode, name: str, dir: str='', dry_run: bool=False) -> dict:
     """
     Parse strings and save to csv. Meant to go through text files
-    containing the mini-card attribute as a string instead of
-    scraping it.
+    containing the card attribute as a (json) string instead of
+    scraping it. Uses the replay pipeline (replay.py).
 
     Parameters
     ----------
@@ -39,16 +24,11 @@ def pass_strings(mode: ScrapeMode, name: str, dir: str='') -> None:
         Would be "Total"
     dir : str
         The directory that contains the textfiles.
+    dry_run : bool
+        Only compare with the csvs instead of saving.
     """
-    filenames = os.listdir(dir)
-    for filename in filenames:
-        if name not in filename:
-            continue
-
-        with open(dir+filename, "r") as f:
-            string = f.read()
-        print(f"Parsing file: {filename}")
-        process_string(mode, string=string, dir=DATA_DIR)
+    replay_mode = HOURLY_CHANNEL if mode == ScrapeMode.channel else HOURLY_VIDEO
+    return replay(file_items(replay_mode, dir, name), DATA_DIR, dry_run)
 
 if __name__ == "__main__":
     pass_strings(ScrapeMode.video, "EnergyStuck", DATA_DIR+"data\\")
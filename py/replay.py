@@ -0,0 +1,221 @@
+###############################################################################
+#
+# Offline replay of recorded payloads (realtime cards, explore chart data)
+# through the assemble_data functions and the csv/storage writers, so data
+# can be rebuilt without scraping again. The payloads come from the payload
+# journal (util/payload_journal.py) or from saved json files.
+# Payloads are assembled in a process pool, writing happens in this
+# process in the order the payloads were recorded.
+# With --dry-run nothing is written, the result is compared to the csvs.
+#
+# Usage:
+#   python replay.py journal [mode] [entity] [--dry-run]
+#   python replay.py files <mode> <dir> [filename part] [--dry-run]
+# where mode is Hourly_channel, Hourly_video, Minutes_video, since_published or first_24h
+#
+###############################################################################
+
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import scrape_hourly
+import scrape_since_publish
+from util.scrape_since_publish_functions import assemble_data_vectorized as assemble_metrics_data
+from util.payload_journal import PayloadJournal, JOURNAL_DIR, HOURLY_CHANNEL, HOURLY_VIDEO, MINUTES_VIDEO
+from util.storage import Storage, open_storage
+from util.log_errors import get_logging_decorator
+
+from util.custom_values import CHANNEL_ID, DATA_DIR
+from util.constants import ScrapeMode, TimePeriod
+
+SCRIPT_NAME = os.path.basename(__file__)[:-len(".py")]
+MODES = [HOURLY_CHANNEL, HOURLY_VIDEO, MINUTES_VIDEO] + [time_period.name for time_period in TimePeriod]
+# Payloads per task sent to a worker process
+CHUNK_SIZE = 16
+# Throughput is printed every this many payloads
+REPORT_EVERY = 500
+
+
+# ASSEMBLING (in the worker processes) ----------------------------------------
+
+def get_title(mode: str, entity: str) -> str:
+    """Return the csv title the data of <mode> goes to, like the scripts name them"""
+    if mode in [HOURLY_CHANNEL, HOURLY_VIDEO]:
+        return f"Hourly_{entity}"
+    if mode == MINUTES_VIDEO:
+        return f"Minutes_{entity}"
+    return f"{mode}_{entity}"
+
+
+def get_entity(payload: dict, mode: str, filename: str) -> str:
+    """Return the channel or video id of a payload from a file, which doesn't say it like the journal index does"""
+    if mode == HOURLY_CHANNEL:
+        return CHANNEL_ID
+    try:
+        return payload["exploreConfig"]["restrictAndTimePeriodConfig"]["entity"]["id"]
+    except (KeyError, TypeError):
+        # Files named like the csvs: <mode>_<video id>.json
+        return os.path.splitext(filename)[0][-11:]
+
+
+def assemble(mode: str, payload: dict) -> list:
+    """Return the rows the scripts would have made from <payload>, None if assemble_data couldn't"""
+    if mode == HOURLY_CHANNEL:
+        return scrape_hourly.assemble_data_vectorized(payload, ScrapeMode.channel)
+    if mode == HOURLY_VIDEO:
+        return scrape_hourly.assemble_data_vectorized(payload, ScrapeMode.video)
+    if mode == MINUTES_VIDEO:
+        return scrape_hourly.assemble_data_vectorized(payload, ScrapeMode.video, "last60MinutesData")
+    return assemble_metrics_data(payload)
+
+
+def replay_item(item: dict) -> dict:
+    """
+    Load and assemble one payload. <item> is {"mode", "entity", "path"} for a file or
+    {"mode", "entity", "journal_dir", "entry"} for a journal entry.
+    Return the item with "title" and "data", or "error" if it failed.
+    """
+    try:
+        if "path" in item:
+            with open(item["path"], "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            entity = item["entity"] or get_entity(payload, item["mode"], os.path.basename(item["path"]))
+        else:
+            payload = PayloadJournal(item["journal_dir"]).read(item["entry"])
+            entity = item["entity"]
+        data = assemble(item["mode"], payload)
+        if not data:
+            raise ValueError("assemble_data gave no data")
+        return dict(item, title=get_title(item["mode"], entity), data=data)
+    except Exception as e:
+        return dict(item, error=f"{type(e).__name__}: {e}")
+
+
+# SOURCES ---------------------------------------------------------------------
+
+def journal_items(journal_dir: str=JOURNAL_DIR, mode: str=None, entity: str=None) -> list:
+    """Return items for the journal entries that match, in recorded order"""
+    journal = PayloadJournal(journal_dir)
+    return [{"mode": entry["mode"], "entity": entry["entity"], "journal_dir": journal_dir, "entry": entry}
+            for entry in journal.iter_index()
+            if (mode is None or entry["mode"] == mode) and (entity is None or entry["entity"] == entity)]
+
+
+def file_items(mode: str, dir: str, name: str="", entity: str=None) -> list:
+    """Return items for the json files in <dir> with <name> in the filename, sorted by filename"""
+    return [{"mode": mode, "entity": entity, "path": os.path.join(dir, filename)}
+            for filename in sorted(os.listdir(dir)) if name in filename]
+
+
+# WRITING AND COMPARING -------------------------------------------------------
+
+def save(title: str, data: list, dir: str, storage: Storage=None) -> None:
+    """Write like the scripts: append realtime data, overwrite since published data"""
+    if title.startswith("Hourly_") or title.startswith("Minutes_"):
+        scrape_hourly.save_data(data, title, dir, storage)
+    else:
+        scrape_since_publish.save_data(data, title, dir, storage)
+
+
+def diff_csv(title: str, data: list, dir: str) -> dict:
+    """
+    Compare assembled rows to <dir><title>.csv by datetime.
+    Return counts of rows that are new, the same, or different, and the columns the csv doesn't have.
+    """
+    filepath = dir + f"{title}.csv"
+    result = {"new": 0, "same": 0, "different": 0, "new_columns": []}
+    if not os.path.isfile(filepath):
+        result["new"] = len(data)
+        return result
+
+    with open(filepath, "r", newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames or []
+        logged = {row["datetime(UTC)"]: row for row in reader}
+    result["new_columns"] = sorted({key for row in data for key in row} - set(fieldnames))
+
+    for row in data:
+        logged_row = logged.get(str(row["datetime(UTC)"]))
+        if logged_row is None:
+            result["new"] += 1
+        elif all(str(value) == logged_row.get(key, "") for key, value in row.items() if key in fieldnames):
+            result["same"] += 1
+        else:
+            result["different"] += 1
+    return result
+
+
+def replay(items: list, dir: str=DATA_DIR, dry_run: bool=False, workers: int=None, storage: Storage=None) -> dict:
+    """
+    Assemble <items> in a pool of <workers> processes (cpu count if None) and save them in order,
+    or only compare them to the csvs in <dir> if <dry_run>. Return a summary with the throughput and the diffs per title.
+    """
+    summary = {"payloads": len(items), "replayed": 0, "errors": {}, "diffs": {}}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for done, result in enumerate(executor.map(replay_item, items, chunksize=CHUNK_SIZE), 1):
+            source = result.get("path") or f"{result['entry']['month']}:{result['entry']['offset']}"
+            if "error" in result:
+                print(f"Couldn't replay {source}: {result['error']}")
+                summary["errors"][source] = result["error"]
+            elif dry_run:
+                diff = diff_csv(result["title"], result["data"], dir)
+                total = summary["diffs"].setdefault(result["title"], {"new": 0, "same": 0, "different": 0, "new_columns": []})
+                for key in ["new", "same", "different"]:
+                    total[key] += diff[key]
+                total["new_columns"] = sorted(set(total["new_columns"]) | set(diff["new_columns"]))
+                summary["replayed"] += 1
+            else:
+                try:
+                    save(result["title"], result["data"], dir, storage)
+                    summary["replayed"] += 1
+                except Exception as e:
+                    print(f"Couldn't save {source}: {e}")
+                    summary["errors"][source] = f"{type(e).__name__}: {e}"
+
+            if done % REPORT_EVERY == 0:
+                print(f"{done}/{len(items)} payloads, {done/(time.perf_counter()-start):.1f} payloads/s")
+
+    seconds = time.perf_counter() - start
+    summary["seconds"] = round(seconds, 3)
+    summary["payloads_per_second"] = round(len(items)/seconds, 1) if seconds else None
+    print(f"Replayed {summary['replayed']}/{len(items)} payloads in {seconds:.1f}s "
+          f"({summary['payloads_per_second']} payloads/s), {len(summary['errors'])} errors")
+    if dry_run:
+        for title, diff in summary["diffs"].items():
+            print(f"{title}: {diff['new']} new rows, {diff['same']} the same, {diff['different']} different"
+                  + (f", new columns {diff['new_columns']}" if diff["new_columns"] else ""))
+    return summary
+
+
+# MAIN ------------------------------------------------------------------------
+
+@get_logging_decorator(os.path.join(DATA_DIR, "script_logs", SCRIPT_NAME))
+def main():
+    dry_run = "--dry-run" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--dry-run"]
+    if args and args[0] == "journal":
+        mode = args[1] if len(args) > 1 else None
+        entity = args[2] if len(args) > 2 else None
+        items = journal_items(mode=mode, entity=entity)
+    elif len(args) >= 3 and args[0] == "files" and args[1] in MODES:
+        items = file_items(args[1], args[2], args[3] if len(args) > 3 else "")
+    else:
+        print("Usage: python replay.py journal [mode] [entity] [--dry-run]\n"
+              "       python replay.py files <mode> <dir> [filename part] [--dry-run]\n"
+              f"modes: {', '.join(MODES)}")
+        return
+
+    storage = None if dry_run else open_storage()
+    try:
+        replay(items, DATA_DIR, dry_run, storage=storage)
+    finally:
+        if storage is not None:
+            storage.close()
+
+if __name__ == "__main__":
+    main()
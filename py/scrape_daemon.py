@@ -0,0 +1,186 @@
+###############################################################################
+#
+# Long-running replacement for starting scrape_hourly.py and
+# scrape_since_publish.py from the Windows Task Scheduler. Keeps one
+# browser warm and runs every job on its own schedule:
+#   - hourly:          the realtime card (scrape_hourly.py)
+#   - since_published: hourly data of recent videos (scrape_since_publish.py)
+#   - first_24h:       first 24 hours of every video
+#   - video_log:       new videos and precise upload times
+#
+# Jobs run one step at a time (one video, one page), and a more important
+# job that becomes due is run in between the steps of a long one.
+# Jobs never run twice at the same time, and a job that became due while
+# another was running is run right after it instead of being skipped.
+#
+# Usage: python scrape_daemon.py [workers]
+#
+###############################################################################
+
+import datetime as dt
+import os
+import random
+import sys
+import time
+from typing import Callable, Iterator
+
+from selenium.common.exceptions import WebDriverException, TimeoutException
+
+import scrape_hourly
+import scrape_since_publish
+from util.log_videos import update_video_log
+from util.helpers import reset_user_data
+from util.driver_session import DriverSession
+from util.log_errors import get_logging_decorator
+
+from util.custom_values import DATA_DIR, SCRAPE_WORKERS
+from util.constants import TimePeriod
+
+SCRIPT_NAME = os.path.basename(__file__)[:-len(".py")]
+# A random delay of up to this many seconds is added to every scheduled run
+JITTER = 5*60
+# A failed run is tried again after this many seconds, this many times, before waiting for the next scheduled run
+RETRY_DELAY = 60
+RETRY_ATTEMPTS = 3
+# Longest sleep while waiting for the next job, so the daemon notices a changed clock (sleep, hibernation)
+MAX_SLEEP = 60
+
+
+class Job(object):
+    """
+    A job that runs every <interval> as a generator of steps.
+    Lower <priority> is more important: a due job interrupts a running job with a higher priority between its steps.
+    """
+    def __init__(self, name: str, steps: Callable[[], Iterator], interval: dt.timedelta, priority: int=0,
+    jitter: float=JITTER):
+        self.name = name
+        self.steps = steps
+        self.interval = interval.total_seconds()
+        self.priority = priority
+        self.jitter = jitter
+        self.next_due = time.time() # Everything runs once at startup
+        self.run = None # Generator of the current run, None if the job isn't running
+        self.failures = 0
+
+    def is_due(self, now: float) -> bool:
+        return self.run is None and now >= self.next_due
+
+    def start(self, now: float) -> None:
+        """
+        Start a run and schedule the next one on the job's own cadence, so a late run doesn't shift the schedule.
+        If more than one run was missed they're done as one run (they'd all scrape the same data).
+        """
+        print(f"\n{dt.datetime.now()}: starting {self.name}")
+        self.run = self.steps()
+        next_due = self.next_due + self.interval
+        if next_due <= now:
+            next_due = now + self.interval
+        self.next_due = next_due + random.uniform(0, self.jitter)
+
+    def finish(self, now: float, error: Exception=None) -> None:
+        self.run = None
+        if error is None:
+            self.failures = 0
+            print(f"{dt.datetime.now()}: finished {self.name}, next run at {dt.datetime.fromtimestamp(self.next_due)}")
+            return
+        self.failures += 1
+        print(f"{dt.datetime.now()}: {self.name} failed ({error})")
+        if self.failures < RETRY_ATTEMPTS:
+            self.next_due = min(self.next_due, now + RETRY_DELAY)
+        else:
+            self.failures = 0
+        print(f"Next run of {self.name} at {dt.datetime.fromtimestamp(self.next_due)}")
+
+
+class Scheduler(object):
+    """
+    Runs the steps of <jobs> in one thread, so they can share one browser.
+
+    Usage:
+    scheduler = Scheduler([Job("hourly", lambda: scrape_hourly.run_steps(session), dt.timedelta(hours=1))])
+    scheduler.run_forever()
+    """
+    def __init__(self, jobs: list, on_error: Callable[[Exception], None]=None):
+        self.jobs = jobs
+        self.on_error = on_error
+        self.active = [] # Started jobs, the last one is running and the ones before it were interrupted
+
+    def next_job(self, now: float) -> Job:
+        """Return a due job that should start now, None if the running job should continue (or nothing is due)"""
+        due = sorted((job for job in self.jobs if job.is_due(now)), key=lambda job: (job.priority, job.next_due))
+        if not due:
+            return None
+        if self.active and due[0].priority >= self.active[-1].priority:
+            return None
+        return due[0]
+
+    def step(self) -> bool:
+        """Do one step of the most important job, return False if there was nothing to do"""
+        now = time.time()
+        job = self.next_job(now)
+        if job is not None:
+            if self.active:
+                print(f"{dt.datetime.now()}: interrupting {self.active[-1].name} for {job.name}")
+            job.start(now)
+            self.active.append(job)
+        if not self.active:
+            return False
+
+        job = self.active[-1]
+        try:
+            next(job.run)
+        except StopIteration:
+            self.active.pop()
+            job.finish(time.time())
+        except Exception as e:
+            self.active.pop()
+            job.finish(time.time(), e)
+            if self.on_error is not None:
+                self.on_error(e)
+        return True
+
+    def run_forever(self) -> None:
+        try:
+            while True:
+                if not self.step():
+                    next_due = min(job.next_due for job in self.jobs)
+                    time.sleep(min(MAX_SLEEP, max(0, next_due - time.time())))
+        finally:
+            # Let interrupted runs clean up (close storage)
+            for job in self.active:
+                job.run.close()
+
+
+def video_log_steps(session: DriverSession) -> Iterator:
+    update_video_log(session=session)
+    yield
+
+
+def make_jobs(session: DriverSession, workers: int=SCRAPE_WORKERS) -> list:
+    return [
+        Job("hourly", lambda: scrape_hourly.run_steps(session, update_log=False), dt.timedelta(hours=1), priority=0),
+        Job("video_log", lambda: video_log_steps(session), dt.timedelta(hours=3), priority=1),
+        Job("since_published", lambda: scrape_since_publish.run_steps(session, TimePeriod.since_published, workers,
+            update_log=False), dt.timedelta(hours=6), priority=2),
+        Job("first_24h", lambda: scrape_since_publish.run_steps(session, TimePeriod.first_24h, workers,
+            update_log=False), dt.timedelta(days=1), priority=2),
+    ]
+
+
+# MAIN ------------------------------------------------------------------------
+
+@get_logging_decorator(os.path.join(DATA_DIR, "script_logs", SCRIPT_NAME))
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else SCRAPE_WORKERS
+
+    with DriverSession(printing=True) as session:
+        def on_error(e):
+            # Like catch_user_data_error: a broken profile is replaced by the backup, the browser restarts when needed
+            if isinstance(e, WebDriverException) and not isinstance(e, TimeoutException):
+                session.quit()
+                reset_user_data()
+
+        Scheduler(make_jobs(session, workers), on_error).run_forever()
+
+if __name__ == "__main__":
+    main()
@@ -16,14 +16,20 @@ import time
 # For parsing and saving
 import json
 import datetime as dt
-import csv
 import os
 
 from util.log_videos import get_videos, update_video_log
-from util.helpers import startWebdriver, catch_user_data_error, test_YouTube_login, wait_for_element
+from util.helpers import catch_user_data_error, test_YouTube_login, wait_for_element
+from util.driver_session import DriverSession, get_session
 from util.log_errors import get_logging_decorator
-
-from util.custom_values import CHANNEL_ID, DATA_DIR
+from util.csv_append import read_header, read_last_row, append_rows
+from util.storage import Storage, open_storage
+from util.vectorize import to_datetimes, to_weekdays, spread_percentages, rows_from_columns
+from util.network_capture import NetworkCapture, is_latest_activity_card
+from util.studio_client import StudioClient, open_studio_client
+from util.payload_journal import PayloadJournal, open_journal, journal_payload, HOURLY_CHANNEL, HOURLY_VIDEO
+
+from util.custom_values import CHANNEL_ID, DATA_DIR, NETWORK_CAPTURE
 from util.constants import ScrapeMode, ANALYTICS_URL, DAYS_OF_THE_WEEK
 
 SCRIPT_NAME = os.path.basename(__file__)[:-len(".py")]
@@ -31,9 +37,11 @@ SCRIPT_NAME = os.path.basename(__file__)[:-len(".py")]
 # SCRAPING --------------------------------------------------------------------
 
 
-def scrape(driver, URL: str) -> str:
+def scrape(driver, URL: str, capture: bool=NETWORK_CAPTURE) -> str:
     """
     Scrapes YouTube analytics for the recent data from the card.
+    If <capture>, the card data is taken from the json response as soon as it arrives,
+    falling back to the rendered card if that doesn't work.
     like:
         {
             "last48HoursData": {
@@ -64,9 +72,28 @@ def scrape(driver, URL: str) -> str:
             }
         }
     """
+    network = NetworkCapture(driver) if capture else None
+    if network:
+        try:
+            network.clear()
+        except Exception as e: # No performance log, driver wasn't started with capture
+            print(f"Can't capture network ({e}), reading the card from the page")
+            network = None
+
     # Open URL
     driver.get(URL)
 
+    if network:
+        try:
+            return network.wait_for_json(is_latest_activity_card)
+        except Exception as e:
+            print(f"Card data not captured ({e}), reading the card from the page")
+
+    return read_card(driver)
+
+
+def read_card(driver) -> dict:
+    """Return the card data of the loaded analytics page, see scrape"""
     card_css = "yta-latest-activity-card"
 
     # Wait 10 seconds for the information element to show up
@@ -76,10 +103,11 @@ def scrape(driver, URL: str) -> str:
 
 # OTHER -----------------------------------------------------------------------
 
-def assemble_data(card_obj: dict, mode: ScrapeMode) -> list:
+def assemble_data(card_obj: dict, mode: ScrapeMode, window: str="last48HoursData") -> list:
+    """<window> is the part of the card to use: last48HoursData (hourly) or last60MinutesData (by the minute)"""
     data = []
 
-    for datapoint in card_obj['last48HoursData']['mainChart']['data']:
+    for datapoint in card_obj[window]['mainChart']['data']:
         datetime = dt.datetime.fromtimestamp(datapoint['x']/1000, dt.timezone.utc)
 
         data.append({
@@ -89,7 +117,7 @@ def assemble_data(card_obj: dict, mode: ScrapeMode) -> list:
         })
 
     if mode == ScrapeMode.channel:
-        for category in card_obj['last48HoursData']['table']:
+        for category in card_obj[window]['table']:
             try:
                 video_id = category \
                     ['analyticsLink']['routeLink']['route']['params']['videoId']
@@ -105,9 +133,9 @@ def assemble_data(card_obj: dict, mode: ScrapeMode) -> list:
                 datapoint[video_id] = int(percentage_data[i] * views_per_percent)
                 data[i] = datapoint
     elif mode == ScrapeMode.video:
-        total_value = int(card_obj['last48HoursData']['totalMetricValue']
+        total_value = int(card_obj[window]['totalMetricValue']
                           .replace(',', ''))
-        for category in card_obj['last48HoursData']['table']:
+        for category in card_obj[window]['table']:
             title = category['title']
             percentage = float(category['value'].rstrip('%'))/100
             value = percentage*total_value
@@ -123,68 +151,104 @@ def assemble_data(card_obj: dict, mode: ScrapeMode) -> list:
     return data[:-1]
 
 
-def save_data(data: list, title: str, dir: str='') -> None:
-    filepath = dir + f"{title}.csv"
+def assemble_data_vectorized(card_obj: dict, mode: ScrapeMode, window: str="last48HoursData") -> list:
+    """
+    Same output as assemble_data, but every column is made in one go with numpy
+    instead of per datapoint.
+    """
+    chart_data = card_obj[window]['mainChart']['data']
+    n = len(chart_data)
+    x_ms = [datapoint['x'] for datapoint in chart_data]
 
-    try:
-        # Read existing data to see what the last datapoint is
-        with open(filepath, "r") as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            read_data = []
-            for row in reader:
-                read_data.append(row)
-    except FileNotFoundError:
-        read_data = False
-        print(f"Making new file: {title}")
+    columns = {
+        "datetime(UTC)": to_datetimes(x_ms),
+        "day": to_weekdays(x_ms),
+        "views": [datapoint['y'] for datapoint in chart_data],
+    }
+
+    if mode == ScrapeMode.channel:
+        for category in card_obj[window]['table']:
+            try:
+                video_id = category \
+                    ['analyticsLink']['routeLink']['route']['params']['videoId']
+            except KeyError:
+                video_id = category['thumbnailData']['thumbnailUrl'].split('/')[4]
+
+            value = int(category['value'].replace(',', ''))
+            columns[video_id] = spread_percentages(category['sparkChartPercentages'], n, value)
+    elif mode == ScrapeMode.video:
+        total_value = int(card_obj[window]['totalMetricValue']
+                          .replace(',', ''))
+        for category in card_obj[window]['table']:
+            percentage = float(category['value'].rstrip('%'))/100
+            columns[category['title']] = spread_percentages(category['sparkChartPercentages'], n, percentage*total_value)
+
+    # ignore last datapoint because it is ongoing
+    return rows_from_columns(columns)[:-1]
 
-    if read_data:
-        for key in data[-1].keys():
-            if key not in fieldnames:
-                fieldnames.append(key)
 
-        # Append only new data
-        # Check at what index the new data starts
-        index = 0
-        for row in data:
-            if row['datetime(UTC)'] > dt.datetime.strptime(read_data[-1]['datetime(UTC)'], "%Y-%m-%d %H:%M:%S%z"):
-                break
-            index += 1
-        data = data[index:]
+def save_data(data: list, title: str, dir: str='', storage: Storage=None) -> None:
+    """
+    Append the rows of <data> that are newer than the last row in the csv.
+    Only reads the header and the tail of the file, and only rewrites the header when there's a new column.
+    If <storage> is given the rows are upserted there instead.
+    """
+    if storage is not None:
+        storage.save_series(title, data)
+        return
+
+    filepath = dir + f"{title}.csv"
+
+    if os.path.isfile(filepath):
+        # Read last datapoint to see where the new data starts
+        fieldnames = read_header(filepath)
+        last_row = read_last_row(filepath, fieldnames)
+        if last_row:
+            last_datetime = dt.datetime.strptime(last_row['datetime(UTC)'], "%Y-%m-%d %H:%M:%S%z")
+            data = [row for row in data if row['datetime(UTC)'] > last_datetime]
 
         if len(data) < 1:
             print("No new realtime data to add")
             return
 
-        read_data.extend(data)
-        data = read_data
-
+        append_rows(filepath, data, fieldnames)
     else:
-        # Write new file if there was none
-        fieldnames = data[-1].keys()
-
-    with open(filepath, "w", newline='') as f:
-        writer = csv.DictWriter(f, fieldnames)
-        writer.writeheader()
-        writer.writerows(data)
-        print(f"Written scraped data to {title}")
+        print(f"Making new file: {title}")
+        append_rows(filepath, data)
+    print(f"Written scraped data to {title}")
 
 
 def process(mode: ScrapeMode=ScrapeMode.channel, video_id: str='', 
-dir: str='') -> None:
-    """Weaves all basic functionality together"""
+dir: str='', session: DriverSession=None, storage: Storage=None, client: StudioClient=None,
+journal: PayloadJournal=None) -> None:
+    """
+    Weaves all basic functionality together. Uses the driver of <session> if given, otherwise starts its own.
+    If <client> is given the data is requested without the browser, which is then only a fallback.
+    Saves to <storage> if given, otherwise to csv. The raw card is kept in <journal> if given.
+    """
+    id = CHANNEL_ID
+    if mode == ScrapeMode.video:
+        id = video_id
+
+    card_data = None
+    if client is not None:
+        try:
+            card_data = client.latest_activity(mode, id)
+        except Exception as e:
+            print(f"Browserless request failed ({e}), scraping with the browser")
+
     # Scrape data
-    driver = startWebdriver()
+    session, owned = get_session(session)
     try:
-        id = CHANNEL_ID
-        if mode == ScrapeMode.video:
-            id = video_id
-        card_data = scrape(driver, ANALYTICS_URL.format(mode=mode.name, id=id))
+        if card_data is None:
+            card_data = scrape(session.driver, ANALYTICS_URL.format(mode=mode.name, id=id))
     finally:
-        driver.quit()
+        if owned:
+            session.quit()
 
-    data = assemble_data(card_data, mode)
-    save_data(data, f"Hourly_{id}", dir)
+    journal_payload(journal, id, HOURLY_CHANNEL if mode == ScrapeMode.channel else HOURLY_VIDEO, card_data)
+    data = assemble_data_vectorized(card_data, mode)
+    save_data(data, f"Hourly_{id}", dir, storage)
     return data[-1].keys()
 
 # MAIN ------------------------------------------------------------------------
@@ -192,34 +256,57 @@ dir: str='') -> None:
 @get_logging_decorator(os.path.join(DATA_DIR, "script_logs", SCRIPT_NAME))
 @catch_user_data_error
 def main():
-    # Test webdriver and login, and log details
-    driver = startWebdriver(printing=True)
+    # One browser for the whole run, only restarted if it dies
+    with DriverSession(printing=True) as session:
+        run(session)
+
+
+def run(session: DriverSession):
+    for _ in run_steps(session):
+        pass
+
+
+def run_steps(session: DriverSession, update_log: bool=True):
+    """
+    Generator version of run that yields between scrapes, so the caller (scrape_daemon.py) can do something else in between.
+    If not <update_log>, the video log is used as it is (the daemon refreshes it on its own schedule).
+    """
+    # Without browser if possible, then the browser is only started when something needs it
+    client = open_studio_client(session)
+    if client is None:
+        # Test webdriver and login
+        test_YouTube_login(session.driver, email=True)
+    storage = open_storage()
+    journal = open_journal()
     try:
-        test_YouTube_login(driver, email=True)
+        # Get hourly channel data
+        keys = process(dir=DATA_DIR, session=session, storage=storage, client=client, journal=journal)
+        relevant_video_ids = [k for k in keys if k not in ['datetime(UTC)', 'day', 'views']] # this is always three ids
+        yield
+
+        # Get data for recent videos
+        if update_log:
+            update_video_log(session=session)
+            yield
+
+        # If the video is younger than 30 days, skip
+        # Because this data can still be scraped from since_published, and that's more precise
+        videos = get_videos(False)
+        last_n = 2
+        too_young_ids = [vid['id'] for vid in videos if dt.datetime.utcnow() - vid['date'] < dt.timedelta(days=30)]
+        last_video_ids = [vid['id'] for vid in videos[-last_n:] if vid['id'] not in too_young_ids] # last n videos
+        if len(last_video_ids) < 1:
+            print(f"Last {last_n} videos are <30 days old; should still be scraped with since_published (more precise)")
+
+        scrape_video_ids = list(set(relevant_video_ids).union(set(last_video_ids)).difference(set(too_young_ids)))
+        if len(scrape_video_ids) < 1:
+            print("Relevant 3 videos are all <30 days old; should be scraped with since_published (more precise)")
+        for video_id in scrape_video_ids:
+            process(ScrapeMode.video, video_id, DATA_DIR, session, storage, client, journal)
+            yield
     finally:
-        driver.quit()
-
-    # Get hourly channel data
-    keys = process(dir=DATA_DIR)
-    relevant_video_ids = [k for k in keys if k not in ['datetime(UTC)', 'day', 'views']] # this is always three ids
-
-    # Get data for recent videos
-    update_video_log()
-
-    # If the video is younger than 30 days, skip
-    # Because this data can still be scraped from since_published, and that's more precise
-    videos = get_videos(False)
-    last_n = 2
-    too_young_ids = [vid['id'] for vid in videos if dt.datetime.utcnow() - vid['date'] < dt.timedelta(days=30)]
-    last_video_ids = [vid['id'] for vid in videos[-last_n:] if vid['id'] not in too_young_ids] # last n videos
-    if len(last_video_ids) < 1:
-        print(f"Last {last_n} videos are <30 days old; should still be scraped with since_published (more precise)")
-
-    scrape_video_ids = list(set(relevant_video_ids).union(set(last_video_ids)).difference(set(too_young_ids)))
-    if len(scrape_video_ids) < 1:
-        print("Relevant 3 videos are all <30 days old; should be scraped with since_published (more precise)")
-    for video_id in scrape_video_ids:
-        process(ScrapeMode.video, video_id, DATA_DIR)
+        if storage is not None:
+            storage.close()
 
 if __name__ == "__main__":
     main()
@@ -20,17 +20,25 @@ import datetime as dt
 import csv
 import sys
 import os
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from util.log_videos import get_videos, update_video_log
-from util.helpers import startWebdriver, catch_user_data_error, test_YouTube_login
+from util.helpers import catch_user_data_error, test_YouTube_login, start_worker_webdriver, resolve_chromedriver
+from util.driver_session import DriverSession, get_session
 from util.log_errors import get_logging_decorator
+from util.storage import Storage, open_storage
+from util.columnar import save_columnar, count_rows
+from util.studio_client import StudioClient, open_studio_client
+from util.payload_journal import PayloadJournal, open_journal, journal_payload
 
-from util.custom_values import DATA_DIR
+from util.custom_values import DATA_DIR, SCRAPE_WORKERS, SINCE_PUBLISH_FORMAT
 from util.constants import METRICS, TimePeriod, Dimensions, ADV_URL
 
 SCRIPT_NAME = os.path.basename(__file__)[:-len(".py")]
 
-from util.scrape_since_publish_functions import scrape, scrape_subs, assemble_data
+from util.scrape_since_publish_functions import scrape, scrape_subs, scrape_metrics_single_load, StaleExploreError, \
+    assemble_data_vectorized
 
 # OTHER -----------------------------------------------------------------------
 
@@ -43,7 +51,22 @@ def check_granularity(metrics_data: dict) -> dt.timedelta:
     return time_delta
 
 
-def save_data(data: list, title: str="data", dir: str='') -> bool:
+def save_data(data: list, title: str="data", dir: str='', storage: Storage=None, 
+fmt: str=SINCE_PUBLISH_FORMAT) -> bool:
+    """
+    Overwrite the csv (or the columnar npz if <fmt> is "npz") with <data>, or upsert it into <storage> if given. 
+    Return True if saved.
+    """
+    if storage is not None:
+        if len(data) < storage.count_rows(title):
+            print("less data scraped than is already logged.\n" +
+                  "this is weird because granularity should " +
+                  "already be checked.")
+            return False
+        return storage.save_series(title, data)
+    if fmt == "npz":
+        return save_data_columnar(data, title, dir)
+
     filepath = dir + f"{title}.csv"
 
     try:
@@ -71,8 +94,26 @@ def save_data(data: list, title: str="data", dir: str='') -> bool:
     return True
 
 
+def save_data_columnar(data: list, title: str, dir: str='') -> bool:
+    """Overwrite <title>.npz with <data>, see util/columnar.py. Return True if saved."""
+    filepath = dir + title
+    logged_rows = count_rows(filepath)
+    if len(data) < logged_rows:
+        print("less data scraped than is already logged.\n" +
+              "this is weird because granularity should " +
+              "already be checked.")
+        return False
+    if not logged_rows:
+        print(f"Making new file: {title}")
+
+    save_columnar(data, filepath)
+    print(f"Written scraped data to {title}")
+    return True
+
+
 def process(video_id: str, dir: str='', 
-time_period: TimePeriod=TimePeriod.since_published) -> bool:
+time_period: TimePeriod=TimePeriod.since_published, session: DriverSession=None, 
+single_load: bool=True, storage: Storage=None, client: StudioClient=None, journal: PayloadJournal=None) -> bool:
     """
     Scrape video analytics from YouTube. Save to csv.
 
@@ -86,15 +127,33 @@ time_period: TimePeriod=TimePeriod.since_published) -> bool:
         Directory where the data csv files should go.
     time_period : TimePeriod, optional
         Either TimePeriod.since_published or TimePeriod.first_24h.
+    session : DriverSession, optional
+        Shared browser session. If not given a browser is started and quit for this video.
+    single_load : bool, optional
+        Get all metrics from one load of the explore page. Falls back to a page load per metric if that fails,
+        for the rest of the session if the page didn't switch to the next metric (session.single_load).
+    storage : Storage, optional
+        Save to this storage backend instead of csv.
+    client : StudioClient, optional
+        Request the data without the browser, which is then only a fallback.
+    journal : PayloadJournal, optional
+        Keep the raw metrics data in this journal, so it can be assembled again later.
 
     Returns
     -------
     bool
         True if data was saved, False if not.
     """
-    # Scrape data
-    driver = startWebdriver()
     metrics_data = {}
+    if client is not None:
+        try:
+            metrics_data = client.metrics_data(video_id, time_period)
+        except Exception as e:
+            print(f"Browserless request failed ({e}), scraping with the browser")
+            metrics_data = {}
+
+    # Scrape data
+    session, owned = get_session(session)
     base_url = ADV_URL.format(
         video_id=video_id,
         time_period=time_period.value,
@@ -102,18 +161,34 @@ time_period: TimePeriod=TimePeriod.since_published) -> bool:
         dimension="{dimension}"
     )
     try:
-        # Get data for totals and per traffic source
-        for metric_key, metric_code in METRICS.items():
-            # Reset elements with random website
-            driver.get("https://www.pictureofhotdog.com/")
+        if single_load and session.single_load and not metrics_data:
+            try:
+                metrics_data = scrape_metrics_single_load(session.driver, video_id, time_period)
+            except StaleExploreError as e:
+                print(f"Single load scrape failed ({e}), using a page load per metric for the rest of the run")
+                session.single_load = False
+                metrics_data = {}
+            except Exception as e:
+                print(f"Single load scrape failed ({e}), falling back to a page load per metric")
+                metrics_data = {}
+
+        if not metrics_data:
+            driver = session.driver
+            # Get data for totals and per traffic source
+            for metric_key, metric_code in METRICS.items():
+                # Reset elements with random website
+                driver.get("https://www.pictureofhotdog.com/")
 
-            url = base_url.format(metric=metric_code, dimension=Dimensions.traffic_source.value)
-            driver.get(url)
+                url = base_url.format(metric=metric_code, dimension=Dimensions.traffic_source.value)
+                driver.get(url)
 
-            metrics_data[metric_key] = scrape(driver)
-        metrics_data["subs"] = scrape_subs(driver, video_id)
+                metrics_data[metric_key] = scrape(driver)
+            metrics_data["subs"] = scrape_subs(driver, video_id)
     finally:
-        driver.quit()
+        if owned:
+            session.quit()
+
+    journal_payload(journal, video_id, time_period.name, metrics_data)
 
     # We want at least hourly data
     time_delta = check_granularity(metrics_data)
@@ -127,12 +202,83 @@ time_period: TimePeriod=TimePeriod.since_published) -> bool:
         print("timedelta between two datapoints is smaller than 2 minutes")
         return False
 
-    video_data = assemble_data(metrics_data)
-    if not save_data(video_data, f"{time_period.name}_{video_id}", dir):
+    video_data = assemble_data_vectorized(metrics_data)
+    if not save_data(video_data, f"{time_period.name}_{video_id}", dir, storage):
         return False
     return True
 
 
+def process_parallel(video_ids: list, dir: str='', 
+time_period: TimePeriod=TimePeriod.since_published, workers: int=SCRAPE_WORKERS, 
+session: DriverSession=None, storage: Storage=None, client: StudioClient=None, journal: PayloadJournal=None) -> dict:
+    """
+    Run process for every video with <workers> browsers at the same time.
+    With <client> the browsers are only a fallback for when the browserless request fails.
+    Every browser is isolated with its own copy of the User Data folder, <session> (if given) is used as one of them.
+    The login of every worker browser is tested when it starts (see start_worker_webdriver).
+    Every video writes its own csv, so workers never write to the same file.
+
+    Returns
+    -------
+    dict
+        {video_id: True/False like process returns, or the exception that was raised}
+    """
+    results = dict(process_parallel_steps(video_ids, dir, time_period, workers, session, storage, client, journal))
+    failed = [video_id for video_id, result in results.items() if result is not True]
+    print(f"Scraped {len(video_ids)-len(failed)}/{len(video_ids)} videos, failed: {failed}")
+    return results
+
+
+def process_parallel_steps(video_ids: list, dir: str='', 
+time_period: TimePeriod=TimePeriod.since_published, workers: int=SCRAPE_WORKERS, 
+session: DriverSession=None, storage: Storage=None, client: StudioClient=None, journal: PayloadJournal=None):
+    """
+    Generator version of process_parallel that yields (video_id, result) for every video that is done.
+    Only as many videos as there are browsers are started at a time, so nothing new starts while the caller
+    does something else in between.
+    """
+    sessions = Queue()
+    owned_sessions = []
+    if session is not None:
+        sessions.put(session)
+    new_workers = range(sessions.qsize(), min(workers, len(video_ids)))
+    # A browser starts when its worker first needs it, the driver is resolved here so they don't all download it at once
+    chromedriver_path = resolve_chromedriver() if new_workers else "manager"
+    for worker in new_workers:
+        worker_session = DriverSession(start=start_worker_webdriver, worker=worker, chromedriver_path=chromedriver_path)
+        owned_sessions.append(worker_session)
+        sessions.put(worker_session)
+
+    def work(video_id):
+        # Borrow a browser, give it back when done
+        worker_session = sessions.get()
+        try:
+            return process(video_id, dir, time_period, worker_session, storage=storage, client=client, journal=journal)
+        finally:
+            sessions.put(worker_session)
+
+    browsers = max(1, sessions.qsize())
+    todo = iter(video_ids)
+    try:
+        with ThreadPoolExecutor(max_workers=browsers) as executor:
+            futures = {executor.submit(work, video_id): video_id for _, video_id in zip(range(browsers), todo)}
+            while futures:
+                future = next(as_completed(futures))
+                video_id = futures.pop(future)
+                next_id = next(todo, None)
+                if next_id is not None:
+                    futures[executor.submit(work, next_id)] = next_id
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Failed to scrape {video_id}: {e}")
+                    result = e
+                yield video_id, result
+    finally:
+        for worker_session in owned_sessions:
+            worker_session.quit()
+
+
 # MAIN ------------------------------------------------------------------------
 
 @get_logging_decorator(os.path.join(DATA_DIR, "script_logs", SCRIPT_NAME))
@@ -145,25 +291,63 @@ def main():
         time_period = TimePeriod.since_published
         print(f"No time period given: defaulting to {time_period.name}")
     except KeyError:
-        print("Usage: python scrape_since_publish.py <first_24h / since_published>")
-
-    # Test webdriver and login, and log details
-    driver = startWebdriver(printing=True)
+        print("Usage: python scrape_since_publish.py <first_24h / since_published> [workers]")
+        return
     try:
-        test_YouTube_login(driver)
-    finally:
-        driver.quit()
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else SCRAPE_WORKERS
+    except ValueError:
+        print("Usage: python scrape_since_publish.py <first_24h / since_published> [workers]")
+        return
+
+    # One browser for the whole run, only restarted if it dies
+    with DriverSession(printing=True) as session:
+        run(session, time_period, workers)
+
+
+def run(session: DriverSession, time_period: TimePeriod=TimePeriod.since_published, 
+workers: int=SCRAPE_WORKERS):
+    for _ in run_steps(session, time_period, workers):
+        pass
+
+
+def run_steps(session: DriverSession, time_period: TimePeriod=TimePeriod.since_published, 
+workers: int=SCRAPE_WORKERS, update_log: bool=True):
+    """
+    Generator version of run that yields after every video, so the caller (scrape_daemon.py) can do something else in between.
+    With more than one worker a step is every video that is done. If not <update_log>, the video log is used as it is.
+    """
+    # Without browser if possible, then the browser is only started when something needs it
+    client = open_studio_client(session)
+    if client is None:
+        # Test webdriver and login
+        test_YouTube_login(session.driver)
 
     # Scrape data for videos 
     # Only where hourly data is still displayed if time_period is since published
-    update_video_log()
+    if update_log:
+        update_video_log(session=session)
+        yield
     recent_videos = get_videos(time_period == TimePeriod.since_published)
 
     if len(recent_videos) < 1:
         print("Scrape since publish: no recent videos found")
 
-    for video in recent_videos:
-        process(video["id"], DATA_DIR, time_period)
+    storage = open_storage()
+    journal = open_journal()
+    try:
+        if workers > 1:
+            # Between the steps <session> can be used by another job (scrape_daemon.py), so the workers get their own browsers
+            for _ in process_parallel_steps([video["id"] for video in recent_videos], DATA_DIR, time_period, workers,
+                                            None, storage, client, journal):
+                yield
+            return
+
+        for video in recent_videos:
+            process(video["id"], DATA_DIR, time_period, session, storage=storage, client=client, journal=journal)
+            yield
+    finally:
+        if storage is not None:
+            storage.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts and util are imported like the scripts do it, from the py folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+"""
+Local stand-in for the YouTube servers, for the clients that can be pointed at another base url
+(api_client.DataApiClient, studio_client.StudioClient).
+
+Usage:
+def respond(request):
+    return 200, {"items": []}
+with StandInServer(respond) as server:
+    client = DataApiClient("key", base_url=server.url)
+    ...
+    server.requests # Every request, like {"method", "path", "query", "headers", "body"}
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class StandInServer(object):
+    """
+    Answers every request with <respond>(request) -> (status, json object, str or bytes),
+    or (status, response, headers) to send extra headers (like Location).
+    """
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real servers
+
+            def handle_request(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                parts = urlsplit(self.path)
+                request = {
+                    "method": self.command,
+                    "path": parts.path,
+                    "query": {key: values[0] for key, values in parse_qs(parts.query).items()},
+                    "headers": {key.lower(): value for key, value in self.headers.items()},
+                    "body": self.rfile.read(length) if length else b"",
+                }
+                server.requests.append(request)
+                status, response, *headers = server.respond(request)
+                if isinstance(response, str):
+                    response = response.encode()
+                elif not isinstance(response, bytes):
+                    response = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(response)))
+                for key, value in (headers[0] if headers else {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(response)
+
+            do_GET = handle_request
+            do_POST = handle_request
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        return False
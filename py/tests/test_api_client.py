@@ -0,0 +1,131 @@
+"""DataApiClient against a local stand-in for the Data API: batching, pagination and quota accounting"""
+
+import json
+
+import pytest
+
+from stand_in_server import StandInServer
+from util.api_client import DataApiClient, ApiError, get_videos_basics, get_playlist_info, MAX_RESULTS
+from util.api_quota import QuotaLedger, QuotaExceededError
+from util.api_scrape_utils import parse_video_item, parse_video_item_str
+
+API_KEY = "test-key"
+PLAYLIST_ID = "UUtestplaylist"
+
+
+def video_item(id: str) -> dict:
+    # Same key order as the API, parse_video_item_str depends on the line after the title
+    return {
+        "kind": "youtube#video",
+        "id": id,
+        "snippet": {
+            "publishedAt": f"2022-10-{int(id[-2:]) % 28 + 1:02}T15:{int(id[-2:]) % 60:02}:24Z",
+            "channelId": "UCtestchannel",
+            "title": f"Video number {id}",
+            "description": "Description",
+        },
+    }
+
+
+VIDEO_IDS = [f"video{i:06}" for i in range(120)]
+PRIVATE_IDS = {"video000007", "video000099"}
+
+
+def respond(request) -> tuple:
+    query = request["query"]
+    if query.get("key") != API_KEY:
+        return 400, {"error": {"code": 400, "message": "API key not valid", "errors": [{"reason": "badRequest"}]}}
+
+    if request["path"].endswith("/videos"):
+        ids = query["id"].split(",")
+        if len(ids) > MAX_RESULTS:
+            return 400, {"error": {"code": 400, "message": "Too many ids", "errors": [{"reason": "invalidFilters"}]}}
+        return 200, {"items": [video_item(id) for id in ids if id not in PRIVATE_IDS]}
+
+    if request["path"].endswith("/playlistItems"):
+        # Pages of at most maxResults, like the uploads playlist
+        start = int(query.get("pageToken", 0))
+        end = min(start + int(query["maxResults"]), len(VIDEO_IDS))
+        result = {"items": [{"contentDetails": {"videoId": id, "videoPublishedAt": video_item(id)["snippet"]["publishedAt"]}}
+                            for id in VIDEO_IDS[start:end]]}
+        if end < len(VIDEO_IDS):
+            result["nextPageToken"] = str(end)
+        return 200, result
+
+    return 404, {"error": {"code": 404, "message": "Not found", "errors": [{"reason": "notFound"}]}}
+
+
+@pytest.fixture
+def server():
+    with StandInServer(respond) as server:
+        yield server
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return QuotaLedger(str(tmp_path / "api_quota.json"), daily_limit=10)
+
+
+def test_videos_in_batches_of_50(server, ledger):
+    client = DataApiClient(API_KEY, base_url=server.url, ledger=ledger)
+    videos = get_videos_basics(VIDEO_IDS, client)
+
+    batches = [request["query"]["id"].split(",") for request in server.requests]
+    assert [len(batch) for batch in batches] == [50, 50, 20]
+    assert sum(batches, []) == VIDEO_IDS
+    assert set(videos) == set(VIDEO_IDS) - PRIVATE_IDS
+    assert videos["video000001"] == dict(parse_video_item(video_item("video000001")), precise=1)
+    assert ledger.state["used"] == 3
+    assert ledger.state["calls"] == {"videos": 3}
+    # The ledger is kept on disk, so the next run knows what's used
+    assert QuotaLedger(ledger.path, daily_limit=10).remaining() == 7
+
+
+def test_playlist_pagination(server, ledger):
+    client = DataApiClient(API_KEY, base_url=server.url, ledger=ledger)
+    videos = get_playlist_info([PLAYLIST_ID], client)
+
+    assert list(videos) == VIDEO_IDS
+    assert [request["query"].get("pageToken") for request in server.requests] == [None, "50", "100"]
+    assert all(request["query"]["playlistId"] == PLAYLIST_ID for request in server.requests)
+    assert ledger.state["calls"] == {"playlistItems": 3}
+
+
+def test_quota_refused_before_calling(server, ledger):
+    client = DataApiClient(API_KEY, base_url=server.url, ledger=ledger)
+    get_videos_basics(VIDEO_IDS, client) # 3 of 10
+    get_videos_basics(VIDEO_IDS, client) # 6 of 10
+    get_videos_basics(VIDEO_IDS, client) # 9 of 10
+    with pytest.raises(QuotaExceededError):
+        get_videos_basics(VIDEO_IDS, client)
+    assert len(server.requests) == 9
+
+
+def test_quota_exceeded_by_youtube(ledger):
+    def respond_quota_exceeded(request):
+        return 403, {"error": {"code": 403, "message": "Quota exceeded", "errors": [{"reason": "quotaExceeded"}]}}
+
+    with StandInServer(respond_quota_exceeded) as server:
+        client = DataApiClient(API_KEY, base_url=server.url, ledger=ledger)
+        with pytest.raises(QuotaExceededError):
+            client.videos(VIDEO_IDS[:10])
+        # Not tried again until the quota resets
+        with pytest.raises(QuotaExceededError):
+            client.videos(VIDEO_IDS[:10])
+        assert len(server.requests) == 1
+    assert ledger.remaining() == 0
+
+
+def test_api_error_reason(server, ledger):
+    client = DataApiClient("wrong-key", base_url=server.url, ledger=ledger)
+    with pytest.raises(ApiError) as error:
+        client.videos(VIDEO_IDS[:1])
+    assert error.value.status == 400
+    assert error.value.reason == "badRequest"
+
+
+@pytest.mark.parametrize("id", ["video000001", "video000042", "video000119"])
+def test_parse_video_item_matches_str_parser(id):
+    item = video_item(id)
+    # The API Explorer shows the item pretty printed, that's what parse_video_item_str reads
+    assert parse_video_item(item) == parse_video_item_str(json.dumps(item, indent=2))
@@ -0,0 +1,53 @@
+"""ConnectionPool follows redirects like urlopen did"""
+
+import pytest
+
+from stand_in_server import StandInServer
+from util.http_fetch import ConnectionPool, HttpError, MAX_REDIRECTS
+
+
+def respond(request) -> tuple:
+    path = request["path"]
+    if path == "/watch":
+        # Like the consent redirect, relative to the page
+        return 302, "", {"Location": "/consent?continue=watch"}
+    if path == "/form":
+        return 303, "", {"Location": "/done"}
+    if path == "/loop":
+        return 302, "", {"Location": "/loop"}
+    if path == "/moved":
+        return 301, ""
+    return 200, f"{request['method']} {path} {request['body'].decode()}"
+
+
+@pytest.fixture
+def server():
+    with StandInServer(respond) as server:
+        yield server
+
+
+def test_follow_redirect(server):
+    pool = ConnectionPool()
+    assert pool.fetch(server.url + "/watch") == "GET /consent "
+    assert [request["path"] for request in server.requests] == ["/watch", "/consent"]
+    assert server.requests[1]["query"] == {"continue": "watch"}
+
+
+def test_see_other_is_get(server):
+    status, _, text = ConnectionPool().request("POST", server.url + "/form", b'{"a": 1}',
+                                               {"Content-Type": "application/json"})
+    assert (status, text) == (200, "GET /done ")
+    assert "content-type" not in server.requests[1]["headers"]
+
+
+def test_redirect_limit(server):
+    with pytest.raises(HttpError) as error:
+        ConnectionPool().fetch(server.url + "/loop")
+    assert error.value.status == 302
+    assert len(server.requests) == MAX_REDIRECTS + 1
+
+
+def test_redirect_without_location(server):
+    with pytest.raises(HttpError) as error:
+        ConnectionPool().fetch(server.url + "/moved")
+    assert error.value.status == 301
@@ -0,0 +1,243 @@
+"""StudioClient against a local stand-in for Studio that replays recorded responses"""
+
+import hashlib
+import json
+
+import pytest
+
+import util.log_videos
+from stand_in_server import StandInServer
+from util import studio_client
+from util.studio_client import StudioClient, StudioAuthError, sapisidhash, find_metric_paths, TEMPLATE_METRIC, \
+    PATH_METRIC
+from util.http_fetch import HttpError
+from util.scrape_since_publish_functions import assemble_data_vectorized
+from util.constants import ScrapeMode, TimePeriod, METRICS, SUBS_METRIC
+
+RECORDED_CHANNEL = "UCrecordedchannel"
+RECORDED_VIDEO = "recordedvid"
+VIDEO_ID = "requestedvd"
+CARDS_PATH = "/youtubei/v1/creator/get_cards?alt=json"
+EXPLORE_PATH = "/youtubei/v1/yta_web/get_screen?alt=json"
+START_MS = 1629158400000
+
+
+def template(path: str, body: dict, **values) -> dict:
+    return {"path": path, "method": "POST", "body": body, "values": values,
+            "headers": {"content-type": "application/json", "x-youtube-client-name": "62"}}
+
+
+# The table under the chart has its own metrics, which stay the same whatever metric the chart is
+TABLE = {"metrics": [{"type": TEMPLATE_METRIC}, {"type": METRICS["watchtime"]}],
+         "orders": [{"metric": {"type": TEMPLATE_METRIC}}]}
+
+
+def explore_body(id: str, metric: str) -> dict:
+    return {"screenConfig": {"entity": {"videoId": id}, "timePeriod": {"type": "SINCE_PUBLISH"}},
+            "metrics": [{"type": metric}], "restrict": [{"dimension": "VIDEO", "inValue": [id]}], "table": TABLE}
+
+
+def explore_template(metric: str) -> dict:
+    explore = template(EXPLORE_PATH, explore_body(RECORDED_VIDEO, metric), id=RECORDED_VIDEO, metric=metric)
+    # Like record_templates, from the request recorded again with another metric
+    explore["metric_paths"] = find_metric_paths(explore["body"], explore_body(RECORDED_VIDEO, PATH_METRIC),
+                                                metric, PATH_METRIC)
+    return explore
+
+
+TEMPLATES = {
+    "latest_activity_channel": template(CARDS_PATH, {"channelIds": [RECORDED_CHANNEL]}, id=RECORDED_CHANNEL),
+    "latest_activity_video": template(CARDS_PATH, {"videoIds": [RECORDED_VIDEO]}, id=RECORDED_VIDEO),
+    "explore_since_published": explore_template(TEMPLATE_METRIC),
+    "explore_subs_since_published": template(EXPLORE_PATH, explore_body(RECORDED_VIDEO, SUBS_METRIC),
+                                             id=RECORDED_VIDEO, metric=SUBS_METRIC),
+}
+
+
+def cookies(sapisid: str) -> list:
+    return [{"name": "SAPISID", "value": sapisid, "domain": ".youtube.com"},
+            {"name": "SID", "value": "sid", "domain": ".youtube.com"}]
+
+
+def write_session(path: str, sapisid: str) -> None:
+    with open(path, "w") as f:
+        json.dump({"exported": "2026-10-18T08:00:00", "cookies": cookies(sapisid), "templates": TEMPLATES}, f)
+
+
+def series(name: str, value: int, label: str="relativeDateFormatted") -> dict:
+    return {"name": name, "data": [{"x": START_MS + i*3600000, "y": value + i, "hovercardInfo": {label: f"First {i} hours"}}
+                                   for i in range(48)]}
+
+
+class Studio(object):
+    """
+    Replays recorded responses, like Studio answers. Only accepts the cookies of <valid_sapisid>,
+    signed with a correct SAPISIDHASH for the origin the request says it comes from.
+    """
+    def __init__(self, valid_sapisid: str="fresh"):
+        self.valid_sapisid = valid_sapisid
+
+    def authorized(self, request) -> bool:
+        headers = request["headers"]
+        cookie = dict(part.split("=", 1) for part in headers.get("cookie", "").split("; ") if "=" in part)
+        sapisid = cookie.get("SAPISID")
+        if sapisid != self.valid_sapisid:
+            return False
+        scheme, value = headers.get("authorization", " ").split(" ", 1)
+        timestamp, digest = value.split("_", 1)
+        expected = hashlib.sha1(f"{timestamp} {sapisid} {headers['origin']}".encode()).hexdigest()
+        return scheme == "SAPISIDHASH" and digest == expected
+
+    def __call__(self, request) -> tuple:
+        if not self.authorized(request):
+            return 401, {"error": {"code": 401, "status": "UNAUTHENTICATED"}}
+        body = json.loads(request["body"])
+        if request["path"] + "?alt=json" == CARDS_PATH:
+            id = (body.get("channelIds") or body.get("videoIds"))[0]
+            card = {"id": id, "last48HoursData": {"mainChart": {"data": [{"x": START_MS, "y": 5}]}, "table": []}}
+            # Studio puts an XSSI prefix before some responses
+            return 200, ")]}'\n" + json.dumps({"cards": [{"title": "Realtime"}, {"latestActivityCardData": card}]})
+        if request["path"] + "?alt=json" == EXPLORE_PATH:
+            metric = body["metrics"][0]["type"]
+            main_metric_data = {"metric": metric, "videoId": body["screenConfig"]["entity"]["videoId"]}
+            if metric == SUBS_METRIC:
+                main_metric_data.update(totalsSeries=series("MAIN_METRIC_SERIES_NAME", 1, "primaryLabel"), series={})
+            else:
+                main_metric_data.update(totalsSeries=series("MAIN_METRIC_SERIES_NAME", 100),
+                                        series={"YT_SEARCH_main": series("YT_SEARCH_main", 10),
+                                                "YT_RELATED_main": series("YT_RELATED_main", 20)})
+            return 200, {"results": [{"chartProperties": {"mainMetricData": {"data": [main_metric_data]}}}]}
+        return 404, {"error": {"code": 404}}
+
+
+@pytest.fixture
+def session_path(tmp_path):
+    path = str(tmp_path / "studio_session.json")
+    write_session(path, "fresh")
+    return path
+
+
+def test_sapisidhash():
+    # SHA1 of "1700000000 sapisid https://studio.youtube.com"
+    expected = hashlib.sha1(b"1700000000 sapisid https://studio.youtube.com").hexdigest()
+    assert sapisidhash("sapisid", "https://studio.youtube.com", 1700000000) == f"SAPISIDHASH 1700000000_{expected}"
+
+
+@pytest.mark.parametrize("mode, id", [(ScrapeMode.channel, "UCrequestedchannel"), (ScrapeMode.video, VIDEO_ID)])
+def test_latest_activity(session_path, mode, id):
+    with StandInServer(Studio()) as server:
+        card = StudioClient(session_path, base_url=server.url).latest_activity(mode, id)
+    assert card["id"] == id
+    assert "mainChart" in card["last48HoursData"]
+    # The recorded id is replaced, the rest of the recorded request is sent as it was
+    assert server.requests[0]["headers"]["x-youtube-client-name"] == "62"
+
+
+def test_metrics_data(session_path):
+    with StandInServer(Studio()) as server:
+        metrics_data = StudioClient(session_path, base_url=server.url).metrics_data(VIDEO_ID, TimePeriod.since_published)
+
+    requested = [json.loads(request["body"]) for request in server.requests]
+    assert [body["metrics"][0]["type"] for body in requested] == list(METRICS.values()) + [SUBS_METRIC]
+    assert all(body["screenConfig"]["entity"]["videoId"] == VIDEO_ID and body["restrict"][0]["inValue"] == [VIDEO_ID]
+               for body in requested)
+    # Only the chart metric is replaced
+    assert all(body["table"] == TABLE for body in requested)
+
+    assert list(metrics_data) == list(METRICS) + ["subs"]
+    assert [category["name"] for category in metrics_data["views"]] == \
+        ["MAIN_METRIC_SERIES_NAME", "YT_SEARCH_main", "YT_RELATED_main"]
+    subs = metrics_data["subs"][0]
+    assert subs["entityTitle"] == "Subscribers Net Change"
+    assert subs["data"][3]["hovercardInfo"]["relativeDateFormatted"] == "First 3 hours"
+    # Same structure as the selenium scrapers give, so it can be assembled
+    rows = assemble_data_vectorized(metrics_data)
+    assert len(rows) == 48 and rows[2]["views_YouTube search"] == 12
+
+
+def test_find_metric_paths():
+    body = explore_body(RECORDED_VIDEO, TEMPLATE_METRIC)
+    assert find_metric_paths(body, explore_body(RECORDED_VIDEO, PATH_METRIC), TEMPLATE_METRIC, PATH_METRIC) == \
+        [["metrics", 0, "type"]]
+
+
+def test_template_without_metric_paths(session_path):
+    # Recorded before metric_paths, then only the strings under metric keys are replaced
+    templates = dict(TEMPLATES, explore_since_published=template(EXPLORE_PATH,
+        dict(explore_body(RECORDED_VIDEO, TEMPLATE_METRIC), table={"sort": TEMPLATE_METRIC}),
+        id=RECORDED_VIDEO, metric=TEMPLATE_METRIC))
+    with open(session_path, "r") as f:
+        saved = json.load(f)
+    with open(session_path, "w") as f:
+        json.dump(dict(saved, templates=templates), f)
+
+    with StandInServer(Studio()) as server:
+        StudioClient(session_path, base_url=server.url).metric_data(VIDEO_ID, METRICS["likes"])
+    body = json.loads(server.requests[0]["body"])
+    assert body["metrics"] == [{"type": METRICS["likes"]}]
+    assert body["table"] == {"sort": TEMPLATE_METRIC}
+
+
+def test_rejected_cookies_refresh_login_and_retry(session_path, monkeypatch):
+    write_session(session_path, "expired")
+
+    class Driver(object):
+        def get(self, url):
+            pass
+
+        def execute_cdp_cmd(self, cmd, params):
+            assert cmd == "Network.getAllCookies"
+            return {"cookies": cookies("fresh") + [{"name": "other", "value": "x", "domain": ".google.com"}]}
+
+    class Session(object):
+        driver = Driver()
+
+    def record_templates(driver, video_id):
+        raise RuntimeError("browser started without capture")
+
+    # The templates can't be recorded again, so the saved ones have to be kept
+    monkeypatch.setattr(studio_client, "record_templates", record_templates)
+    monkeypatch.setattr(util.log_videos, "get_videos", lambda only_recent=True: [{"id": VIDEO_ID}])
+
+    with StandInServer(Studio()) as server:
+        client = StudioClient(session_path, base_url=server.url, session=Session())
+        card = client.latest_activity(ScrapeMode.video, VIDEO_ID)
+
+    assert card["id"] == VIDEO_ID
+    assert len(server.requests) == 2
+    assert "SAPISID=expired" in server.requests[0]["headers"]["cookie"]
+    assert "SAPISID=fresh" in server.requests[1]["headers"]["cookie"]
+    with open(session_path, "r") as f:
+        saved = json.load(f)
+    assert saved["templates"] == TEMPLATES
+    assert [cookie["name"] for cookie in saved["cookies"]] == ["SAPISID", "SID"]
+
+
+def test_rejected_cookies_without_session(session_path):
+    write_session(session_path, "expired")
+    with StandInServer(Studio()) as server:
+        with pytest.raises(StudioAuthError):
+            StudioClient(session_path, base_url=server.url).latest_activity(ScrapeMode.video, VIDEO_ID)
+        assert len(server.requests) == 1
+
+
+def test_refresh_only_retried_once(session_path, monkeypatch):
+    # Studio keeps rejecting the new cookies too
+    monkeypatch.setattr(studio_client, "refresh_login", lambda session, path: None)
+    with StandInServer(Studio(valid_sapisid="something else")) as server:
+        client = StudioClient(session_path, base_url=server.url, session=object())
+        with pytest.raises(StudioAuthError):
+            client.latest_activity(ScrapeMode.video, VIDEO_ID)
+        assert len(server.requests) == 2
+
+
+def test_server_error(session_path):
+    with StandInServer(lambda request: (500, {"error": {"code": 500}})) as server:
+        with pytest.raises(HttpError) as error:
+            StudioClient(session_path, base_url=server.url).metric_data(VIDEO_ID, METRICS["views"])
+    assert error.value.status == 500
+
+
+def test_no_session_file(tmp_path):
+    with pytest.raises(StudioAuthError):
+        StudioClient(str(tmp_path / "missing.json"))
@@ -0,0 +1,110 @@
+"""The vectorized assemble_data functions have to give exactly the rows of the loop versions"""
+
+import datetime as dt
+import random
+
+import pytest
+
+import scrape_hourly
+from util import scrape_since_publish_functions as since_publish
+from util.scrape_since_publish_functions import subs_from_totals
+from util.vectorize import to_datetimes, to_weekdays, spread_percentages
+from util.constants import ScrapeMode, TRAFFIC_SOURCES, TRAFFIC_SOURCES_IMP
+
+START_MS = 1629158400000 # 2021-08-17 00:00 UTC
+HOUR_MS = 60*60*1000
+MINUTE_MS = 60*1000
+
+
+def same_rows(a: list, b: list) -> bool:
+    """Same rows with the keys in the same order (the order becomes the csv header)"""
+    return a == b and [list(row) for row in a] == [list(row) for row in b]
+
+
+def random_card(rng: random.Random, mode: ScrapeMode, n_points: int=49, step_ms: int=HOUR_MS,
+window: str="last48HoursData") -> dict:
+    chart = [{"x": START_MS + i*step_ms, "y": rng.randint(0, 5000)} for i in range(n_points)]
+    table = []
+    for i in range(rng.randint(1, 10)):
+        percentages = [rng.random() for _ in range(n_points)]
+        if mode == ScrapeMode.channel:
+            category = {"value": f"{rng.randint(1, 2000000):,}", "sparkChartPercentages": percentages}
+            if rng.random() < .5:
+                category["analyticsLink"] = {"routeLink": {"route": {"params": {"videoId": f"video{i:06}"}}}}
+            else:
+                category["thumbnailData"] = {"thumbnailUrl": f"https://i.ytimg.com/vi/video{i:06}/mqdefault.jpg"}
+        else:
+            category = {"title": f"Source {i}", "value": f"{rng.random()*100:.1f}%", "sparkChartPercentages": percentages}
+        table.append(category)
+    total = sum(datapoint["y"] for datapoint in chart)
+    return {window: {"totalMetricValue": f"{total:,}", "mainChart": {"data": chart}, "table": table}}
+
+
+def random_category(rng: random.Random, name: str, n_points: int, step_ms: int, scale: int, full: bool=False) -> dict:
+    # Some categories are shorter, like traffic sources that only started later
+    length = n_points if full or rng.random() < .7 else rng.randint(0, n_points)
+    return {"name": name, "data": [{
+        "x": START_MS + i*step_ms,
+        "y": rng.randint(0, scale),
+        "hovercardInfo": {"relativeDateFormatted": f"First {i}"},
+    } for i in range(length)]}
+
+
+def random_metrics_data(rng: random.Random, n_points: int, step_ms: int) -> dict:
+    metrics_data = {}
+    for metric_key, scale in [("views", 1000), ("watchtime", 10**8), ("impressions", 10**4)]:
+        names = list(TRAFFIC_SOURCES) if metric_key != "impressions" else list(TRAFFIC_SOURCES_IMP)
+        # Every category is in the TRAFFIC_SOURCES order, but some are missing
+        # The first category of views is complete, assemble_data pads the first row it makes
+        metrics_data[metric_key] = [random_category(rng, name, n_points, step_ms, scale, full=i == 0 and not metrics_data)
+                                    for i, name in enumerate(names) if i == 0 or rng.random() < .8]
+    for metric_key in ["likes", "dislikes"]:
+        metrics_data[metric_key] = [random_category(rng, "MAIN_METRIC_SERIES_NAME", n_points, step_ms, 50)]
+    # The subs come from the totals of the explore page, which have primaryLabel instead of relativeDateFormatted
+    totals = random_category(rng, "MAIN_METRIC_SERIES_NAME", n_points, step_ms, 50)
+    for datapoint in totals["data"]:
+        datapoint["hovercardInfo"] = {"primaryLabel": datapoint["hovercardInfo"]["relativeDateFormatted"]}
+    metrics_data["subs"] = subs_from_totals(totals)
+    return metrics_data
+
+
+def test_to_datetimes_and_weekdays():
+    x_ms = [START_MS + i*7*HOUR_MS + i for i in range(200)]
+    expected = [dt.datetime.fromtimestamp(x/1000, dt.timezone.utc) for x in x_ms]
+    assert to_datetimes(x_ms) == expected
+    assert to_weekdays(x_ms) == [datetime.strftime('%a') for datetime in expected]
+
+
+def test_spread_percentages():
+    percentages = [.1, .2, .3, .4]
+    views_per_percent = 1234 / sum(percentages)
+    assert spread_percentages(percentages, 4, 1234) == [int(p * views_per_percent) for p in percentages]
+
+
+@pytest.mark.parametrize("mode", [ScrapeMode.channel, ScrapeMode.video])
+@pytest.mark.parametrize("seed", range(20))
+def test_hourly_assemble_data(mode, seed):
+    card = random_card(random.Random(seed), mode)
+    assert same_rows(scrape_hourly.assemble_data(card, mode), scrape_hourly.assemble_data_vectorized(card, mode))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_hourly_assemble_data_minutes(seed):
+    window = "last60MinutesData"
+    card = random_card(random.Random(seed), ScrapeMode.video, 61, MINUTE_MS, window)
+    assert same_rows(scrape_hourly.assemble_data(card, ScrapeMode.video, window),
+                     scrape_hourly.assemble_data_vectorized(card, ScrapeMode.video, window))
+
+
+@pytest.mark.parametrize("n_points, step_ms", [(30*24, HOUR_MS), (24*60, MINUTE_MS), (3, HOUR_MS)])
+@pytest.mark.parametrize("seed", range(5))
+def test_since_publish_assemble_data(n_points, step_ms, seed):
+    metrics_data = random_metrics_data(random.Random(seed), n_points, step_ms)
+    assert same_rows(since_publish.assemble_data(metrics_data), since_publish.assemble_data_vectorized(metrics_data))
+
+
+def test_since_publish_unknown_traffic_source():
+    metrics_data = random_metrics_data(random.Random(0), 10, HOUR_MS)
+    metrics_data["views"].append(random_category(random.Random(0), "NEW_SOURCE_main", 10, HOUR_MS, 10))
+    assert since_publish.assemble_data(metrics_data) is None
+    assert since_publish.assemble_data_vectorized(metrics_data) is None
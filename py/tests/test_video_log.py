@@ -0,0 +1,25 @@
+"""VideoLog keeps its dates in naive UTC, whatever the backends give"""
+
+import datetime as dt
+
+from util.log_videos import VideoLog, update_video_log_recencies
+
+
+def test_upsert_aware_datetime(tmp_path):
+    path = str(tmp_path / "video_log.csv")
+    log = VideoLog(path)
+    log.upsert(dt.datetime(2021, 8, 1, 12, 0), "old_video", "Old", recent=1, precise=1)
+    log.upsert(dt.datetime.utcnow() - dt.timedelta(days=1), "new_video", "New")
+    log.save()
+
+    log = VideoLog.load(path)
+    # Like the analytics backend gives it: 14:30 in UTC+2 is 12:30 UTC
+    aware = dt.datetime(2021, 8, 2, 14, 30, 15, tzinfo=dt.timezone(dt.timedelta(hours=2)))
+    log.upsert(aware, "analytics_video", "Analytics", recent=1, precise=1)
+    assert log.videos["analytics_video"]["date"] == dt.datetime(2021, 8, 2, 12, 30)
+    assert [video["id"] for video in log.sorted_videos()] == ["old_video", "analytics_video", "new_video"]
+
+    update_video_log_recencies(log.sorted_videos(only_recent=True), log=log)
+    log = VideoLog.load(path)
+    assert {id: video["recent"] for id, video in log.videos.items()} == \
+        {"old_video": 0, "analytics_video": 0, "new_video": 1}
@@ -9,9 +9,48 @@ Heatmap/audience retention falls into this. It only becomes available a certain
 """
 
 import json
+import re
 
 from util.constants import VIDEO_URL
 from util.helpers import wait_for_element
+from util.http_fetch import ConnectionPool
+from util.driver_session import DriverSession
+
+# The watch page has the initial data json in a script tag, heatMarkers is in there
+INITIAL_DATA_MARKERS = ['var ytInitialData = ', 'window["ytInitialData"] = ']
+HEATMAP_KEY = re.compile(r'"heatMarkers":\s*')
+_decoder = json.JSONDecoder()
+
+
+class HeatmapNotFoundError(Exception):
+    """The watch page has no heatmap (yet), like for new videos or videos with too few views"""
+
+
+def parse_heatmap_data(html: str) -> list:
+    """
+    Return the heatMarkers list from watch page html.
+    Only the array itself is decoded (with raw_decode), starting from the initial data json if it can be found.
+    """
+    start = 0
+    for marker in INITIAL_DATA_MARKERS:
+        index = html.find(marker)
+        if index != -1:
+            start = index
+            break
+
+    match = HEATMAP_KEY.search(html, start)
+    if not match:
+        raise HeatmapNotFoundError('Heatmap data not found')
+    heatmap_data, _ = _decoder.raw_decode(html, match.end())
+    return heatmap_data
+
+
+def scrape_heatmap_data_by_http(video_id, pool: ConnectionPool=None) -> list:
+    """Video heatmap data from the watch page over plain HTTP, no browser. Returns list like scrape_heatmap_data."""
+    pool = pool or ConnectionPool()
+    html = pool.fetch(VIDEO_URL.format(video_id=video_id))
+    return parse_heatmap_data(html)
+
 
 def scrape_heatmap_data(driver, video_id):
     """
@@ -25,27 +64,17 @@ def scrape_heatmap_data(driver, video_id):
     driver.get(url)
     wait_for_element(driver, 'div.ytp-heat-map-container')
     # wait_for_element(driver, 'path.ytp-heat-map-path') # This is the actual heatmap, but it's not always present
-    html = driver.page_source
-
-    find_str = '"heatMarkers":'
-    if html.find(find_str) == -1:
-        raise Exception('Heatmap data not found')
-
-    json_str = html[html.find('"heatMarkers":') + len(find_str):]
-    # json_str = json_str[:json_str.find(']') + 1]
-    counter_curly = 0
-    counter_square = 0
-    for i, c in enumerate(json_str):
-        if c == '{':
-            counter_curly += 1
-        elif c == '}':
-            counter_curly -= 1
-        elif c == '[':
-            counter_square += 1
-        elif c == ']':
-            counter_square -= 1
-        if counter_curly == 0 and counter_square == 0:
-            break
-    heatmap_data = json.loads(json_str[:i + 1])
+    return parse_heatmap_data(driver.page_source)
+
+
+def get_heatmap_data(video_id, pool: ConnectionPool=None, session: DriverSession=None) -> list:
+    """Video heatmap data over plain HTTP, falling back to the browser (<session>'s, or a new one) if that fails."""
+    try:
+        return scrape_heatmap_data_by_http(video_id, pool)
+    except Exception as e:
+        print(f"Couldn't get heatmap of {video_id} over HTTP ({e}), falling back to the browser")
 
-    return heatmap_data
\ No newline at end of file
+    if session is not None:
+        return scrape_heatmap_data(session.driver, video_id)
+    with DriverSession() as session:
+        return scrape_heatmap_data(session.driver, video_id)
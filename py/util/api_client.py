@@ -0,0 +1,115 @@
+"""
+Direct YouTube Data API client, instead of driving the APIs Explorer "Try it" iframe with selenium.
+Batches up to 50 ids per request and follows pagination.
+Needs an API key in custom_values.API_KEY. The base url can point to a local stand-in server.
+Every call is recorded in the quota ledger, and calls are refused (QuotaExceededError) once today's budget is gone.
+"""
+
+import json
+import datetime as dt
+from urllib.parse import urlencode
+from typing import List, Dict, Union, Iterator
+
+from .http_fetch import ConnectionPool
+from .api_quota import QuotaLedger, QuotaExceededError, QUOTA_ERROR_REASONS
+from .api_scrape_utils import parse_channel_item, parse_playlist_item, parse_video_item
+
+from .custom_values import API_KEY, API_BASE_URL
+from .constants import API_CHANNELS_PARTS, API_PLAYLIST_PARTS, API_VIDEOS_PARTS
+
+MAX_RESULTS = 50 # Most ids/results the API gives per request
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=None, reason=None):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+class DataApiClient(object):
+    def __init__(self, api_key: str=API_KEY, base_url: str=API_BASE_URL, pool: ConnectionPool=None, 
+    ledger: QuotaLedger=None):
+        if not api_key:
+            raise ApiError("No API key set in custom_values.API_KEY")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/") + "/"
+        self.pool = pool or ConnectionPool()
+        self.ledger = ledger or QuotaLedger()
+
+    def get(self, endpoint: str, params: dict) -> dict:
+        """
+        Return json response of GET <endpoint>, raise ApiError with the reason YouTube gives if it failed.
+        Raises QuotaExceededError without calling if the quota is used up, or if YouTube says it is.
+        """
+        self.ledger.reserve(endpoint)
+        url = self.base_url + endpoint + "?" + urlencode(dict(params, key=self.api_key))
+        status, _, text = self.pool.request("GET", url)
+        try:
+            result = json.loads(text)
+        except ValueError:
+            raise ApiError(f"No json in response to {endpoint} (HTTP {status})", status)
+        if status != 200 or "error" in result:
+            error = result.get("error", {})
+            reason = (error.get("errors") or [{}])[0].get("reason")
+            if reason in QUOTA_ERROR_REASONS:
+                self.ledger.mark_exhausted()
+                raise QuotaExceededError(f"{endpoint}: {reason}, until {self.ledger.resets_at()}")
+            raise ApiError(f"{endpoint}: {error.get('message', 'HTTP '+str(status))}", status, reason)
+        return result
+
+    def list_items(self, endpoint: str, params: dict) -> Iterator[dict]:
+        """Yield all items of a list endpoint, following nextPageToken"""
+        params = dict(params, maxResults=MAX_RESULTS)
+        while True:
+            result = self.get(endpoint, params)
+            yield from result.get("items", [])
+            if not result.get("nextPageToken"):
+                return
+            params["pageToken"] = result["nextPageToken"]
+
+    def list_by_ids(self, endpoint: str, ids: List[str], part: str) -> List[dict]:
+        """Return items for <ids>, requested in batches of 50 ids"""
+        items = []
+        for batch in range(0, len(ids), MAX_RESULTS):
+            items.extend(self.list_items(endpoint, {"part": part, "id": ",".join(ids[batch:batch+MAX_RESULTS])}))
+        return items
+
+    def videos(self, ids: List[str], part: str=API_VIDEOS_PARTS) -> List[dict]:
+        return self.list_by_ids("videos", ids, part)
+
+    def channels(self, ids: List[str], part: str=API_CHANNELS_PARTS) -> List[dict]:
+        return self.list_by_ids("channels", ids, part)
+
+    def playlist_items(self, playlist_id: str, part: str=API_PLAYLIST_PARTS) -> List[dict]:
+        return list(self.list_items("playlistItems", {"part": part, "playlistId": playlist_id}))
+
+
+def get_videos_basics(video_ids: List[str], client: DataApiClient=None) -> Dict[str, Dict[str,Union[str,dt.datetime]]]:
+    """Return dictionary of video upload date and title by video id, like scrape_videos_basics_by_api"""
+    client = client or DataApiClient()
+    cost = -(-len(video_ids) // MAX_RESULTS)
+    if not client.ledger.can_afford(cost):
+        raise QuotaExceededError(f"Not enough API quota for {cost} requests, resets at {client.ledger.resets_at()}")
+    videos = {item["id"]: dict(parse_video_item(item), precise=1) for item in client.videos(video_ids)}
+    for video_id in video_ids:
+        if video_id not in videos:
+            print(f"Couldn't find {video_id}: might be private [{__file__}]")
+    return videos
+
+
+def get_channels_info(ids: List[str], client: DataApiClient=None) -> dict:
+    """Return dictionary of channel info by channel id, like scrape_channels_info"""
+    client = client or DataApiClient()
+    return {item["id"]: parse_channel_item(item) for item in client.channels(ids)}
+
+
+def get_playlist_info(playlist_ids: List[str], client: DataApiClient=None) -> dict:
+    """Return dictionary of video info (excluding statistics) by video id, like scrape_playlist_info"""
+    client = client or DataApiClient()
+    videos = {}
+    for playlist_id in playlist_ids:
+        for item in client.playlist_items(playlist_id):
+            video = parse_playlist_item(item)
+            videos[video["id"]] = video
+    return videos
@@ -0,0 +1,104 @@
+"""
+Persistent ledger of YouTube Data API quota use, so we know when the API can be used
+and only fall back to slower scraping when the daily quota is actually used up.
+The quota resets at midnight Pacific Time.
+"""
+
+import json
+import os
+import threading
+import datetime as dt
+
+from .custom_values import DATA_DIR, API_DAILY_QUOTA
+
+# Units per call, see https://developers.google.com/youtube/v3/determine_quota_cost
+QUOTA_COSTS = {
+    "videos": 1,
+    "channels": 1,
+    "playlistItems": 1,
+    "search": 100,
+}
+# Error reasons that mean the quota for today is gone
+QUOTA_ERROR_REASONS = ["quotaExceeded", "dailyLimitExceeded"]
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception: # No time zone data (Windows without tzdata), ignore daylight saving time
+    QUOTA_TIMEZONE = dt.timezone(dt.timedelta(hours=-8))
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+def quota_day(now: dt.datetime=None) -> str:
+    """Return the date of the current quota day"""
+    now = now or dt.datetime.now(dt.timezone.utc)
+    return now.astimezone(QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+
+class QuotaLedger(object):
+    """
+    Keeps track of the units used today in a json file.
+
+    Usage:
+    ledger = QuotaLedger()
+    ledger.reserve("videos") # Raises QuotaExceededError if there's no budget left
+    """
+    def __init__(self, path: str=os.path.join(DATA_DIR, "api_quota.json"), daily_limit: int=API_DAILY_QUOTA):
+        self.path = path
+        self.daily_limit = daily_limit
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                self.state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.state = {}
+        self._roll_over()
+
+    def _roll_over(self) -> None:
+        """Start a new day if the quota has been reset since the last call"""
+        today = quota_day()
+        if self.state.get("day") != today:
+            self.state = {"day": today, "used": 0, "exhausted": False, "calls": {}}
+
+    def _save(self) -> None:
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self.path)
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._roll_over()
+            if self.state["exhausted"]:
+                return 0
+            return max(0, self.daily_limit - self.state["used"])
+
+    def can_afford(self, cost: int) -> bool:
+        return self.remaining() >= cost
+
+    def reserve(self, endpoint: str, cost: int=None) -> None:
+        """Record the cost of a call to <endpoint>, raise QuotaExceededError if it doesn't fit in today's budget"""
+        cost = QUOTA_COSTS.get(endpoint, 1) if cost is None else cost
+        with self._lock:
+            self._roll_over()
+            if self.state["exhausted"] or self.state["used"] + cost > self.daily_limit:
+                raise QuotaExceededError(f"API quota used up until {self.resets_at()}")
+            self.state["used"] += cost
+            self.state["calls"][endpoint] = self.state["calls"].get(endpoint, 0) + 1
+            self._save()
+
+    def mark_exhausted(self) -> None:
+        """YouTube said the quota is gone, so don't try again until the reset"""
+        with self._lock:
+            self._roll_over()
+            self.state["exhausted"] = True
+            self._save()
+
+    def resets_at(self) -> dt.datetime:
+        """Return the (local) datetime of the next quota reset"""
+        now = dt.datetime.now(QUOTA_TIMEZONE)
+        midnight = dt.datetime.combine(now.date() + dt.timedelta(days=1), dt.time(), tzinfo=QUOTA_TIMEZONE)
+        return midnight.astimezone()
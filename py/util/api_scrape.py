@@ -14,11 +14,12 @@ import json
 import datetime as dt
 from typing import List, Dict, Union
 
-from .api_scrape_utils import parse_channel_item, parse_playlist_item, parse_video_item_str, scrape_api_response, clean_response
+from .api_scrape_utils import parse_channel_item, parse_playlist_item, parse_video_item_str, scrape_api_response_text, \
+    clean_response, CLEAR_RESPONSE_JS
+
+from .constants import API_CHANNELS_PARTS, API_PLAYLIST_PARTS
 
 API_URL             = "https://developers.google.com/youtube/v3/docs/{mode}/list?apix=true"
-API_CHANNELS_PARTS  = "snippet,contentDetails,statistics"
-API_PLAYLIST_PARTS  = "contentDetails"
 # url = "https://developers.google.com/youtube/v3/docs/channels/list?apix=true&apix_params=%7B%22part%22%3A%5B%22snippet%2CcontentDetails%2Cstatistics%22%5D%2C%22maxResults%22%3A50%7D"
 # API_PLAYLIST_PARTS = "contentDetails,id,snippet"
 # API_PLAYLIST_URL = "https://developers.google.com/youtube/v3/docs/playlistItems/list?apix=true&apix_params=%7B%22part%22%3A%5B%22contentDetails%2Csnippet%22%5D%2C%22maxResults%22%3A50%7D"
@@ -40,8 +41,9 @@ def switch_to_iframe(driver):
 
 
 def execute(driver):
-    """Execute API request and return (hopefully complete) html response"""
+    """Execute API request and return json text of the response"""
     # Execute
+    driver.execute_script(CLEAR_RESPONSE_JS)
     driver.find_element(By.ID, "execute").click()
 
     # Switch to raw HTML output
@@ -51,12 +53,16 @@ def execute(driver):
     )
     driver.find_element(By.CSS_SELECTOR, raw_html_tab_css).click()
 
-    return scrape_api_response(driver)
+    return scrape_api_response_text(driver)
 
 
 def html_to_json(html):
     """parse HTML output into json"""
-    json_string = clean_response(html)
+    return text_to_json(clean_response(html))
+
+
+def text_to_json(json_string):
+    """parse json text, None if it's not valid"""
     try:
         json_result = json.loads(json_string)
     except Exception as e:
@@ -106,7 +112,7 @@ def scrape_channels_info(driver, ids, batch_len=1, comma_separated=False):
                 element.send_keys(id_str)
 
             # Get result in json
-            json_result = html_to_json(execute(driver))
+            json_result = text_to_json(execute(driver))
             if not json_result:
                 continue
 
@@ -141,7 +147,7 @@ def scrape_playlist_info(driver, playlist_ids):
             element.send_keys(playlist_id)
 
             # Get result in json
-            json_result = html_to_json(execute(driver))
+            json_result = text_to_json(execute(driver))
             if not json_result:
                 continue
 
@@ -176,7 +182,7 @@ def scrape_videos_basics_by_api(driver, video_ids: List[str]) -> Dict[str, Dict[
             element.send_keys(vid_id)
 
             # Get result in json string
-            json_string = clean_response(execute(driver))
+            json_string = execute(driver)
 
             # Parse the video json into our format
             video_dict = parse_video_item_str(json_string)
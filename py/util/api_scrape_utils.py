@@ -47,6 +47,12 @@ def parse_playlist_item(item) -> Dict[str,Union[str, dt.datetime]]:
         "datetime": item["contentDetails"]["videoPublishedAt"],
     }
 
+def parse_video_item(item: dict) -> Dict[str,Union[str, dt.datetime]]:
+    return {
+        "title": item["snippet"]["title"],
+        "datetime": dt.datetime.strptime(item["snippet"]["publishedAt"][:16], "%Y-%m-%dT%H:%M"),
+    }
+
 def parse_video_item_str(item_string: str) -> Union[Dict[str,Union[str, dt.datetime]], None]:
     """Extract title and date from json string. Robust because it doesn't try to json.loads"""
     try:
@@ -61,6 +67,41 @@ def parse_video_item_str(item_string: str) -> Union[Dict[str,Union[str, dt.datet
     }
 
 
+# Whole response from the CodeMirror instance of the raw response tab, or null while it's incomplete
+RESPONSE_TEXT_JS = """
+    const editor = document.querySelector('#response-raw .CodeMirror');
+    if (!editor || !editor.CodeMirror) { return null; }
+    const text = editor.CodeMirror.getValue().trim();
+    return text.endsWith('}') ? text : null;
+"""
+
+
+# Empty the editor so a previous response isn't mistaken for the new one
+CLEAR_RESPONSE_JS = """
+    const editor = document.querySelector('#response-raw .CodeMirror');
+    if (editor && editor.CodeMirror) { editor.CodeMirror.setValue(''); }
+"""
+
+
+def strip_response_intro(text: str) -> str:
+    """Remove everything before the json (like the status line and headers)"""
+    return text[text.find('{'):] if '{' in text else text
+
+
+def scrape_api_response_text(driver, timeout=10) -> str:
+    """
+    Return the API response as plain json text.
+    Gets the complete text in one round trip from the editor's document model, no html to clean.
+    Falls back to scrolling and stitching the html with scrape_api_response if the editor isn't reachable.
+    """
+    try:
+        text = WebDriverWait(driver, timeout).until(lambda driver: driver.execute_script(RESPONSE_TEXT_JS))
+        return strip_response_intro(text)
+    except Exception as e:
+        print(f"Couldn't get API response from the editor ({e}), falling back to scrolling")
+        return clean_response(scrape_api_response(driver))
+
+
 def scrape_api_response(driver) -> str:
     """Return stitched string of HOPEFULLY complete API response. Unreliable: sometimes it seems lines are skipped"""
     response = ""
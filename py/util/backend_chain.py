@@ -0,0 +1,141 @@
+"""
+Fallback chain of interchangeable backends (different ways of getting the same data).
+Keeps rolling latency and success statistics per backend in a small json file, tries the backends
+in order of expected cost, and stops trying a backend for a while when it keeps failing (circuit breaker).
+"""
+
+import json
+import os
+import time
+import datetime as dt
+from typing import Callable
+
+from .custom_values import DATA_DIR
+
+STATS_PATH = os.path.join(DATA_DIR, "backend_stats.json")
+
+
+class BackendChain(object):
+    """
+    Usage:
+    chain = BackendChain("videos_basics")
+    chain.register("api", lambda: get_videos_basics(video_ids), skip_on=(QuotaExceededError,), prior_cost=.02)
+    chain.register("page", lambda: extract_videos_basics_by_page(video_ids), prior_cost=10)
+    videos = chain.run(len(video_ids))
+    """
+    def __init__(self, name: str, stats_path: str=STATS_PATH, window: int=20, failure_threshold: int=3,
+    cooldown: dt.timedelta=dt.timedelta(hours=6), is_valid: Callable=bool):
+        """
+        window: number of recent calls per backend the statistics are based on
+        failure_threshold: consecutive failures after which the circuit of a backend opens
+        cooldown: how long an open circuit is skipped before the backend gets one new try
+        is_valid: whether a result counts as a success
+        """
+        self.name = name
+        self.stats_path = stats_path
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.is_valid = is_valid
+        self.backends = {}
+        self.skip_on = {}
+        self.ranks = {}
+        self.prior_costs = {}
+        try:
+            with open(stats_path, "r") as f:
+                self.all_stats = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.all_stats = {}
+        self.stats = self.all_stats.setdefault(name, {})
+
+    def register(self, name: str, fn: Callable, skip_on: tuple=(), rank: int=0, prior_cost: float=0) -> None:
+        """
+        Add backend <fn> (no arguments, returns the result or raises). Exceptions in <skip_on> mean the backend
+        can't be used right now (like no quota left), they're not counted as failures.
+        Backends with a higher <rank> are only tried after all lower ranks, whatever they cost
+        (for backends that give worse results).
+        <prior_cost> is the expected cost (seconds per item) until the backend has statistics, so an untried slow
+        backend doesn't go before the ones that have been measured. Ties keep registration order.
+        """
+        self.backends[name] = fn
+        self.skip_on[name] = skip_on
+        self.ranks[name] = rank
+        self.prior_costs[name] = prior_cost
+
+    def _backend_stats(self, name: str) -> dict:
+        return self.stats.setdefault(name, {"calls": [], "consecutive_failures": 0, "open_until": None})
+
+    def expected_cost(self, name: str) -> float:
+        """
+        Expected seconds per item until a success: mean latency per item divided by the success rate.
+        The success rate is smoothed so one lucky or unlucky call doesn't decide everything.
+        Returns the prior cost the backend was registered with if it has no statistics yet.
+        """
+        calls = self._backend_stats(name)["calls"]
+        if not calls:
+            return self.prior_costs.get(name, 0)
+        mean_latency = sum(latency for latency, _ in calls) / len(calls)
+        success_rate = (sum(success for _, success in calls) + 1) / (len(calls) + 2)
+        return mean_latency / success_rate
+
+    def is_open(self, name: str) -> bool:
+        """Whether the circuit of the backend is open, meaning it shouldn't be tried now"""
+        open_until = self._backend_stats(name)["open_until"]
+        return open_until is not None and dt.datetime.now() < dt.datetime.fromisoformat(open_until)
+
+    def ordered(self) -> list:
+        """Return names of the backends that can be tried, by rank and then cheapest first"""
+        names = [name for name in self.backends if not self.is_open(name)]
+        # sorted is stable, so ties keep registration order
+        return sorted(names, key=lambda name: (self.ranks[name], self.expected_cost(name)))
+
+    def record(self, name: str, latency: float, success: bool) -> None:
+        """Add a call that took <latency> seconds per item"""
+        stats = self._backend_stats(name)
+        stats["calls"] = (stats["calls"] + [[round(latency, 4), int(success)]])[-self.window:]
+        if success:
+            stats["consecutive_failures"] = 0
+            stats["open_until"] = None
+        else:
+            stats["consecutive_failures"] += 1
+            if stats["consecutive_failures"] >= self.failure_threshold:
+                stats["open_until"] = (dt.datetime.now() + self.cooldown).isoformat()
+                print(f"{self.name}: {name} failed {stats['consecutive_failures']} times in a row, skipping it until {stats['open_until']}")
+        self._save()
+
+    def _save(self) -> None:
+        temp_path = self.stats_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.all_stats, f)
+        os.replace(temp_path, self.stats_path)
+
+    def run(self, items: int=1):
+        """
+        Return result of the first backend that succeeds, in order of expected cost.
+        <items> is how many things (like video ids) the backends get, the latency is recorded per item
+        so calls with different batch sizes can be compared.
+        """
+        items = max(1, items)
+        order = self.ordered()
+        skipped = [name for name in self.backends if name not in order]
+        if skipped:
+            print(f"{self.name}: skipping {skipped}, circuit open")
+
+        for name in order:
+            start = time.perf_counter()
+            try:
+                result = self.backends[name]()
+            except self.skip_on[name] as e:
+                print(f"{self.name}: {name} not available ({e})")
+                continue
+            except Exception as e:
+                print(f"{self.name}: {name} failed ({e})")
+                self.record(name, (time.perf_counter() - start) / items, False)
+                continue
+
+            success = self.is_valid(result)
+            self.record(name, (time.perf_counter() - start) / items, success)
+            if success:
+                return result
+            print(f"{self.name}: {name} gave no result")
+        raise Exception(f"{self.name}: all backends failed")
@@ -1,6 +1,8 @@
 # Adapted from webdriver-manager library for my own needs
 
 import os
+import json
+import datetime as dt
 from typing import Optional
 
 from packaging import version
@@ -8,11 +10,13 @@ from webdriver_manager.core.download_manager import DownloadManager, WDMDownload
 from webdriver_manager.core.driver_cache import DriverCacheManager
 
 from .os_manager import OperationSystemManager, ChromeType
+from .custom_values import CHROME_BINARY_PATH
 
 LATEST_RELEASE_URL = "https://chromedriver.storage.googleapis.com/LATEST_RELEASE"
 RELEASE_URL = "https://chromedriver.storage.googleapis.com"
 NAME = "chromedriver"
-
+RESOLUTION_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".wdm", "resolution_cache.json")
+RESOLUTION_TTL = dt.timedelta(days=7)
 
 
 class ChromeDriver(object):
@@ -90,6 +94,56 @@ class ChromeDriver(object):
 
 
 
+class ResolutionCache(object):
+    """
+    Remembers which driver belongs to a browser binary, so starting a driver doesn't have to ask the OS
+    for the browser version (powershell subprocesses) or download the version list every time.
+    Entries are keyed by binary path and modification time, so they're invalid as soon as the browser updates.
+    """
+    def __init__(self, path: str=RESOLUTION_CACHE_PATH, ttl: dt.timedelta=RESOLUTION_TTL):
+        self.path = path
+        self.ttl = ttl
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def get_key(binary_path: str) -> Optional[str]:
+        """Return key of the browser binary, None if it doesn't exist"""
+        try:
+            return f"{binary_path}|{os.stat(binary_path).st_mtime_ns}"
+        except OSError:
+            return None
+
+    def get(self, binary_path: str) -> Optional[dict]:
+        """Return {"version", "driver_path", "url", "resolved"} for the browser binary if it's still valid"""
+        key = self.get_key(binary_path)
+        entry = self.entries.get(key) if key else None
+        if entry is None:
+            return None
+        if dt.datetime.now() - dt.datetime.fromisoformat(entry["resolved"]) > self.ttl:
+            return None
+        if not os.path.isfile(entry["driver_path"]):
+            return None
+        return entry
+
+    def set(self, binary_path: str, version: str, driver_path: str, url: str=None) -> None:
+        key = self.get_key(binary_path)
+        if key is None:
+            return
+        # Drop entries of older versions of the same binary
+        self.entries = {k: v for k, v in self.entries.items() if not k.startswith(binary_path+"|")}
+        self.entries[key] = {"version": version, "driver_path": driver_path, "url": url, "resolved": dt.datetime.now().isoformat()}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+
 class ChromeDriverManager(object):
     def __init__(
             self,
@@ -97,8 +151,15 @@ class ChromeDriverManager(object):
             chrome_type: str = ChromeType.GOOGLE_BETA,
             download_manager: Optional[DownloadManager] = None,
             cache_manager: Optional[DriverCacheManager] = None,
-            os_system_manager: Optional[OperationSystemManager] = None
+            os_system_manager: Optional[OperationSystemManager] = None,
+            browser_binary_path: str = CHROME_BINARY_PATH,
+            resolution_cache: Optional[ResolutionCache] = None
     ):
+        self.browser_binary_path = browser_binary_path
+        self._resolution_cache = resolution_cache
+        if self._resolution_cache is None:
+            self._resolution_cache = ResolutionCache()
+
         self._cache_manager = cache_manager
         if not self._cache_manager:
             self._cache_manager = DriverCacheManager()
@@ -138,18 +199,37 @@ class ChromeDriverManager(object):
 
     def _get_driver_binary_path(self, driver):
         """Return the path of the binary file of the driver. A binary file is a file that can be executed by the os"""
+        return self._find_or_download_driver(driver)[0]
+
+    def _find_or_download_driver(self, driver) -> tuple:
+        """Return (binary path, download url) of the driver, the url is None if the driver was already cached"""
         # In case the driver is already cached, return the path of the cached driver
         binary_path = self._cache_manager.find_driver(driver)
         if binary_path:
-            return binary_path
+            return binary_path, None
 
         os_type = self.get_os_type()
-        file = self._download_manager.download_file(driver.get_driver_download_url(os_type))
+        url = driver.get_driver_download_url(os_type)
+        file = self._download_manager.download_file(url)
         binary_path = self._cache_manager.save_file_to_cache(driver, file)
-        return binary_path
+        return binary_path, url
     
+    def resolve(self) -> dict:
+        """
+        Return {"version", "driver_path", "url"} of the driver for the browser binary, url is None if it wasn't downloaded.
+        From the resolution cache if the browser didn't change, otherwise the driver is looked up (and downloaded if necessary).
+        """
+        entry = self._resolution_cache.get(self.browser_binary_path)
+        if entry:
+            return entry
+
+        browser_version = self.driver.get_browser_version_from_os()
+        # The url is only known (and only needed) when the driver had to be downloaded
+        driver_path, url = self._find_or_download_driver(self.driver)
+        os.chmod(driver_path, 0o755) # make executable, 0o755 is the octal representation of the permissions
+        self._resolution_cache.set(self.browser_binary_path, browser_version, driver_path, url)
+        return {"version": browser_version, "driver_path": driver_path, "url": url}
+
     def install(self) -> str:
         """Return the path of the binary file of the driver after making it executable"""
-        driver_path = self._get_driver_binary_path(self.driver)
-        os.chmod(driver_path, 0o755) # make executable, 0o755 is the octal representation of the permissions
-        return driver_path
+        return self.resolve()["driver_path"]
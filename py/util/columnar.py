@@ -0,0 +1,109 @@
+"""
+Columnar .npz files for since_published and first_24h data, as an alternative to csv.
+Every column is its own typed array in the (uncompressed) npz, so one metric can be loaded
+without parsing the rest: np.load(path)["views_Total"]
+Timestamps are stored as UTC epoch seconds, the day column isn't stored because it follows from the timestamp.
+"""
+
+import csv
+import os
+import datetime as dt
+from typing import List
+
+import numpy as np
+
+DATETIME_COLUMN = "datetime(UTC)"
+DERIVED_COLUMNS = ["day"] # Not stored
+TEXT_COLUMNS = ["time delta"]
+# The order of the csv columns, so the csv can be rebuilt
+COLUMNS_KEY = "__columns__"
+
+
+def to_array(values: list) -> np.ndarray:
+    """Return int64 array if all values are ints, otherwise float64 with NaN for missing values"""
+    if all(type(value) == int for value in values):
+        return np.array(values, dtype=np.int64)
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def save_columnar(data: List[dict], filepath: str) -> None:
+    """Save rows like assemble_data returns (list of dicts) as columns in <filepath>.npz"""
+    columns = list(data[0].keys())
+    for row in data: # Later rows can have columns the first doesn't
+        columns.extend(key for key in row.keys() if key not in columns)
+
+    arrays = {COLUMNS_KEY: np.array(columns)}
+    for column in columns:
+        if column in DERIVED_COLUMNS:
+            continue
+        values = [row.get(column) for row in data]
+        if column == DATETIME_COLUMN:
+            arrays[column] = np.array([int(value.timestamp()) for value in values], dtype=np.int64)
+        elif column in TEXT_COLUMNS:
+            arrays[column] = np.array(["" if value is None else value for value in values])
+        else:
+            arrays[column] = to_array(values)
+
+    # Write to temporary file first so a crash doesn't leave a broken file
+    temp_path = filepath + ".tmp.npz"
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, filepath + ".npz")
+
+
+def load_columnar(filepath: str) -> np.lib.npyio.NpzFile:
+    """Return lazy mapping of column name to array for <filepath>.npz, a column is only read when accessed"""
+    return np.load(filepath + ".npz")
+
+
+def count_rows(filepath: str) -> int:
+    """Return number of rows in <filepath>.npz, 0 if it doesn't exist"""
+    if not os.path.isfile(filepath + ".npz"):
+        return 0
+    with load_columnar(filepath) as columns:
+        return len(columns[DATETIME_COLUMN])
+
+
+def parse_csv_value(value: str):
+    if value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def convert_csv(filepath: str) -> None:
+    """Convert <filepath>.csv into <filepath>.npz"""
+    with open(filepath + ".csv", "r", newline='') as f:
+        reader = csv.DictReader(f)
+        data = []
+        for row in reader:
+            converted = {}
+            for column, value in row.items():
+                if column == DATETIME_COLUMN:
+                    converted[column] = dt.datetime.strptime(value, "%Y-%m-%d %H:%M:%S%z")
+                elif column in TEXT_COLUMNS or column in DERIVED_COLUMNS:
+                    converted[column] = value
+                else:
+                    converted[column] = parse_csv_value(value)
+            data.append(converted)
+    if data:
+        save_columnar(data, filepath)
+
+
+def convert_csv_archive(dir: str, prefixes=("since_published_", "first_24h_"), overwrite=False) -> None:
+    """Convert every csv in <dir> that starts with one of <prefixes> to npz. Keeps the csv files."""
+    for filename in sorted(os.listdir(dir)):
+        if not filename.endswith(".csv") or not filename.startswith(prefixes):
+            continue
+        filepath = os.path.join(dir, filename[:-len(".csv")])
+        if os.path.isfile(filepath + ".npz") and not overwrite:
+            continue
+        convert_csv(filepath)
+        print(f"Converted {filename} to npz")
+
+
+if __name__ == "__main__":
+    # Run from the py folder with: python -m util.columnar
+    from .custom_values import DATA_DIR
+    convert_csv_archive(DATA_DIR)
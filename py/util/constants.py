@@ -13,6 +13,24 @@ VIDEOS_URL          = "https://studio.youtube.com/channel/{channel_id}/videos/{u
 VIDEO_URL           = "https://www.youtube.com/watch?v={video_id}"
 DAYS_OF_THE_WEEK    = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
+API_CHANNELS_PARTS  = "snippet,contentDetails,statistics"
+API_PLAYLIST_PARTS  = "contentDetails"
+API_VIDEOS_PARTS    = "snippet"
+
+# Lean browser (see startWebdriver): window size and URL patterns that are blocked because no scraper reads them
+LEAN_WINDOW_SIZE    = "1280,900"
+LEAN_BLOCKED_URLS   = [
+    # Images, fonts and media
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.mp4", "*.webm",
+    "*/videoplayback*",
+    "*i.ytimg.com/*", "*yt3.ggpht.com/*", "*yt3.googleusercontent.com/*", "*lh3.googleusercontent.com/*",
+    # Analytics and ads
+    "*google-analytics.com/*", "*googletagmanager.com/*", "*doubleclick.net/*", "*googlesyndication.com/*",
+    "*googleadservices.com/*", "*youtube.com/api/stats/*", "*youtube.com/ptracking*", "*youtube.com/pagead/*",
+    "*play.google.com/log*", "*youtube.com/generate_204*",
+]
+
 # -----------------------------------------------------------------------------
 
 METRICS = { # These are the metrics that show granular data
@@ -22,6 +40,7 @@ METRICS = { # These are the metrics that show granular data
     "likes"         : "RATINGS_LIKES",
     "dislikes"      : "RATINGS_DISLIKES",
 }
+SUBS_METRIC = "SUBSCRIBERS_NET_CHANGE" # Only has totals, not per traffic source
 class TimePeriod(Enum):
     first_24h = "since_publish%2Ctime_period_unit_nth_days%2C1"
     since_published = "since_publish"
@@ -0,0 +1,92 @@
+"""
+Append-only writing for csv files that only ever grow at the end, like the Hourly_ files.
+Only the header and the last row are read, instead of the whole file.
+"""
+
+import csv
+import io
+import os
+from shutil import copyfileobj
+
+
+def read_header(filepath: str) -> list:
+    """Return the fieldnames in the first line of the csv"""
+    with open(filepath, "r", newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def read_last_row(filepath: str, fieldnames: list, block_size: int=4096) -> dict:
+    """Return the last row of the csv as a dict by only reading the tail of the file. None if there are no rows."""
+    with open(filepath, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b""
+        # Read blocks from the end until the tail holds a complete last row
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            tail = f.read(read_size) + tail
+            if tail.rstrip(b"\r\n").count(b"\n") >= 1:
+                break
+
+    lines = tail.rstrip(b"\r\n").split(b"\n")
+    if position == 0 and len(lines) < 2: # Only the header
+        return None
+    row = next(csv.reader([lines[-1].decode("utf-8", errors="replace").rstrip("\r")]))
+    return dict(zip(fieldnames, row))
+
+
+def migrate_header(filepath: str, fieldnames: list) -> None:
+    """
+    Replace the header of the csv with <fieldnames> without parsing the rows.
+    New fields should be added at the end, the rows that are already there will then just miss the last fields.
+    """
+    header = io.StringIO()
+    csv.writer(header).writerow(fieldnames)
+
+    temp_path = filepath + ".tmp"
+    with open(filepath, "rb") as old, open(temp_path, "wb") as new:
+        old.readline() # Skip old header
+        new.write(header.getvalue().encode("utf-8"))
+        copyfileobj(old, new)
+    os.replace(temp_path, filepath)
+
+
+def ensure_trailing_newline(filepath: str) -> None:
+    """Make sure appended rows start on a new line, even if the last write was cut off"""
+    with open(filepath, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\r\n")
+
+
+def append_rows(filepath: str, rows: list, fieldnames: list=None) -> list:
+    """
+    Append <rows> (list of dicts) to the csv, creating it if necessary.
+    If the rows have keys that aren't in the header yet, the header is migrated first.
+    Return the fieldnames of the file.
+    """
+    if not os.path.isfile(filepath):
+        fieldnames = fieldnames or list(rows[-1].keys())
+        with open(filepath, "w", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        return fieldnames
+
+    if fieldnames is None:
+        fieldnames = read_header(filepath)
+    new_fields = [key for row in rows for key in row.keys() if key not in fieldnames]
+    if new_fields:
+        fieldnames = fieldnames + list(dict.fromkeys(new_fields))
+        migrate_header(filepath, fieldnames)
+
+    ensure_trailing_newline(filepath)
+    with open(filepath, "a", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames)
+        writer.writerows(rows)
+    return fieldnames
@@ -9,6 +9,8 @@ DATA_DIR            = "D:\\Users\\Luuk\\Documents\\Programming\\stuff\\yt_realti
 # This is the location where you put a chromedriver
 # (you'll need to download one that corresponds to your version of Google Chrome)
 CHROMEDRIVER_PATH   = "C:\\chromedriver\\chromedriver"
+# The Chrome (Beta) that selenium starts. util/chromedriver_manager.py gets the matching driver for it
+CHROME_BINARY_PATH  = "C:\\Program Files\\Google\\Chrome Beta\\Application\\chrome.exe"
 # Find the "User Data" folder at
 # C:\\Users\\{username}\\AppData\\Local\\Google\\Chrome\\User Data\\
 USER_DATA_ORIGINAL_PATH = "C:\\Users\\321lu\\AppData\\Local\\Google\\Chrome\\User Data"
@@ -19,6 +21,46 @@ CHROME_PROFILE      = "Profile 1"
 
 USER_DATA_BACKUP_PATH = os.path.join(DATA_DIR, "backup/User Data(backup)")
 
+# YouTube Data API key for util/api_client.py (https://console.cloud.google.com/apis/credentials), empty to not use the API
+API_KEY             = ""
+# Can be pointed at a local stand-in server for testing
+API_BASE_URL        = "https://www.googleapis.com/youtube/v3/"
+# Units per day for the API key (10000 is the default), tracked by util/api_quota.py
+API_DAILY_QUOTA     = 10000
+
+# Where the scraped time series go: "csv" (one file per video and mode) or "sqlite" (one database at SQLITE_PATH)
+STORAGE_BACKEND     = "csv"
+SQLITE_PATH         = os.path.join(DATA_DIR, "analytics.sqlite")
+
+# File format of since_published and first_24h data when STORAGE_BACKEND is "csv": "csv" or "npz" (columnar, see util/columnar.py)
+SINCE_PUBLISH_FORMAT = "csv"
+
+# Start the browser headless, with a small window and without images, fonts, media and trackers (see startWebdriver)
+LEAN_BROWSER        = False
+# Read the analytics json from the network responses instead of the rendered page (see util/network_capture.py)
+NETWORK_CAPTURE     = False
+
+# Get Studio analytics over plain HTTP with cookies exported from the browser (see util/studio_client.py).
+# The browser is only used to refresh the login, and as fallback
+STUDIO_HTTP         = False
+# Can be pointed at a local stand-in server for testing
+STUDIO_BASE_URL     = "https://studio.youtube.com"
+STUDIO_SESSION_PATH = os.path.join(DATA_DIR, "studio_session.json")
+
+# Keep every raw payload (card, chart data) in a compressed journal in DATA_DIR/journal (see util/payload_journal.py),
+# so a scrape that assemble_data failed on (like an unknown traffic source) can be rebuilt with replay.py.
+# Repeated payloads aren't stored again, set JOURNAL_KEEP_MONTHS to limit the size further
+PAYLOAD_JOURNAL     = True
+# "gzip" or "zstd" (needs the zstandard package)
+JOURNAL_COMPRESSION = "gzip"
+# The journal has a file per month, only the last this many months are kept (0 to keep everything)
+JOURNAL_KEEP_MONTHS = 0
+
+# Number of browsers that scrape videos in parallel in scrape_since_publish.py.
+# Every extra browser gets its own copy of the (backup) User Data folder in WORKER_PROFILES_PATH
+SCRAPE_WORKERS      = 1
+WORKER_PROFILES_PATH = os.path.join(DATA_DIR, "worker_profiles")
+
 if __name__ == "__main__":
     print()
     print(f"data listdir: {os.listdir(DATA_DIR)}")
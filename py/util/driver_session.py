@@ -0,0 +1,77 @@
+from typing import Callable
+
+from .helpers import startWebdriver
+
+
+class DriverSession(object):
+    """
+    Keeps one webdriver alive so it can be shared by everything in a run.
+    The browser is only started when it's first needed and only restarted when it's dead.
+
+    Usage:
+    with DriverSession(printing=True) as session:
+        test_YouTube_login(session.driver)
+        process(session=session)
+
+    The keyword arguments go to startWebdriver, so DriverSession(lean=True) keeps a lean headless browser.
+    A different <start> function can be given, like start_worker_webdriver for the browsers of parallel workers.
+    <single_load> is turned off for the rest of the run when Studio's router ignores the single load navigation
+    (see scrape_since_publish.process), so not every video waits for it to time out.
+    """
+    def __init__(self, start: Callable=startWebdriver, **webdriver_kwargs):
+        self._start = start
+        self._webdriver_kwargs = webdriver_kwargs
+        self._driver = None
+        self.single_load = True
+
+    @property
+    def driver(self):
+        """Return the running driver, (re)starting it if there isn't a live one"""
+        if self._driver is None or not self.is_alive():
+            self.restart()
+        return self._driver
+
+    def is_alive(self) -> bool:
+        """Return False if the browser or chromedriver has died (or the window was closed)"""
+        if self._driver is None:
+            return False
+        try:
+            self._driver.window_handles
+            return True
+        except Exception: # Once chromedriver is gone this is a connection error rather than a WebDriverException
+            return False
+
+    def restart(self):
+        """Quit the current driver (if any) and start a new one"""
+        if self._driver is not None:
+            print(f"Restarting webdriver [{__file__}]")
+            self.quit()
+        self._driver = self._start(**self._webdriver_kwargs)
+        # Only print the driver details the first time
+        self._webdriver_kwargs["printing"] = False
+
+    def quit(self):
+        if self._driver is None:
+            return
+        try:
+            self._driver.quit()
+        except Exception:
+            pass
+        self._driver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.quit()
+        return False
+
+
+def get_session(session: DriverSession=None) -> tuple:
+    """
+    Return (session, owned). Makes a new session if none was given, in which case owned is True
+    and the caller should quit it when it's done.
+    """
+    if session is not None:
+        return session, False
+    return DriverSession(), True
@@ -0,0 +1,97 @@
+"""
+Compact storage of video heatmaps (audience retention markers) in one binary file.
+Every video is one fixed-size record: the video id, the video duration and HEATMAP_LENGTH uint16 intensities,
+so the whole file loads into one numpy array and videos can be compared without parsing anything.
+"""
+
+import os
+
+import numpy as np
+
+from .custom_values import DATA_DIR
+
+HEATMAP_LENGTH = 100 # YouTube gives 100 markers per video
+RECORD_DTYPE = np.dtype([
+    ("id", "S11"),
+    ("duration_ms", "<u4"),
+    ("intensity", "<u2", (HEATMAP_LENGTH,)), # Normalized score (0-1) scaled to 0-65535
+])
+INTENSITY_SCALE = np.iinfo(np.uint16).max
+
+
+def markers_to_record(video_id: str, heatmap_data: list) -> np.ndarray:
+    """Return a RECORD_DTYPE record from the heatMarkers list, resampled to HEATMAP_LENGTH if necessary"""
+    renderers = [marker.get("heatMarkerRenderer", marker) for marker in heatmap_data]
+    starts = np.array([float(renderer["timeRangeStartMillis"]) for renderer in renderers])
+    durations = np.array([float(renderer.get("markerDurationMillis", 0)) for renderer in renderers])
+    scores = np.array([float(renderer["heatMarkerIntensityScoreNormalized"]) for renderer in renderers])
+    if len(scores) == 0:
+        raise ValueError(f"Empty heatmap for {video_id}")
+
+    if len(scores) != HEATMAP_LENGTH:
+        # Resample by the middle of every marker
+        duration = starts[-1] + durations[-1]
+        middles = starts + durations/2
+        new_middles = (np.arange(HEATMAP_LENGTH) + .5) * duration/HEATMAP_LENGTH
+        scores = np.interp(new_middles, middles, scores)
+
+    record = np.zeros((), dtype=RECORD_DTYPE)
+    record["id"] = video_id.encode("ascii")
+    record["duration_ms"] = int(starts[-1] + durations[-1])
+    record["intensity"] = np.round(np.clip(scores, 0, 1) * INTENSITY_SCALE).astype(np.uint16)
+    return record
+
+
+class HeatmapStore(object):
+    """
+    All heatmaps in one file of fixed-size records, with an in-memory index of video id to record number.
+
+    Usage:
+    store = HeatmapStore()
+    if video_id not in store:
+        store.add(video_id, heatmap_data)
+    ids, intensities = store.load_all()
+    """
+    def __init__(self, path: str=os.path.join(DATA_DIR, "heatmaps.bin")):
+        self.path = path
+        self.index = {}
+        if not os.path.isfile(path):
+            return
+        # Drop a record that was cut off by a crash
+        size = os.path.getsize(path)
+        if size % RECORD_DTYPE.itemsize:
+            with open(path, "rb+") as f:
+                f.truncate(size - size % RECORD_DTYPE.itemsize)
+        ids = np.fromfile(path, dtype=RECORD_DTYPE)["id"]
+        self.index = {id.decode("ascii"): row for row, id in enumerate(ids)}
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add(self, video_id: str, heatmap_data: list) -> None:
+        """Add heatmap of a video, overwriting its record if it's already stored"""
+        record = markers_to_record(video_id, heatmap_data)
+        if video_id in self.index:
+            with open(self.path, "rb+") as f:
+                f.seek(self.index[video_id] * RECORD_DTYPE.itemsize)
+                f.write(record.tobytes())
+            return
+        with open(self.path, "ab") as f:
+            f.write(record.tobytes())
+        self.index[video_id] = len(self.index)
+
+    def load_all(self) -> tuple:
+        """Return (list of video ids, float array of shape (videos, HEATMAP_LENGTH) with intensities 0-1)"""
+        if not self.index:
+            return [], np.zeros((0, HEATMAP_LENGTH))
+        records = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", shape=(len(self.index),))
+        ids = [id.decode("ascii") for id in records["id"]]
+        return ids, records["intensity"] / INTENSITY_SCALE
+
+    def get(self, video_id: str) -> np.ndarray:
+        """Return intensities 0-1 of one video"""
+        records = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", shape=(len(self.index),))
+        return records[self.index[video_id]]["intensity"] / INTENSITY_SCALE
@@ -6,51 +6,158 @@ from selenium.webdriver.common.by import By
 from selenium.common.exceptions import WebDriverException, TimeoutException
 from selenium.webdriver.chrome.options import Options
 from .chromedriver_manager import ChromeDriverManager # my own adaptation of webdriver_manager
+from .network_capture import enable_performance_logging
 
 from send_email.send_email import send_email
 
-from .custom_values import CHROMEDRIVER_PATH, USER_DATA_PATH, CHROME_PROFILE, USER_DATA_BACKUP_PATH, CHANNEL_ID
-from .constants import VIDEOS_URL
+from .custom_values import CHROMEDRIVER_PATH, USER_DATA_PATH, CHROME_PROFILE, USER_DATA_BACKUP_PATH, CHANNEL_ID, \
+    WORKER_PROFILES_PATH, CHROME_BINARY_PATH, LEAN_BROWSER, NETWORK_CAPTURE
+from .constants import VIDEOS_URL, LEAN_WINDOW_SIZE, LEAN_BLOCKED_URLS
 
 # Folder manipulation stuff
-from shutil import rmtree
+import os
+from shutil import rmtree, copytree, ignore_patterns
 from distutils.dir_util import copy_tree
 
 # For decorator
 import functools
 
-def startWebdriver(chromedriver_path="manager", use_profile=CHROME_PROFILE, printing=False) -> webdriver.Chrome:
-    """Starts the selenium webdriver and adds options"""
+def startWebdriver(chromedriver_path="manager", use_profile=CHROME_PROFILE, printing=False, user_data_path=USER_DATA_PATH,
+    lean=LEAN_BROWSER, capture=NETWORK_CAPTURE) -> webdriver.Chrome:
+    """
+    Starts the selenium webdriver and adds options.
+    If <lean>, the browser is headless with a fixed small window, and images, fonts, media and analytics/ads
+    requests (LEAN_BLOCKED_URLS) are blocked through the DevTools protocol. None of those are read by the scrapers.
+    If <capture>, network events are logged so the scrapers can read the json responses (see util/network_capture.py).
+    """
 
     chrome_options = Options()
     chrome_options.add_argument("--disable-extensions")
     chrome_options.add_argument("--disable-gpu")
     if use_profile:
         # The CHROME_PROFILE is a folder in the USER_DATA_PATH
-        chrome_options.add_argument("user-data-dir="+USER_DATA_PATH)
+        chrome_options.add_argument("user-data-dir="+user_data_path)
         chrome_options.add_argument("profile-directory="+CHROME_PROFILE)
-    chrome_options.add_argument("--start-maximized")
+    if lean:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size="+LEAN_WINDOW_SIZE)
+        chrome_options.add_argument("--mute-audio")
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    else:
+        chrome_options.add_argument("--start-maximized")
     chrome_options.add_argument("disable-infobars")
-    chrome_options.binary_location = "C:\Program Files\Google\Chrome Beta\Application\chrome.exe"
+    if capture:
+        enable_performance_logging(chrome_options)
+    chrome_options.binary_location = CHROME_BINARY_PATH
 
     if chromedriver_path == "manager":
-        manager = ChromeDriverManager()
-        if printing:
-            # print("OS Type: " + manager.get_os_type())
-            # print("Browser type: ", manager.driver.get_browser_type())
-            print("Browser version: ", manager.driver.get_browser_version_from_os())
-            print("Latest driver: ", manager.driver.get_latest_release_version())
-            print("Driver download url: ", manager.driver.get_driver_download_url(manager.get_os_type()))
-        chromedriver_path = ChromeDriverManager().install()
+        chromedriver_path = resolve_chromedriver(printing)
 
     chrome_options.executable_path = chromedriver_path
-    return webdriver.Chrome(options=chrome_options)
+    driver = webdriver.Chrome(options=chrome_options)
+    if lean:
+        # Blocked requests fail immediately, so the pages don't wait for them
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS})
+    return driver
+
+def resolve_chromedriver(printing=False) -> str:
+    """
+    Return path of the chromedriver for the browser, downloading it if necessary.
+    Resolved once per browser version, see ResolutionCache.
+    """
+    resolution = ChromeDriverManager(browser_binary_path=CHROME_BINARY_PATH).resolve()
+    if printing:
+        print("Browser version: ", resolution["version"])
+        print("Driver path: ", resolution["driver_path"])
+        if resolution["url"]:
+            print("Driver download url: ", resolution["url"])
+    return resolution["driver_path"]
+
+def page_load_report(driver) -> dict:
+    """
+    Return load time, number of requests, bytes transferred and JS heap size of the current page,
+    from the performance API. Requests that were blocked aren't counted.
+    """
+    return driver.execute_script("""
+        const nav = performance.getEntriesByType("navigation")[0] || {};
+        const resources = performance.getEntriesByType("resource");
+        return {
+            url: location.href,
+            load_ms: Math.round(nav.loadEventEnd || nav.duration || 0),
+            dom_content_loaded_ms: Math.round(nav.domContentLoadedEventEnd || 0),
+            requests: resources.length + 1,
+            transfer_bytes: resources.reduce((sum, r) => sum + (r.transferSize || 0), nav.transferSize || 0),
+            decoded_bytes: resources.reduce((sum, r) => sum + (r.decodedBodySize || 0), nav.decodedBodySize || 0),
+            js_heap_bytes: performance.memory ? performance.memory.usedJSHeapSize : null,
+        };""")
+
+def compare_page_loads(urls: list, wait_css: str=None) -> list:
+    """
+    Load every url in a normal and a lean browser and print the page_load_report of both.
+    If <wait_css> is given the report is taken when that element is on the page, otherwise after the load event.
+    Return list of (normal report, lean report).
+    """
+    reports = []
+    for lean in [False, True]:
+        driver = startWebdriver(lean=lean)
+        try:
+            for i, url in enumerate(urls):
+                driver.get(url)
+                if wait_css:
+                    wait_for_element(driver, wait_css, timeout=30)
+                report = page_load_report(driver)
+                if lean:
+                    reports[i] = (reports[i], report)
+                else:
+                    reports.append(report)
+        finally:
+            driver.quit()
+
+    for normal, lean in reports:
+        print(normal["url"])
+        for key in ["load_ms", "dom_content_loaded_ms", "requests", "transfer_bytes", "decoded_bytes", "js_heap_bytes"]:
+            print(f"    {key:<22} {normal[key]!s:>12} -> {lean[key]!s:>12}")
+    return reports
 
 def replace_dir(dir, replace_dir):
     """Remove <dir> folder and replace it with <replace_dir> folder."""
     rmtree(dir)
     copy_tree(replace_dir, dir)
 
+def make_worker_profile(worker: int, source=USER_DATA_BACKUP_PATH, refresh=False) -> str:
+    """
+    Return path to a User Data folder for parallel browser <worker>, copying it from <source> if it doesn't exist yet.
+    Chrome locks its User Data folder, so every browser that runs at the same time needs its own copy.
+    Caches aren't copied.
+    """
+    path = os.path.join(WORKER_PROFILES_PATH, f"User Data {worker}")
+    if os.path.isdir(path) and not refresh:
+        return path
+    if os.path.isdir(path):
+        rmtree(path)
+    copytree(source, path, ignore=ignore_patterns("Cache", "Code Cache", "GPUCache", "CacheStorage", "Singleton*"))
+    print(f"Made User Data copy for worker {worker} [{__file__}]")
+    return path
+
+def start_worker_webdriver(worker: int, chromedriver_path="manager", **webdriver_kwargs) -> webdriver.Chrome:
+    """
+    Start a browser for parallel <worker> with its own User Data folder (see make_worker_profile) and test the login.
+    If it isn't logged in, the copy is made again from the backup (it can be from an older login) and tested once more.
+    Raise AssertionError if that isn't logged in either.
+    """
+    for refresh in [False, True]:
+        driver = startWebdriver(chromedriver_path, user_data_path=make_worker_profile(worker, refresh=refresh),
+                                **webdriver_kwargs)
+        try:
+            test_YouTube_login(driver)
+            return driver
+        except AssertionError:
+            driver.quit() # Chrome has to let go of the folder before it can be copied again
+            print(f"Worker {worker} isn't logged in [{__file__}]")
+    raise AssertionError(f"Worker {worker} isn't logged in with a fresh copy of {USER_DATA_BACKUP_PATH} either, "
+                         "log in again and update the backup")
+
 def reset_user_data(dir=USER_DATA_PATH, replace_dir=USER_DATA_BACKUP_PATH):
     """
     Remove <dir> folder and replace it with <replace_dir> folder.
@@ -0,0 +1,173 @@
+"""
+Pooled HTTP fetching without a browser.
+Connections are kept alive per thread and host, responses are requested compressed,
+and reading can stop as soon as everything that's needed has been seen.
+"""
+
+import codecs
+import http.client
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urljoin
+from typing import Callable, Dict, List
+
+try:
+    import brotli # Optional, only used to accept br encoded responses
+except ImportError:
+    brotli = None
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli else "gzip, deflate"
+# Errors that mean a kept-alive connection was closed by the server, worth one retry on a new connection
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                           http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+# Redirects are followed like urlopen does (consent and region redirects of watch pages), at most this many in a row
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+
+class HttpError(Exception):
+    def __init__(self, status, url, text=""):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+        self.text = text
+
+
+def get_decompressor(content_encoding: str):
+    """Return object with decompress(bytes) for the Content-Encoding, None if not compressed"""
+    if content_encoding == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if content_encoding == "deflate":
+        return zlib.decompressobj()
+    if content_encoding == "br" and brotli:
+        decompressor = brotli.Decompressor()
+        decompressor.decompress = decompressor.process
+        return decompressor
+    return None
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive connections, one per thread and host, so threads can fetch at the same time.
+
+    Usage:
+    pool = ConnectionPool()
+    html = pool.fetch(VIDEO_URL.format(video_id=id), until=[re.compile('itemprop="uploadDate"')])
+    """
+    def __init__(self, timeout: float=10, headers: dict=None):
+        self.timeout = timeout
+        self.headers = {"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING, "Accept-Language": "en-US,en"}
+        self.headers.update(headers or {})
+        self._local = threading.local()
+
+    def _connections(self) -> dict:
+        if not hasattr(self._local, "connections"):
+            self._local.connections = {}
+        return self._local.connections
+
+    def _connection(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        connections = self._connections()
+        if (scheme, host) not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            connections[(scheme, host)] = connection_class(host, timeout=self.timeout)
+        return connections[(scheme, host)]
+
+    def _drop(self, scheme: str, host: str) -> None:
+        connection = self._connections().pop((scheme, host), None)
+        if connection is not None:
+            connection.close()
+
+    def _send(self, method, url, body, headers) -> tuple:
+        """Send request, retrying once on a new connection if the kept-alive one turned out to be closed"""
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        for attempt in range(2):
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                return parts, connection.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                self._drop(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+
+    def request(self, method: str, url: str, body: bytes=None, headers: dict=None,
+    until: List[re.Pattern]=None, chunk_size: int=16384) -> tuple:
+        """
+        Return (status, response headers, text) for the request, after following up to MAX_REDIRECTS redirects.
+        If <until> is given, stop reading as soon as every pattern has matched. The connection is then closed
+        because the rest of the response is still on it, but that's cheaper than reading a page we don't need.
+        """
+        request_headers = dict(self.headers, **(headers or {}))
+        for redirects in range(MAX_REDIRECTS + 1):
+            parts, response = self._send(method, url, body, request_headers)
+            location = response.getheader("Location")
+            if response.status not in REDIRECT_STATUSES or not location or redirects == MAX_REDIRECTS:
+                break
+            # Read the rest of the redirect so the connection can be used again
+            response.read()
+            if response.will_close:
+                self._drop(parts.scheme, parts.netloc)
+            url = urljoin(url, location)
+            if response.status == 303 or (response.status in (301, 302) and method == "POST"):
+                # Like browsers, the request after these is a GET without the body
+                method, body = "GET", None
+                request_headers = {key: value for key, value in request_headers.items()
+                                   if key.lower() not in ("content-type", "content-length")}
+
+        decompressor = get_decompressor(response.getheader("Content-Encoding", ""))
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = list(until or [])
+        text = ""
+        stopped = False
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            # Only search the new text, with some overlap for matches across chunks
+            search_from = max(0, len(text) - 1024)
+            text += decoder.decode(chunk)
+            if pending:
+                pending = [pattern for pattern in pending if not pattern.search(text, search_from)]
+                if not pending:
+                    stopped = True
+                    break
+        text += decoder.decode(b"", final=True)
+
+        if stopped or response.will_close:
+            self._drop(parts.scheme, parts.netloc)
+        return response.status, dict(response.getheaders()), text
+
+    def fetch(self, url: str, until: List[re.Pattern]=None, headers: dict=None) -> str:
+        """Return text of GET <url>, raise HttpError if the status isn't 200"""
+        status, _, text = self.request("GET", url, headers=headers, until=until)
+        if status != 200:
+            raise HttpError(status, url, text)
+        return text
+
+    def close(self) -> None:
+        """Close the connections of the current thread"""
+        for scheme, host in list(self._connections().keys()):
+            self._drop(scheme, host)
+
+
+def fetch_many(items: list, fetch_fn: Callable, workers: int=8) -> Dict:
+    """
+    Return {item: fetch_fn(item)} with at most <workers> fetches at the same time.
+    If fetch_fn raises, the exception is the value for that item.
+    """
+    def safe_fetch(item):
+        try:
+            return fetch_fn(item)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(items, executor.map(safe_fetch, items)))
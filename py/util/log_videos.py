@@ -1,21 +1,29 @@
+import bisect
 import csv
 import datetime as dt
 import os
-from urllib.request import urlopen
+import re
 import scrapetube
 
 # Selenium stuff
 from selenium import webdriver
+from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException
 
 from typing import List, Dict, Union
 
-from .helpers import startWebdriver, extract_from_str, wait_for_element
+from .helpers import extract_from_str, wait_for_element
+from .driver_session import DriverSession, get_session
+from .http_fetch import ConnectionPool, fetch_many
 
-from .custom_values import CHANNEL_ID, DATA_DIR
+from .custom_values import CHANNEL_ID, DATA_DIR, API_KEY
 from .constants import VIDEOS_URL, VIDEO_URL
 
-from .api_scrape import scrape_videos_basics_by_api
+from .storage import open_storage
+
+from .api_client import get_videos_basics
+from .api_quota import QuotaExceededError
+from .backend_chain import BackendChain
 from .scrape_since_publish_functions import scrape_video_basics_by_analytics
 
 
@@ -36,42 +44,110 @@ def scrape_recent_video_ids_by_scrapetube(logged_ids: list):
         new_ids.append(video['videoId'])
     return new_ids
 
-def adjust_video_log(datetime: dt.datetime, id: str, title: str, recent: int=1, precise: int=0) -> None:
+class VideoLog(object):
+    """
+    The video log, loaded once and kept in memory.
+    Keeps a dict of id to record and an index sorted by date, so a batch of changes
+    only costs one read and one write of video_log.csv.
+    Records are like {"date": dt.datetime, "id": str, "title": str, "recent": int, "precise": int}
+
+    Usage:
+    log = VideoLog.load()
+    log.upsert(datetime, id, title)
+    log.save()
+    """
+    FIELDNAMES = ["date", "id", "title", "recent", "precise"]
+    DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+    def __init__(self, path: str=DATA_DIR+"video_log.csv"):
+        self.path = path
+        self.videos = {}
+        self._index = [] # Sorted (date, id) tuples
+        self._changed = False
+
+    @classmethod
+    def load(cls, path: str=DATA_DIR+"video_log.csv") -> "VideoLog":
+        log = cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for video in csv.DictReader(f):
+                    log.videos[video["id"]] = {
+                        "date": dt.datetime.strptime(video["date"], cls.DATE_FORMAT),
+                        "id": video["id"],
+                        "title": video["title"],
+                        "recent": int(video["recent"]),
+                        "precise": int(video["precise"]),
+                    }
+        except FileNotFoundError:
+            print("Making new video log file")
+        log._index = sorted((video["date"], id) for id, video in log.videos.items())
+        return log
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.videos
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    def upsert(self, datetime: dt.datetime, id: str, title: str, recent: int=1, precise: int=0) -> None:
+        """Add a video or overwrite its record"""
+        if id in self.videos:
+            old_key = (self.videos[id]["date"], id)
+            del self._index[bisect.bisect_left(self._index, old_key)]
+        # The log is in naive UTC, aware datetimes (like from the analytics backend) can't be compared with that
+        if datetime.tzinfo is not None:
+            datetime = datetime.astimezone(dt.timezone.utc).replace(tzinfo=None)
+        # Dates are saved to the minute, so keep them like that in memory too
+        datetime = datetime.replace(second=0, microsecond=0)
+        self.videos[id] = {"date": datetime, "id": id, "title": title, "recent": int(recent), "precise": int(precise)}
+        bisect.insort(self._index, (datetime, id))
+        self._changed = True
+
+    def sorted_videos(self, only_recent: bool=False) -> list:
+        """Return records sorted by date"""
+        videos = [self.videos[id] for _, id in self._index]
+        if only_recent:
+            videos = [video for video in videos if video["recent"] == 1]
+        return videos
+
+    def save(self, force: bool=False) -> None:
+        """Write the log sorted by date with one atomic replace. Does nothing if nothing changed, unless <force>."""
+        if not self._changed and not force:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", newline='', encoding="utf-8") as f:
+            writer = csv.DictWriter(f, self.FIELDNAMES)
+            writer.writeheader()
+            for video in self.sorted_videos():
+                writer.writerow(dict(video, date=video["date"].strftime(self.DATE_FORMAT)))
+        os.replace(temp_path, self.path)
+        self._changed = False
+        _video_log_cache["stat"] = None # mtime might not have changed if this was quick
+
+
+def adjust_video_log(datetime: dt.datetime, id: str, title: str, recent: int=1, precise: int=0,
+path: str=DATA_DIR+"video_log.csv") -> None:
     """
     Reads videos from video log, adds given arguments (either adding a new video, 
     or adjusting an existing one), and then overwrites the video log.
+    For more than one video, use VideoLog directly so the log is only read and written once.
     """
-    try:
-        with open(DATA_DIR+"video_log.csv", "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            videos = []
-            for video in reader:
-                if video["id"] == id:
-                    print(f"video already in log, overwriting entry [{__file__}]")
-                    continue
-                videos.append(video)
-    except FileNotFoundError:
-        print("Making new video log file")
-        videos = []
+    log = VideoLog.load(path)
+    if id in log:
+        print(f"video already in log, overwriting entry [{__file__}]")
+    log.upsert(datetime, id, title, recent, precise)
+    log.save()
 
-    videos.append({
-        "date": datetime.strftime('%Y-%m-%d %H:%M'),
-        "id": id,
-        "title": title,
-        "recent": recent,
-        "precise": precise
-    })
-    videos.sort(key=lambda video: dt.datetime.strptime(video["date"], '%Y-%m-%d %H:%M'))
 
-    with open(DATA_DIR+"video_log.csv", "w", newline='', encoding="utf-8") as f:
-        writer = csv.DictWriter(f, videos[0].keys())
-        writer.writeheader()
-        writer.writerows(videos)
+# Parsed video log, reused until video_log.csv changes on disk
+_video_log_cache = {"stat": None, "all": [], "recent": []}
 
 
 def get_videos(only_recent: bool=True) -> list:
     """
     Return a list of videos from the offline log.
+    The log is only parsed again when the file's mtime or size has changed (or VideoLog saved it),
+    otherwise the videos come from memory.
 
     Parameters
     ----------
@@ -87,44 +163,44 @@ def get_videos(only_recent: bool=True) -> list:
             "date": dt.datetime,
             "id": video id,
             "title": video title,
-            "recent": whether new hourly data is still being logged
+            "recent": int, whether new hourly data is still being logged
+            "precise": int, whether the date has the precise upload time
         }
     """
+    path = DATA_DIR+"video_log.csv"
     try:
-        with open(DATA_DIR+"video_log.csv", "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            videos = []
-            for video in reader:
-                if only_recent and int(video["recent"]) != 1:
-                    continue
-                video["date"] = dt.datetime.strptime(
-                    video["date"], '%Y-%m-%d %H:%M')
-                videos.append(video)
+        stat = os.stat(path)
     except FileNotFoundError:
-        # update_video_log()
-        # print(f"No video log found: created one [{__file__}]")
-        # videos = get_videos(only_recent)
         raise FileNotFoundError("no video log found")
+    stat = (stat.st_mtime_ns, stat.st_size)
 
-    return videos
+    if _video_log_cache["stat"] != stat:
+        videos = VideoLog.load(path).sorted_videos()
+        _video_log_cache.update(
+            stat=stat,
+            all=videos,
+            recent=[video for video in videos if video["recent"] == 1],
+        )
+
+    # Copies, so callers can't change the cache
+    return [dict(video) for video in _video_log_cache["recent" if only_recent else "all"]]
 
 
-def update_video_log(video_ids: List[str]=[]) -> None:
+def update_video_log(video_ids: List[str]=[], session: DriverSession=None) -> None:
     """
-    Scrapes video metadata and calls adjust_video_log to update the log.
-    Also calls update_video_log_recencies
+    Scrapes video metadata and updates the log, then calls update_video_log_recencies.
+    The log is read once and written once.
+    Uses the driver of <session> if given, otherwise starts its own (only when a browser is actually needed).
     """
     # Get videos already in log
-    logged_videos = []
-    if os.path.isfile(DATA_DIR+"video_log.csv"):
-        logged_videos = get_videos(False)
-    logged_videos = {video["id"]: video for video in logged_videos}
+    log = VideoLog.load()
+    logged_videos = log.videos
 
     # Scrape video ids if not given
-    driver = startWebdriver()
+    session, owned = get_session(session)
     try:
         # No new videos if the video ids were already in the log
-        logged_video_ids = [vid["id"] for vid in logged_videos.values()]
+        logged_video_ids = list(logged_videos.keys())
 
         if not video_ids:
             try:
@@ -132,43 +208,52 @@ def update_video_log(video_ids: List[str]=[]) -> None:
             except Exception as e:
                 print(e)
                 print("Falling back to scraping by YouTube Studio")
-                video_ids = scrape_recent_video_ids(driver)
+                video_ids = scrape_recent_video_ids(session.driver)
 
         # Only scrape videos that aren't in the log
-        video_ids = [id for id in video_ids if id not in logged_video_ids]
+        video_ids = [id for id in video_ids if id not in logged_videos]
         # Add videos that don't have precise datetime
-        video_ids += [id for id, video in logged_videos.items() if video["precise"] == "0"]
+        video_ids += [id for id, video in logged_videos.items() if video["precise"] == 0]
         if not video_ids:
-            driver.quit()
             print(f"No new videos for log")
             return
         
         # Scrape title and datetime and add video
-        videos = scrape_videos_basics(driver, video_ids)
+        videos = scrape_videos_basics(session, video_ids)
         for id, dict in videos.items():
             # dict sometimes contains characters that map to undefined, unless utf-8 encoding is used
             enc_dict = {k: v.encode('utf-8') if type(v)==str else v for k, v in dict.items()}
-            if id not in logged_video_ids:
+            if id not in logged_videos:
                 print(f"Adding new video to log: {enc_dict}")
             else:
                 print(f"Updating video datetime precision in log: {enc_dict}")
-            adjust_video_log(dict["datetime"], id, dict["title"], precise=dict["precise"])
+            log.upsert(dict["datetime"], id, dict["title"], precise=dict["precise"])
     finally:
-        driver.quit()
+        if owned:
+            session.quit()
 
-    update_video_log_recencies(get_videos(True))
+    update_video_log_recencies(log.sorted_videos(only_recent=True), log=log)
 
+    # Mirror the log into the storage backend if there is one
+    storage = open_storage()
+    if storage is not None:
+        storage.save_videos(log.sorted_videos())
+        storage.close()
 
-def update_video_log_recencies(videos, days=31):
+
+def update_video_log_recencies(videos, days=31, log: VideoLog=None):
     """
     Iterate through videos in log and check if they're still younger than <days>.
     Default is 31 days because YouTube turns off hourly data after a month.
+    Changes are made in <log> (loaded if not given), which is then saved once.
     """
+    if log is None:
+        log = VideoLog.load()
     for video in videos:
         recent = dt.datetime.utcnow() - video['date'] < dt.timedelta(days=days)
 
         if int(video["recent"]) and not recent:
-            adjust_video_log(
+            log.upsert(
                 video["date"],
                 video["id"],
                 video["title"],
@@ -176,31 +261,32 @@ def update_video_log_recencies(videos, days=31):
                 precise=video["precise"],
             )
             print(f"updated recency of {video['id']} to False")
+    log.save()
 
 
 def scrape_videos_basics(driver, video_ids: List[str]) -> Dict[str, Dict[str,Union[str,dt.datetime]]]:
     """
     Return dictionary of video upload date and title by video id. Uses API if possible, otherwise scrapes video page with less precise upload date.
+    The precise backends are tried cheapest first, based on how fast and reliable they were lately (see BackendChain).
+    <driver> can be a DriverSession, then the browser is only started if a backend needs it.
     """
-    try:
-        # videos = scrape_videos_basics_by_api(driver, video_ids)
-        raise Exception("Skipping API call (quota exceeded?)")
-    except Exception as e:
-        print(e)
-        print("Falling back to scraping by YouTube DataViewer")
-        try:
-            # videos = scrape_videos_basics_by_dataviewer(driver, video_ids)
-            raise Exception("Skipping YouTube DataViewer (usually stuck)")
-        except Exception as e:
-            print(e)
-            print("Falling back to scraping by YouTube Analytics")
-            try:
-                videos = scrape_videos_basics_by_analytics(driver, video_ids)
-            except Exception as e:
-                print(e)
-                print("Falling back to extracting by video page")
-                videos = extract_videos_basics_by_page(video_ids)
-    return videos
+    get_driver = lambda: driver.driver if isinstance(driver, DriverSession) else driver
+
+    chain = BackendChain("videos_basics", is_valid=lambda videos: bool(videos) or not video_ids)
+    # Until a backend has statistics it's expected to cost roughly this (seconds per video), so a fresh install
+    # starts with the usual order instead of the untried slow backends
+    if API_KEY:
+        # Direct API requests, no quota left today doesn't count as a failure
+        chain.register("api", lambda: get_videos_basics(video_ids), skip_on=(QuotaExceededError,),
+                       prior_cost=.02) # One request per 50 videos
+    chain.register("analytics", lambda: scrape_videos_basics_by_analytics(get_driver(), video_ids),
+                   prior_cost=10)
+    # Usually gets stuck, the circuit breaker stops trying it for a while when it does
+    chain.register("dataviewer", lambda: scrape_videos_basics_by_dataviewer(get_driver(), video_ids),
+                   prior_cost=60)
+    # Not precise, so only if everything else failed
+    chain.register("page", lambda: extract_videos_basics_by_page(video_ids), rank=1)
+    return chain.run(len(video_ids))
 
 
 def scrape_videos_basics_by_page(driver, video_ids):
@@ -241,14 +327,26 @@ def scrape_videos_basics_by_analytics(driver, video_ids: List[str]) -> Dict[str,
     return videos
 
 
-def extract_videos_basics_by_page(video_ids: List[str]) -> Dict[str, Dict[str,Union[str,dt.datetime]]]:
+# Reading a watch page can stop once the title and upload date have been seen
+BASICS_PATTERNS = [
+    re.compile(r'<meta itemprop="name" content="[^"]*"><meta '),
+    re.compile(r'<meta itemprop="uploadDate" content="[^"]*"><meta '),
+]
+
+
+def extract_videos_basics_by_page(video_ids: List[str], workers: int=8) -> Dict[str, Dict[str,Union[str,dt.datetime]]]:
     """
-    Return dictionary of video upload date and title by video id. Uses video page and cannot get precise upload time. Most robust since it only relies on urlopen.
+    Return dictionary of video upload date and title by video id. Uses video page and cannot get precise upload time. 
+    Most robust since it only relies on plain HTTP. Fetches <workers> pages at the same time over kept-alive connections.
     """
-    videos = {}
+    pool = ConnectionPool()
+    results = fetch_many(video_ids, lambda id: extract_video_basics_by_page(id, pool), workers)
 
-    for video_id in video_ids:
-        title, date = extract_video_basics_by_page(video_id)
+    videos = {}
+    for video_id, result in results.items():
+        if isinstance(result, Exception):
+            raise result
+        title, date = result
         if not title or not date:
             print(f"Couldn't extract video basics for {video_id}, might be private")
             continue
@@ -256,10 +354,10 @@ def extract_videos_basics_by_page(video_ids: List[str]) -> Dict[str, Dict[str,Un
     return videos
 
 
-def extract_video_basics_by_page(id: str) -> tuple:
-    """Use video page to extract video datetime. Uses urlopen. Return (title, datetime)"""
-    with urlopen(VIDEO_URL.format(video_id=id)) as f:
-        html = f.read().decode("utf8")
+def extract_video_basics_by_page(id: str, pool: ConnectionPool=None) -> tuple:
+    """Use video page to extract video datetime. Only reads the page up to the title and date. Return (title, datetime)"""
+    pool = pool or ConnectionPool()
+    html = pool.fetch(VIDEO_URL.format(video_id=id), until=BASICS_PATTERNS)
     
     title = extract_from_str(html, '<meta itemprop="name" content="',       '"><meta ')
     assert len(title) <= 200, f"Found title length is {len(title)} chars long, should be between 1 and 100, with some leeway for special chars"
@@ -294,15 +392,15 @@ def scrape_video_basics_by_dataviewer(driver, video_id: str) -> tuple:
     # Wait 10 seconds for the input element to show up
     input = wait_for_element(driver, "#formInput")
     input.send_keys(f"www.youtube.com/watch?v={video_id}")
-    driver.find_element_by_css_selector('#formInputButton').click()
+    driver.find_element(By.CSS_SELECTOR, '#formInputButton').click()
 
     # Wait 10 seconds for the output text to show up
     try:
         wait_for_element(driver, '#shortOutput > strong')
     except TimeoutException as e:
         raise TimeoutException(f"Amnesty page stuck")
-    title = driver.find_element_by_css_selector('#shortOutput > span > a').get_attribute('innerText')
-    output_elem = driver.find_element_by_css_selector('#shortOutput')
+    title = driver.find_element(By.CSS_SELECTOR, '#shortOutput > span > a').get_attribute('innerText')
+    output_elem = driver.find_element(By.CSS_SELECTOR, '#shortOutput')
     output_string = output_elem.get_attribute('innerText')
     date_string = output_string.split('Upload Date (YYYY/MM/DD): ')[-1].split('\n')[0]
     time_string = output_string.split('Upload Time (UTC): ')[-1].split(' (')[0]
@@ -0,0 +1,125 @@
+"""
+Get the analytics json that YouTube Studio fetches straight from the network (Chrome performance log),
+instead of waiting until the page has rendered it and reading it from the DOM.
+The driver needs performance logging, see enable_performance_logging (startWebdriver does it when capture is on).
+
+Usage:
+capture = NetworkCapture(driver)
+capture.clear()
+driver.get(url)
+card = capture.wait_for_json(lambda obj: "last48HoursData" in obj)
+"""
+
+import json
+import time
+from typing import Callable, Optional
+
+from selenium.common.exceptions import TimeoutException
+
+# Studio fetches its data from these endpoints
+STUDIO_API_PATTERNS = ["/youtubei/v1/"]
+# Some responses start with this to stop them from being run as javascript
+XSSI_PREFIX = ")]}'"
+
+
+def enable_performance_logging(options) -> None:
+    """Make Chrome started with <options> keep the DevTools network events in the performance log"""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def find_in_json(obj, predicate: Callable[[dict], bool]) -> Optional[dict]:
+    """Return the first dict in <obj> (depth first) for which <predicate> is True, None if there is none"""
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            if predicate(item):
+                return item
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+    return None
+
+
+def parse_body(body: str):
+    body = body.lstrip()
+    if body.startswith(XSSI_PREFIX):
+        body = body[len(XSSI_PREFIX):]
+    return json.loads(body)
+
+
+class NetworkCapture(object):
+    """Keeps track of the json responses the page received, from the performance log of <driver>"""
+    def __init__(self, driver, url_patterns: list=STUDIO_API_PATTERNS):
+        self.driver = driver
+        self.url_patterns = url_patterns
+        self.requests = {} # requestId: {"url", "method", "headers", "postData"} of matching requests
+        self.responses = {} # requestId: url, for matching responses that haven't finished loading
+        self.finished = [] # requestIds of matching responses that have finished loading
+        self.last_request = None # Request of the response wait_for_json last returned from
+
+    def _read_log(self) -> None:
+        for entry in self.driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            method, params = message.get("method"), message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                request = params["request"]
+                if any(pattern in request["url"] for pattern in self.url_patterns):
+                    self.requests[params["requestId"]] = dict(request, requestId=params["requestId"])
+            elif method == "Network.responseReceived":
+                url = params["response"]["url"]
+                if any(pattern in url for pattern in self.url_patterns):
+                    self.responses[params["requestId"]] = url
+            elif method == "Network.loadingFinished" and params["requestId"] in self.responses:
+                self.finished.append(params["requestId"])
+
+    def clear(self) -> None:
+        """Forget everything received so far, call before loading the page that fetches the data"""
+        self.driver.get_log("performance")
+        self.requests = {}
+        self.responses = {}
+        self.finished = []
+
+    def wait_for_json(self, predicate: Callable[[dict], bool], timeout: float=10, poll_interval: float=.1) -> dict:
+        """
+        Return the first dict for which <predicate> is True in a json response received since the last clear().
+        Returns as soon as the response body is there. Raises TimeoutException if it isn't there within <timeout> seconds.
+        """
+        end_time = time.time() + timeout
+        while True:
+            self._read_log()
+            while self.finished:
+                request_id = self.finished.pop(0)
+                url = self.responses.pop(request_id)
+                try:
+                    response = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+                    body = response["body"]
+                    if response.get("base64Encoded"):
+                        continue
+                    match = find_in_json(parse_body(body), predicate)
+                except Exception as e: # Body no longer available or not json
+                    print(f"Couldn't read response of {url}: {e}")
+                    continue
+                if match is not None:
+                    self.last_request = self.requests.get(request_id)
+                    return match
+            if time.time() > end_time:
+                raise TimeoutException(f"No matching json response within {timeout} seconds")
+            time.sleep(poll_interval)
+
+
+def get_post_data(driver, request: dict) -> Optional[str]:
+    """Return the body of a request recorded by NetworkCapture, asking the browser for it if it wasn't in the log"""
+    if "postData" in request or not request.get("hasPostData"):
+        return request.get("postData")
+    return driver.execute_cdp_cmd("Network.getRequestPostData", {"requestId": request["requestId"]})["postData"]
+
+
+def is_latest_activity_card(obj: dict) -> bool:
+    """Predicate for the realtime card data that scrape_hourly.scrape reads from the DOM"""
+    return isinstance(obj.get("last48HoursData"), dict) and "mainChart" in obj["last48HoursData"]
+
+
+def is_main_metric_data(obj: dict) -> bool:
+    """Predicate for the chart data that scrape_since_publish_functions.scrape reads from the DOM"""
+    return "totalsSeries" in obj and "series" in obj
@@ -0,0 +1,183 @@
+"""
+Append-only journal of the raw payloads the scrapers get (the realtime card, the explore chart data),
+so everything assemble_data didn't keep (or failed on) can be rebuilt later without scraping again.
+
+Every payload is its own compressed member (gzip, or zstd if the zstandard package is installed and configured),
+appended to one file per month. An index csv next to it has the entity, mode, timestamp, offset and length
+of every payload, so one payload can be read without decompressing the rest.
+A payload that's the same as the last one of its entity and mode isn't stored again.
+"""
+
+import csv
+import datetime as dt
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Iterator
+
+try:
+    import zstandard # Optional, compresses better and faster than gzip
+except ImportError:
+    zstandard = None
+
+from .custom_values import DATA_DIR, PAYLOAD_JOURNAL, JOURNAL_COMPRESSION, JOURNAL_KEEP_MONTHS
+
+JOURNAL_DIR = os.path.join(DATA_DIR, "journal")
+INDEX_FIELDS = ["timestamp", "entity", "mode", "offset", "length", "hash"]
+EXTENSIONS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+# Modes of the payloads, what replay has to do with them depends on it
+HOURLY_CHANNEL = "Hourly_channel"
+HOURLY_VIDEO = "Hourly_video"
+MINUTES_VIDEO = "Minutes_video"
+# since_published and first_24h payloads use the TimePeriod name as mode
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def payload_hash(payload) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class PayloadJournal(object):
+    """
+    Usage:
+    journal = PayloadJournal()
+    journal.append(video_id, "since_published", metrics_data)
+    for entry, payload in journal.iter_payloads(mode="since_published"):
+        ...
+    """
+    def __init__(self, dir: str=JOURNAL_DIR, compression: str=JOURNAL_COMPRESSION):
+        if compression == "zstd" and zstandard is None:
+            print(f"zstandard isn't installed, journaling with gzip [{__file__}]")
+            compression = "gzip"
+        self.dir = dir
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._last_hashes = {} # (entity, mode): hash of the last payload, for the current month
+        self._hashes_month = None
+        os.makedirs(dir, exist_ok=True)
+
+    def _paths(self, month: str, compression: str=None) -> tuple:
+        """Return (data path, index path) of <month> (%Y-%m)"""
+        base = os.path.join(self.dir, f"payloads_{month}")
+        return base + EXTENSIONS[compression or self.compression], base + ".index.csv"
+
+    def months(self) -> list:
+        """Return the months (%Y-%m) that have an index, oldest first"""
+        return sorted(name[len("payloads_"):-len(".index.csv")] for name in os.listdir(self.dir)
+                      if name.startswith("payloads_") and name.endswith(".index.csv"))
+
+    def _load_hashes(self, month: str) -> None:
+        """Remember the last hash per entity and mode of the month, so duplicates are skipped after a restart too"""
+        if self._hashes_month == month:
+            return
+        self._last_hashes = {}
+        for entry in self.iter_index(month):
+            self._last_hashes[(entry["entity"], entry["mode"])] = entry["hash"]
+        self._hashes_month = month
+
+    def append(self, entity: str, mode: str, payload, timestamp: dt.datetime=None) -> bool:
+        """Append <payload> (anything json serializable), return False if it was the same as the last one"""
+        timestamp = timestamp or dt.datetime.now(dt.timezone.utc)
+        month = timestamp.strftime("%Y-%m")
+        data = json.dumps(payload, default=str).encode()
+        hash = payload_hash(payload)
+        member = compress(data, self.compression)
+
+        with self._lock:
+            self._load_hashes(month)
+            if self._last_hashes.get((entity, mode)) == hash:
+                return False
+            data_path, index_path = self._paths(month)
+            with open(data_path, "ab") as f:
+                offset = f.tell()
+                f.write(member)
+            new_index = not os.path.isfile(index_path)
+            with open(index_path, "a", newline='') as f:
+                writer = csv.DictWriter(f, INDEX_FIELDS)
+                if new_index:
+                    writer.writeheader()
+                writer.writerow({"timestamp": timestamp.isoformat(), "entity": entity, "mode": mode,
+                                 "offset": offset, "length": len(member), "hash": hash})
+            self._last_hashes[(entity, mode)] = hash
+        return True
+
+    def iter_index(self, month: str=None) -> Iterator[dict]:
+        """Yield index entries of <month> (all months if None), with the month added"""
+        for index_month in ([month] if month else self.months()):
+            index_path = self._paths(index_month)[1]
+            if not os.path.isfile(index_path):
+                continue
+            with open(index_path, "r", newline='') as f:
+                for entry in csv.DictReader(f):
+                    entry["month"] = index_month
+                    entry["offset"] = int(entry["offset"])
+                    entry["length"] = int(entry["length"])
+                    yield entry
+
+    def read(self, entry: dict):
+        """Return the payload of an index entry"""
+        for compression in [self.compression] + [c for c in EXTENSIONS if c != self.compression]:
+            data_path = self._paths(entry["month"], compression)[0]
+            if os.path.isfile(data_path):
+                with open(data_path, "rb") as f:
+                    f.seek(entry["offset"])
+                    return json.loads(decompress(f.read(entry["length"]), compression))
+        raise FileNotFoundError(f"No journal data for {entry['month']}")
+
+    def iter_payloads(self, entity: str=None, mode: str=None, start: dt.datetime=None, end: dt.datetime=None) -> Iterator[tuple]:
+        """Yield (index entry, payload) for the payloads that match, oldest first"""
+        for entry in self.iter_index():
+            if entity is not None and entry["entity"] != entity:
+                continue
+            if mode is not None and entry["mode"] != mode:
+                continue
+            timestamp = dt.datetime.fromisoformat(entry["timestamp"])
+            if (start is not None and timestamp < start) or (end is not None and timestamp >= end):
+                continue
+            yield entry, self.read(entry)
+
+    def prune(self, keep_months: int) -> list:
+        """Delete the journal files of all but the last <keep_months> months, return the deleted months"""
+        months = self.months()
+        deleted = months[:-keep_months] if keep_months > 0 else []
+        for month in deleted:
+            for path in [self._paths(month, compression)[0] for compression in EXTENSIONS] + [self._paths(month)[1]]:
+                if os.path.isfile(path):
+                    os.remove(path)
+        return deleted
+
+
+def open_journal(enabled: bool=PAYLOAD_JOURNAL, keep_months: int=JOURNAL_KEEP_MONTHS) -> PayloadJournal:
+    """
+    Return the payload journal if journaling is on (custom_values.PAYLOAD_JOURNAL), otherwise None.
+    Months older than <keep_months> are deleted.
+    """
+    if not enabled:
+        return None
+    journal = PayloadJournal()
+    for month in journal.prune(keep_months):
+        print(f"Deleted journal of {month} [{__file__}]")
+    return journal
+
+
+def journal_payload(journal: PayloadJournal, entity: str, mode: str, payload) -> None:
+    """Append to <journal> if there is one. Never raises, the scrape matters more than its journal entry."""
+    if journal is None:
+        return
+    try:
+        journal.append(entity, mode, payload)
+    except Exception as e:
+        print(f"Couldn't journal {mode} payload of {entity}: {e} [{__file__}]")
@@ -2,18 +2,34 @@
 import datetime as dt
 import os
 
+import numpy as np
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
 from util.helpers import wait_for_element
+from util.vectorize import to_datetimes, to_weekdays
+from util.network_capture import NetworkCapture, is_main_metric_data
+
+from util.custom_values import NETWORK_CAPTURE
 
 from util.constants import METRICS, TimePeriod, TRAFFIC_SOURCES_IMP, \
-    TRAFFIC_SOURCES, Dimensions, ADV_URL
+    TRAFFIC_SOURCES, Dimensions, ADV_URL, SUBS_METRIC
 
 SCRIPT_NAME = os.path.basename(__file__)[:-len(".py")]
 
 
-def scrape(driver) -> list:
+class StaleExploreError(Exception):
+    """The explore page didn't fetch new data after switch_explore_url, Studio's router ignored the navigation"""
+    pass
+
+
+def scrape(driver, network: NetworkCapture=None) -> list:
     """
     Scrape YouTube analytics from the chart. Return list of the different 
     dimension categories with data for the loaded webpage.
+    If <network> is given (and was cleared before the page was loaded), the chart data is taken from the json response
+    as soon as it arrives, falling back to the rendered chart if that doesn't work.
     like:
         [
             {
@@ -31,11 +47,18 @@ def scrape(driver) -> list:
             },
         ]
     """
+    if network:
+        try:
+            return metric_data_list_from_json(network.wait_for_json(is_main_metric_data))
+        except Exception as e:
+            print(f"Chart data not captured ({e}), reading the chart from the page")
+
     # Css selectors
     chart_css = 'yta-line-chart-base'
 
     # Wait max 10 seconds for the line element to show up
     wait_for_element(driver, chart_css)
+    wait_for_fresh_data(driver)
     metric_data_list = []
     totals_data = driver.execute_script("return document.querySelector('#explore-app > yta-explore-deep-dive').fetchedData.data.chartProperties.mainMetricData.data[0].totalsSeries")
     series_data_array = driver.execute_script("return Array.from( document.querySelector('#explore-app > yta-explore-deep-dive').fetchedData.data.chartProperties.mainMetricData.data[0].series.values() )")
@@ -44,6 +67,28 @@ def scrape(driver) -> list:
 
     return metric_data_list
 
+def metric_data_list_from_json(main_metric_data: dict) -> list:
+    """
+    Return the list scrape returns from the mainMetricData json (the object with totalsSeries and series),
+    for when the json comes from the network instead of the page. Raises ValueError if the format is unknown.
+    """
+    series = main_metric_data["series"]
+    series = list(series.values()) if isinstance(series, dict) else list(series)
+    metric_data_list = [main_metric_data["totalsSeries"]] + series
+    if not all("name" in category and "data" in category for category in metric_data_list):
+        raise ValueError("Chart data has an unknown format")
+    return metric_data_list
+
+
+def subs_from_totals(totals_data: dict) -> list:
+    """Return the subs list scrape_subs returns from the totals of the explore page with the subs metric"""
+    totals_data["entityTitle"] = "Subscribers Net Change"
+    for datapoint in totals_data["data"]:
+        hovercard = datapoint["hovercardInfo"]
+        hovercard.setdefault("relativeDateFormatted", hovercard.get("primaryLabel"))
+    return [totals_data]
+
+
 def scrape_subs(driver, video_id) -> list:
     """
     Scrape YouTube analytics from the subs chart. Return list because that's the format, but it'll only have one element, being the subs net-change data.
@@ -109,6 +154,90 @@ def scrape_subs(driver, video_id) -> list:
     return [totals_data]
 
 
+def wait_for_fresh_data(driver, timeout=10) -> None:
+    """Wait until the explore page has fetchedData that isn't marked stale by switch_explore_url"""
+    WebDriverWait(driver, timeout).until(lambda driver: driver.execute_script("""
+        const deepDive = document.querySelector('#explore-app > yta-explore-deep-dive');
+        return Boolean(deepDive && deepDive.fetchedData && deepDive.fetchedData.data && !deepDive.fetchedData.__stale);
+    """))
+
+
+def switch_explore_url(driver, url: str, timeout=10, wait=True) -> None:
+    """
+    Make the already loaded explore page show <url> through the app's own router, 
+    so the app only fetches the new data instead of the whole page being loaded again.
+    Marks the current fetchedData as stale and waits until the app has replaced it (unless not <wait>).
+    Raises StaleExploreError if it isn't replaced within <timeout> seconds.
+    """
+    driver.execute_script("""
+        const deepDive = document.querySelector('#explore-app > yta-explore-deep-dive');
+        deepDive.fetchedData.__stale = true;
+        window.history.pushState({}, '', arguments[0]);
+        window.dispatchEvent(new PopStateEvent('popstate', {state: {}}));
+    """, url)
+    if wait:
+        try:
+            wait_for_fresh_data(driver, timeout)
+        except TimeoutException:
+            raise StaleExploreError(f"No new explore data within {timeout} seconds after switching to {url}")
+
+
+def scrape_metrics_single_load(driver, video_id: str, 
+time_period: TimePeriod=TimePeriod.since_published, capture: bool=NETWORK_CAPTURE) -> dict:
+    """
+    Scrape every metric in METRICS and the subs from one load of the explore page, 
+    instead of loading the page for every metric. Return metrics_data like assemble_data takes.
+    Falls back to a load of the subs tab if the explore page can't show subs.
+    If <capture>, the data is read from the network responses instead of waiting for the chart (see scrape).
+    Raises StaleExploreError if the page doesn't get new data after switching to the next metric.
+    """
+    base_url = ADV_URL.format(
+        video_id=video_id,
+        time_period=time_period.value,
+        metric="{metric}",
+        dimension="{dimension}"
+    )
+    metrics_data = {}
+    network = NetworkCapture(driver) if capture else None
+
+    def load(url, first=False):
+        """Load <url>, return the network capture to scrape from, None if it can't be used"""
+        capturing = network is not None
+        if capturing:
+            try:
+                network.clear()
+            except Exception as e: # No performance log, driver wasn't started with capture
+                print(f"Can't capture network ({e}), reading the chart from the page")
+                capturing = False
+        if first:
+            driver.get(url)
+        else:
+            switch_explore_url(driver, url, wait=not capturing)
+        return network if capturing else None
+
+    # Reset elements with random website, then load the explore page once
+    driver.get("https://www.pictureofhotdog.com/")
+    for i, (metric_key, metric_code) in enumerate(METRICS.items()):
+        url = base_url.format(metric=metric_code, dimension=Dimensions.traffic_source.value)
+        try:
+            metrics_data[metric_key] = scrape(driver, load(url, first=i==0))
+        except TimeoutException as e:
+            if i == 0:
+                raise
+            # The chart or its response never came after switching, so the router ignored the navigation
+            raise StaleExploreError(f"No new explore data after switching to {metric_key}: {e}")
+
+    try:
+        subs_url = base_url.format(metric=SUBS_METRIC, dimension=Dimensions.total.value)
+        # Subs have no traffic sources, only the totals are relevant
+        metrics_data["subs"] = subs_from_totals(scrape(driver, load(subs_url))[0])
+    except Exception as e:
+        print(f"Couldn't get subs from the explore page ({e}), using the subs tab")
+        metrics_data["subs"] = scrape_subs(driver, video_id)
+
+    return metrics_data
+
+
 def scrape_video_basics_by_analytics(driver, video_id) -> tuple:
     """Scrape the datetime of the video from the YouTube analytics page. Return as a tuple of title str and datetime object."""
     metric = "impressions"
@@ -182,3 +311,101 @@ def assemble_data(metrics_data: dict) -> list:
             data[0][f"{metric_key}_{traffic_source}"] = 0
 
     return data
+
+
+
+def assemble_data_vectorized(metrics_data: dict) -> list:
+    """
+    Same output as assemble_data, but the timestamps, weekdays and values are made per category 
+    in one go with numpy instead of per datapoint.
+    Like assemble_data, a row is made by the first category that reaches that time unit, 
+    and the first row gets 0 for traffic sources that aren't listed.
+    """
+    meta = {"datetime(UTC)": [], "day": [], "time delta": []}
+    columns = {}    # Name: values, for categories with data
+    row0_order = [] # Key order of the first row, which includes the 0 padding
+    padding = {}
+
+    for metric_key, metric_data_list in metrics_data.items():
+        watchtime = metric_key == "watchtime"
+        if watchtime:
+            metric_key += "(Hours)"
+            factor = 1/60/60/1000 # Originally the watchtime data is in milliseconds
+
+        for category in metric_data_list:
+            try:
+                traffic_source = TRAFFIC_SOURCES[category['name']]
+            except KeyError:
+                print("Unknown traffic source: YouTube has likely added some")
+                return None
+
+            # Don't save stuff that's not logged for impressions
+            if metric_key == "impressions" and \
+                traffic_source not in TRAFFIC_SOURCES_IMP.values():
+                continue
+
+            category_data = category['data']
+            if not category_data:
+                continue
+
+            # Add new rows when necessary
+            n_rows = len(meta["day"])
+            if len(category_data) > n_rows:
+                x_ms = [datapoint['x'] for datapoint in category_data[n_rows:]]
+                meta["datetime(UTC)"].extend(to_datetimes(x_ms))
+                meta["day"].extend(to_weekdays(x_ms))
+                meta["time delta"].extend(datapoint['hovercardInfo']['relativeDateFormatted'] 
+                                          for datapoint in category_data[n_rows:]) # Time delta from publish time
+
+            name = f"{metric_key}_{traffic_source}"
+            values = [datapoint['y'] for datapoint in category_data]
+            if watchtime:
+                values = [round(value, 2) for value in (np.asarray(values, dtype=np.float64) * factor).tolist()]
+            if name not in columns:
+                row0_order.append(name)
+            columns[name] = values
+
+        # Add empty traffic sources for the fieldnames:
+        # Sometimes a traffic source isn't listed because there is no
+        # data on it yet, but in the future there might be so we want to
+        # include it for the fieldnames in the csv
+        traffic_sources = TRAFFIC_SOURCES.values()
+        if metric_key == "impressions":
+            traffic_sources = TRAFFIC_SOURCES_IMP.values()
+        elif metric_key in ["likes", "dislikes"]:
+            traffic_sources = ["Total"]
+
+        for traffic_source in traffic_sources:
+            name = f"{metric_key}_{traffic_source}"
+            if name in columns or name in padding:
+                continue
+            padding[name] = 0
+            row0_order.append(name)
+
+    n_rows = len(meta["day"])
+    if n_rows == 0:
+        raise IndexError("No datapoints in metrics data")
+    names = list(columns.keys())
+    lengths = [len(columns[name]) for name in names]
+    meta_keys = ["datetime(UTC)", "day", "time unit", "time delta"]
+
+    def make_row(i):
+        row = dict(zip(meta_keys, (meta["datetime(UTC)"][i], meta["day"][i], i, meta["time delta"][i])))
+        for name, length in zip(names, lengths):
+            if length > i:
+                row[name] = columns[name][i]
+        return row
+
+    # First row has its own key order because of the padding
+    row0 = make_row(0)
+    data = [{**{key: row0[key] for key in meta_keys}, **{name: row0.get(name, padding.get(name)) for name in row0_order}}]
+
+    # Rows where every category has data can be zipped in one go
+    full_rows = min(lengths)
+    data.extend(
+        dict(zip(meta_keys + names, values)) for values in zip(
+            meta["datetime(UTC)"][1:full_rows], meta["day"][1:full_rows], range(1, full_rows), 
+            meta["time delta"][1:full_rows], *(columns[name][1:full_rows] for name in names))
+    )
+    data.extend(make_row(i) for i in range(max(1, full_rows), n_rows))
+    return data
@@ -0,0 +1,243 @@
+"""
+Storage backends for the scraped time series. The csv files stay the default,
+the save_data functions write to a backend instead when they're given one.
+
+Data is stored long: one value per (entity_id, mode, metric, traffic_source, datetime), so queries across
+the whole catalog (like all Suggested videos impressions last month) don't have to read every csv.
+"""
+
+import csv
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import datetime as dt
+from typing import List
+
+from .custom_values import STORAGE_BACKEND, SQLITE_PATH
+
+# Prefixes of the csv file titles, the rest of the title is the entity id
+MODES = ["Hourly", "Minutes", "since_published", "first_24h"]
+# Columns that describe the row instead of being a metric
+META_FIELDS = ["datetime(UTC)", "day", "time unit", "time delta"]
+
+
+def split_title(title: str) -> tuple:
+    """Return (mode, entity_id) from a csv title like since_published_<video id>"""
+    for mode in MODES:
+        if title.startswith(mode + "_"):
+            return mode, title[len(mode)+1:]
+    raise ValueError(f"Unknown data title: {title}")
+
+
+def split_column(mode: str, column: str) -> tuple:
+    """
+    Return (metric, traffic_source) for a csv column.
+    Hourly and Minutes columns are views: "views" is the total, the other columns are traffic sources for videos
+    and video ids for the channel. The other modes have <metric>_<traffic source> columns.
+    """
+    if mode in ("Hourly", "Minutes"):
+        return "views", "Total" if column == "views" else column
+    metric, traffic_source = column.split("_", 1)
+    return metric, traffic_source
+
+
+class Storage(ABC):
+    """
+    Interface that the save_data functions can write to instead of csv files.
+    A backend that doesn't implement every abstract method fails when it's made, not halfway through a scrape.
+    """
+
+    @abstractmethod
+    def save_series(self, title: str, data: List[dict]) -> bool:
+        """Upsert the rows of <data> for the csv <title>. Return True if saved."""
+
+    @abstractmethod
+    def count_rows(self, title: str) -> int:
+        """Return the number of rows (datetimes) stored for the csv <title>, 0 if there are none"""
+
+    @abstractmethod
+    def save_videos(self, videos: List[dict]) -> None:
+        """Upsert video log records"""
+
+    @abstractmethod
+    def export_csv(self, title: str, dir: str='') -> None:
+        """Write the stored series for <title> to <dir><title>.csv in the same format as the csv writers"""
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteStorage(Storage):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS series (
+            entity_id       TEXT NOT NULL,
+            mode            TEXT NOT NULL,
+            metric          TEXT NOT NULL,
+            traffic_source  TEXT NOT NULL,
+            datetime        INTEGER NOT NULL, -- UTC epoch seconds
+            value, -- No type so ints stay ints and floats stay floats
+            PRIMARY KEY (entity_id, mode, metric, traffic_source, datetime)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS series_by_metric ON series (metric, traffic_source, datetime);
+
+        CREATE TABLE IF NOT EXISTS time_units (
+            entity_id   TEXT NOT NULL,
+            mode        TEXT NOT NULL,
+            datetime    INTEGER NOT NULL,
+            time_unit   INTEGER,
+            time_delta  TEXT,
+            PRIMARY KEY (entity_id, mode, datetime)
+        ) WITHOUT ROWID;
+
+        -- Original csv column names and their order, for the csv export
+        CREATE TABLE IF NOT EXISTS columns (
+            entity_id       TEXT NOT NULL,
+            mode            TEXT NOT NULL,
+            name            TEXT NOT NULL,
+            position        INTEGER NOT NULL,
+            metric          TEXT NOT NULL,
+            traffic_source  TEXT NOT NULL,
+            PRIMARY KEY (entity_id, mode, name)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS video_log (
+            id      TEXT PRIMARY KEY,
+            date    INTEGER NOT NULL,
+            title   TEXT,
+            recent  INTEGER,
+            precise INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS video_log_by_date ON video_log (date);
+    """
+
+    def __init__(self, path: str=SQLITE_PATH):
+        self.path = path
+        # Shared by the parallel scrapers, so writes are serialized with a lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(self.SCHEMA)
+
+    def save_series(self, title: str, data: List[dict]) -> bool:
+        mode, entity_id = split_title(title)
+        series_rows = []
+        time_unit_rows = []
+        columns = {}
+        for row in data:
+            timestamp = int(row["datetime(UTC)"].timestamp())
+            if "time unit" in row:
+                time_unit_rows.append((entity_id, mode, timestamp, row["time unit"], row.get("time delta")))
+            for column, value in row.items():
+                if column in META_FIELDS:
+                    continue
+                if column not in columns:
+                    columns[column] = split_column(mode, column)
+                metric, traffic_source = columns[column]
+                series_rows.append((entity_id, mode, metric, traffic_source, timestamp, value))
+
+        with self._lock, self._connection:
+            position = self._connection.execute(
+                "SELECT COUNT(*) FROM columns WHERE entity_id = ? AND mode = ?", (entity_id, mode)).fetchone()[0]
+            for name, (metric, traffic_source) in columns.items():
+                inserted = self._connection.execute(
+                    "INSERT OR IGNORE INTO columns VALUES (?, ?, ?, ?, ?, ?)",
+                    (entity_id, mode, name, position, metric, traffic_source)).rowcount
+                position += inserted
+            self._connection.executemany("""
+                INSERT INTO series VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (entity_id, mode, metric, traffic_source, datetime) DO UPDATE SET value = excluded.value
+            """, series_rows)
+            self._connection.executemany("""
+                INSERT INTO time_units VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (entity_id, mode, datetime) DO UPDATE SET
+                    time_unit = excluded.time_unit, time_delta = excluded.time_delta
+            """, time_unit_rows)
+        print(f"Written scraped data to {title} in {self.path}")
+        return True
+
+    def count_rows(self, title: str) -> int:
+        mode, entity_id = split_title(title)
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(DISTINCT datetime) FROM series WHERE entity_id = ? AND mode = ?",
+                (entity_id, mode)).fetchone()[0]
+
+    def save_videos(self, videos: List[dict]) -> None:
+        rows = [(video["id"], int(video["date"].replace(tzinfo=dt.timezone.utc).timestamp()), video["title"],
+                 int(video["recent"]), int(video["precise"])) for video in videos]
+        with self._lock, self._connection:
+            self._connection.executemany("""
+                INSERT INTO video_log VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    date = excluded.date, title = excluded.title, recent = excluded.recent, precise = excluded.precise
+            """, rows)
+
+    def query(self, metric: str, traffic_source: str="Total", start: dt.datetime=None, end: dt.datetime=None,
+    mode: str=None) -> list:
+        """
+        Return [(entity_id, mode, datetime, value)] for one metric and traffic source across all entities,
+        optionally between <start> and <end> (aware datetimes) and for one mode. Uses the series_by_metric index.
+        """
+        sql = "SELECT entity_id, mode, datetime, value FROM series WHERE metric = ? AND traffic_source = ?"
+        params = [metric, traffic_source]
+        if start is not None:
+            sql += " AND datetime >= ?"
+            params.append(int(start.timestamp()))
+        if end is not None:
+            sql += " AND datetime < ?"
+            params.append(int(end.timestamp()))
+        if mode is not None:
+            sql += " AND mode = ?"
+            params.append(mode)
+        with self._lock:
+            rows = self._connection.execute(sql + " ORDER BY datetime", params).fetchall()
+        return [(entity_id, mode, dt.datetime.fromtimestamp(timestamp, dt.timezone.utc), value)
+                for entity_id, mode, timestamp, value in rows]
+
+    def export_csv(self, title: str, dir: str='') -> None:
+        mode, entity_id = split_title(title)
+        with self._lock:
+            columns = self._connection.execute(
+                "SELECT name, metric, traffic_source FROM columns WHERE entity_id = ? AND mode = ? ORDER BY position",
+                (entity_id, mode)).fetchall()
+            series = self._connection.execute(
+                "SELECT metric, traffic_source, datetime, value FROM series WHERE entity_id = ? AND mode = ?",
+                (entity_id, mode)).fetchall()
+            time_units = self._connection.execute(
+                "SELECT datetime, time_unit, time_delta FROM time_units WHERE entity_id = ? AND mode = ?",
+                (entity_id, mode)).fetchall()
+        names = {(metric, traffic_source): name for name, metric, traffic_source in columns}
+        time_units = {timestamp: (time_unit, time_delta) for timestamp, time_unit, time_delta in time_units}
+
+        rows = {}
+        for metric, traffic_source, timestamp, value in series:
+            if timestamp not in rows:
+                datetime = dt.datetime.fromtimestamp(timestamp, dt.timezone.utc)
+                rows[timestamp] = {"datetime(UTC)": datetime, "day": datetime.strftime('%a')}
+                if timestamp in time_units:
+                    rows[timestamp]["time unit"], rows[timestamp]["time delta"] = time_units[timestamp]
+            rows[timestamp][names[(metric, traffic_source)]] = value
+
+        fieldnames = ["datetime(UTC)", "day"]
+        if time_units:
+            fieldnames += ["time unit", "time delta"]
+        fieldnames += [name for name, _, _ in columns]
+        with open(dir + f"{title}.csv", "w", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames)
+            writer.writeheader()
+            writer.writerows(rows[timestamp] for timestamp in sorted(rows))
+        print(f"Exported {title} from {self.path}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def open_storage(backend: str=STORAGE_BACKEND) -> Storage:
+    """Return the configured storage backend, or None for the default csv files"""
+    if backend == "csv":
+        return None
+    if backend == "sqlite":
+        return SqliteStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,297 @@
+"""
+Get YouTube Studio analytics without a browser: the session cookies are exported from the logged in profile once,
+and the requests the Studio app makes (recorded with network capture) are replayed over pooled HTTP connections.
+Returns the same structures as the selenium scrapers, so assemble_data doesn't know the difference.
+Chrome is only needed again when the login has to be refreshed (refresh_login).
+
+Usage:
+with DriverSession(capture=True) as session:
+    refresh_login(session) # Once, or when the cookies have expired
+client = StudioClient()
+card_data = client.latest_activity(ScrapeMode.channel, CHANNEL_ID)
+"""
+
+import datetime as dt
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+from .http_fetch import ConnectionPool, HttpError
+from .network_capture import NetworkCapture, find_in_json, parse_body, get_post_data, \
+    is_latest_activity_card, is_main_metric_data
+from .scrape_since_publish_functions import metric_data_list_from_json, subs_from_totals
+
+from .custom_values import CHANNEL_ID, STUDIO_HTTP, STUDIO_BASE_URL, STUDIO_SESSION_PATH
+from .constants import ScrapeMode, ANALYTICS_URL, ADV_URL, METRICS, SUBS_METRIC, TimePeriod, Dimensions
+
+COOKIE_DOMAIN = "youtube.com"
+# Cookies that SAPISIDHASH can be made from, in order of preference
+SAPISID_COOKIES = ["SAPISID", "__Secure-3PAPISID"]
+# Headers of the recorded requests that are sent again, the rest the pool or the cookies take care of
+REPLAY_HEADERS = ["content-type", "x-goog-authuser", "x-goog-pageid", "x-goog-visitor-id",
+                  "x-youtube-client-name", "x-youtube-client-version", "x-youtube-delegation-context"]
+# Metric the explore templates are recorded with, replaced by the requested metric when replaying
+TEMPLATE_METRIC = METRICS["views"]
+# The explore request is recorded again with this metric to find where the metric goes in the body (metric_paths)
+PATH_METRIC = METRICS["watchtime"]
+# Keys the metric is under, for templates that were recorded without metric_paths
+METRIC_KEYS = {"metric", "metrics"}
+
+
+class StudioAuthError(Exception):
+    pass
+
+
+def sapisidhash(sapisid: str, origin: str, timestamp: int=None) -> str:
+    """Return the Authorization header value Google's web apps use for cookie authenticated API calls"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hashlib.sha1(f"{timestamp} {sapisid} {origin}".encode()).hexdigest()
+    return f"SAPISIDHASH {timestamp}_{digest}"
+
+
+def replace_values(obj, replacements: dict):
+    """Return copy of json <obj> with every <replacements> key replaced by its value inside strings"""
+    if isinstance(obj, dict):
+        return {key: replace_values(value, replacements) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [replace_values(value, replacements) for value in obj]
+    if isinstance(obj, str):
+        for old, new in replacements.items():
+            obj = obj.replace(old, new)
+    return obj
+
+
+def find_paths(obj, value: str, keys: set=None, path: list=None) -> list:
+    """
+    Return paths (lists of keys and indices) to the strings in json <obj> that are exactly <value>,
+    only the ones with one of <keys> in their path if given.
+    """
+    path = path or []
+    if isinstance(obj, dict):
+        items = obj.items()
+    elif isinstance(obj, list):
+        items = enumerate(obj)
+    else:
+        return [path] if obj == value and (keys is None or any(key in keys for key in path)) else []
+    return [found for key, child in items for found in find_paths(child, value, keys, path + [key])]
+
+
+def get_path(obj, path: list):
+    for key in path:
+        obj = obj[key]
+    return obj
+
+
+def find_metric_paths(body, other_body, metric: str, other_metric: str) -> list:
+    """
+    Return paths to where <body> has <metric> and <other_body> has <other_metric>, from the same request recorded
+    with both metrics. Those are the strings Studio itself changes for the chart, not the table or sort metrics.
+    """
+    paths = []
+    for path in find_paths(body, metric):
+        try:
+            if get_path(other_body, path) == other_metric:
+                paths.append(path)
+        except (KeyError, IndexError, TypeError):
+            pass
+    return paths
+
+
+# RECORDING (needs the browser) -----------------------------------------------
+
+def export_cookies(driver) -> list:
+    """Return the YouTube cookies of the browser, including the httpOnly ones"""
+    driver.get(ANALYTICS_URL.format(mode=ScrapeMode.channel.name, id=CHANNEL_ID))
+    try:
+        cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+    except Exception:
+        cookies = driver.get_cookies()
+    return [{"name": c["name"], "value": c["value"], "domain": c["domain"]}
+            for c in cookies if c["domain"].lstrip(".").endswith(COOKIE_DOMAIN)]
+
+
+def record_template(driver, network: NetworkCapture, url: str, predicate, **values) -> dict:
+    """
+    Load <url> and return the request that fetched the json matching <predicate>, as a template.
+    <values> are the ids in the request that get replaced when the template is replayed.
+    """
+    network.clear()
+    driver.get("https://www.pictureofhotdog.com/")
+    driver.get(url)
+    network.wait_for_json(predicate, timeout=30)
+    request = network.last_request
+    parts = urlsplit(request["url"])
+    post_data = get_post_data(driver, request)
+    return {
+        "path": parts.path + ("?" + parts.query if parts.query else ""),
+        "method": request["method"],
+        "headers": {k: v for k, v in request["headers"].items() if k.lower() in REPLAY_HEADERS},
+        "body": json.loads(post_data) if post_data else None,
+        "values": values,
+    }
+
+
+def record_templates(driver, video_id: str) -> dict:
+    """
+    Return templates for the realtime card (channel and video) and the explore chart (every time period, metrics and subs),
+    recorded by loading those pages for <video_id>. The driver has to be started with capture=True.
+    """
+    network = NetworkCapture(driver)
+    templates = {}
+    for mode in ScrapeMode:
+        id = CHANNEL_ID if mode == ScrapeMode.channel else video_id
+        templates[f"latest_activity_{mode.name}"] = record_template(driver, network,
+            ANALYTICS_URL.format(mode=mode.name, id=id), is_latest_activity_card, id=id)
+    for time_period in TimePeriod:
+        for name, metric, dimension in [("explore", TEMPLATE_METRIC, Dimensions.traffic_source),
+                                        ("explore_subs", SUBS_METRIC, Dimensions.total)]:
+            url = ADV_URL.format(video_id=video_id, time_period=time_period.value, metric=metric, dimension=dimension.value)
+            templates[f"{name}_{time_period.name}"] = record_template(driver, network, url, is_main_metric_data,
+                id=video_id, metric=metric)
+        explore = templates[f"explore_{time_period.name}"]
+        url = ADV_URL.format(video_id=video_id, time_period=time_period.value, metric=PATH_METRIC,
+                             dimension=Dimensions.traffic_source.value)
+        other = record_template(driver, network, url, is_main_metric_data)
+        explore["metric_paths"] = find_metric_paths(explore["body"], other["body"], TEMPLATE_METRIC, PATH_METRIC)
+    return templates
+
+
+def refresh_login(session, video_id: str=None, path: str=STUDIO_SESSION_PATH) -> dict:
+    """
+    Export the cookies of the logged in browser of <session> and record the request templates, save them to <path>.
+    If the templates can't be recorded (browser started without capture) the ones that were saved before are kept.
+    """
+    try:
+        with open(path, "r") as f:
+            saved = json.load(f)
+    except (FileNotFoundError, ValueError):
+        saved = {}
+
+    cookies = export_cookies(session.driver)
+    templates = saved.get("templates", {})
+    try:
+        if video_id is None:
+            from .log_videos import get_videos # Only needed here, and log_videos imports a lot
+            video_id = get_videos(False)[-1]["id"]
+        templates = record_templates(session.driver, video_id)
+    except Exception as e:
+        print(f"Couldn't record Studio request templates ({e}), keeping the saved ones [{__file__}]")
+
+    saved = {"exported": dt.datetime.now().isoformat(), "cookies": cookies, "templates": templates}
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(saved, f)
+    os.replace(temp_path, path)
+    print(f"Exported {len(cookies)} cookies and {len(templates)} request templates [{__file__}]")
+    return saved
+
+
+# REPLAYING -------------------------------------------------------------------
+
+class StudioClient(object):
+    """
+    Replays the recorded Studio requests with the exported cookies.
+    If <session> is given, the login is refreshed with its browser once when Studio rejects the cookies.
+    <base_url> can point to a local stand-in server that replays recorded responses.
+    """
+    def __init__(self, path: str=STUDIO_SESSION_PATH, base_url: str=STUDIO_BASE_URL, pool: ConnectionPool=None,
+    session=None):
+        self.path = path
+        self.base_url = base_url.rstrip("/")
+        self.pool = pool or ConnectionPool()
+        self.session = session
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            raise StudioAuthError(f"No exported Studio session at {self.path}, run refresh_login first")
+        self.cookies = {c["name"]: c["value"] for c in saved["cookies"]}
+        self.templates = saved["templates"]
+
+    def _auth_headers(self) -> dict:
+        origin = "{0.scheme}://{0.netloc}".format(urlsplit(self.base_url))
+        headers = {
+            "Cookie": "; ".join(f"{name}={value}" for name, value in self.cookies.items()),
+            "Origin": origin,
+            "X-Origin": origin,
+        }
+        sapisid = next((self.cookies[name] for name in SAPISID_COOKIES if name in self.cookies), None)
+        if sapisid:
+            headers["Authorization"] = sapisidhash(sapisid, origin)
+        return headers
+
+    def call(self, template_name: str, replacements: dict=None, metric: str=None, retry_login: bool=True):
+        """
+        Return the json response of the recorded request <template_name> with the values replaced (see replace_values)
+        and the chart metric set to <metric> if given.
+        """
+        if template_name not in self.templates:
+            raise StudioAuthError(f"No recorded request for {template_name}, run refresh_login")
+        template = self.templates[template_name]
+        body = replace_values(template["body"], replacements or {})
+        if metric is not None:
+            for path in self.metric_paths(template):
+                get_path(body, path[:-1])[path[-1]] = metric
+        headers = dict(template["headers"], **self._auth_headers())
+        data = json.dumps(body).encode() if body is not None else None
+        status, _, text = self.pool.request(template["method"], self.base_url + template["path"], data, headers)
+
+        if status in (401, 403):
+            if retry_login and self.session is not None:
+                print(f"Studio rejected the cookies (HTTP {status}), refreshing the login [{__file__}]")
+                refresh_login(self.session, path=self.path)
+                self._load()
+                return self.call(template_name, replacements, metric, retry_login=False)
+            raise StudioAuthError(f"Studio rejected the cookies (HTTP {status}), run refresh_login")
+        if status != 200:
+            raise HttpError(status, template["path"], text)
+        return parse_body(text)
+
+    @staticmethod
+    def metric_paths(template: dict) -> list:
+        """Paths to the chart metric in the body, found under the metric keys if the template was recorded without them"""
+        if template.get("metric_paths"):
+            return template["metric_paths"]
+        return find_paths(template["body"], template.get("values", {}).get("metric", TEMPLATE_METRIC), METRIC_KEYS)
+
+    def latest_activity(self, mode: ScrapeMode, id: str) -> dict:
+        """Return the realtime card data like scrape_hourly.scrape"""
+        template_name = f"latest_activity_{mode.name}"
+        recorded_id = self.templates.get(template_name, {}).get("values", {}).get("id", id)
+        card = find_in_json(self.call(template_name, {recorded_id: id}), is_latest_activity_card)
+        if card is None:
+            raise ValueError(f"No realtime card data in the response for {id}")
+        return card
+
+    def metric_data(self, video_id: str, metric_code: str, time_period: TimePeriod=TimePeriod.since_published) -> list:
+        """Return the chart data of one metric per traffic source like scrape_since_publish_functions.scrape"""
+        subs = metric_code == SUBS_METRIC
+        template_name = f"{'explore_subs' if subs else 'explore'}_{time_period.name}"
+        values = self.templates.get(template_name, {}).get("values", {})
+        response = self.call(template_name, {values.get("id", video_id): video_id}, None if subs else metric_code)
+        main_metric_data = find_in_json(response, is_main_metric_data)
+        if main_metric_data is None:
+            raise ValueError(f"No chart data in the response for {video_id} {metric_code}")
+        return metric_data_list_from_json(main_metric_data)
+
+    def metrics_data(self, video_id: str, time_period: TimePeriod=TimePeriod.since_published) -> dict:
+        """Return metrics_data like scrape_metrics_single_load, for assemble_data"""
+        metrics_data = {key: self.metric_data(video_id, code, time_period) for key, code in METRICS.items()}
+        metrics_data["subs"] = subs_from_totals(self.metric_data(video_id, SUBS_METRIC, time_period)[0])
+        return metrics_data
+
+
+def open_studio_client(session=None, enabled: bool=None) -> StudioClient:
+    """Return a StudioClient if browserless Studio requests are on (custom_values.STUDIO_HTTP) and set up, otherwise None"""
+    if not (STUDIO_HTTP if enabled is None else enabled):
+        return None
+    try:
+        return StudioClient(session=session)
+    except Exception as e:
+        print(f"Not using browserless Studio requests: {e}")
+        return None
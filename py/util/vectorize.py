@@ -0,0 +1,42 @@
+"""
+NumPy helpers for the vectorized assemble_data functions.
+They give exactly the same values as the per-datapoint Python code they replace.
+"""
+
+import datetime as dt
+
+import numpy as np
+
+WEEKDAYS = np.array(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]) # Like strftime('%a')
+MS_PER_DAY = 24*60*60*1000
+EPOCH_WEEKDAY = 3 # 1970-01-01 was a Thursday
+
+
+def to_datetimes(x_ms) -> list:
+    """Return UTC datetimes for millisecond timestamps, same as dt.datetime.fromtimestamp(x/1000, dt.timezone.utc)"""
+    naive = np.asarray(x_ms, dtype=np.int64).astype("datetime64[ms]").astype(object)
+    return [datetime.replace(tzinfo=dt.timezone.utc) for datetime in naive]
+
+
+def to_weekdays(x_ms) -> list:
+    """Return weekday abbreviations for millisecond timestamps, same as datetime.strftime('%a') in UTC"""
+    days = np.asarray(x_ms, dtype=np.int64) // MS_PER_DAY
+    return WEEKDAYS[(days + EPOCH_WEEKDAY) % 7].tolist()
+
+
+def spread_percentages(percentage_data: list, n: int, value: float) -> list:
+    """
+    Return int(percentage_data[i] * views_per_percent) for the first <n> percentages,
+    where views_per_percent spreads <value> over all the percentages.
+    """
+    if len(percentage_data) < n:
+        raise IndexError(f"{len(percentage_data)} percentages for {n} datapoints")
+    views_per_percent = value / sum(percentage_data)
+    percentages = np.asarray(percentage_data[:n], dtype=np.float64)
+    return (percentages * views_per_percent).astype(np.int64).tolist()
+
+
+def rows_from_columns(columns: dict) -> list:
+    """Return list of row dicts from a dict of equally long column lists, keeping the column order"""
+    names = list(columns.keys())
+    return [dict(zip(names, values)) for values in zip(*columns.values())]